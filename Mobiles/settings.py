@@ -47,6 +47,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'user.middleware.CartCookieMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -125,6 +126,18 @@ STATICFILES_DIRS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Processes used to render resized product image variants
+IMAGE_VARIANT_WORKERS = 2
+
+# How long stock stays reserved for an order awaiting payment
+STOCK_RESERVATION_MINUTES = 30
+
+# How long a checkout or payment submission can be replayed from its idempotency key
+IDEMPOTENCY_KEY_HOURS = 24
+
+# Delivered and cancelled orders untouched this long move to the archive tables
+ORDER_ARCHIVE_DAYS = 180
+
 # Email Configuration
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = 'smtp.gmail.com'
@@ -141,6 +154,11 @@ TWILIO_ACCOUNT_SID = 'your_twilio_account_sid'  # Change this
 TWILIO_AUTH_TOKEN = 'your_twilio_auth_token'  # Change this
 TWILIO_PHONE_NUMBER = '+1234567890'  # Change this
 
+# Notification outbox worker (manage.py process_notifications)
+# Use 'user.sms.ConsoleSMSBackend' or 'user.sms.LocmemSMSBackend' locally
+SMS_BACKEND = 'user.sms.TwilioSMSBackend'
+NOTIFICATION_MAX_ATTEMPTS = 5
+
 # Authentication
 AUTH_USER_MODEL = 'user.User'
 LOGIN_REDIRECT_URL = 'shopping'
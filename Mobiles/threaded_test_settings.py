@@ -0,0 +1,11 @@
+"""Settings for tests that run checkouts on several threads at once.
+
+The default in-memory SQLite test database is private to one connection, so these
+tests need a file every thread can open.
+"""
+from .settings import *  # noqa: F401,F403
+
+
+DATABASES['default']['TEST'] = {
+    'NAME': BASE_DIR / 'test_db.sqlite3',
+}
@@ -0,0 +1,99 @@
+from django.db.models import Avg, Count
+from django.db.models.functions import Substr
+
+from user.geo import GEOHASH_ALPHABET, GEOHASH_PRECISION, nearest_neighbour_batches
+from user.models import Order
+
+
+# Paid for but not yet handed to a courier
+OPEN_STATUSES = ['confirmed', 'processing']
+
+CLUSTER_PRECISION = 5  # ~5km x 5km cells
+MAX_CLUSTERS = 200
+DISPATCH_BATCH_SIZE = 20
+MAX_DISPATCH_ORDERS = 500
+
+DISPATCH_FIELDS = [
+    'id', 'order_id', 'status', 'delivery_name', 'delivery_phone', 'delivery_address',
+    'delivery_latitude', 'delivery_longitude', 'delivery_geohash',
+]
+
+
+def open_orders(distributor):
+    return Order.objects.filter(distributor_links__distributor=distributor, status__in=OPEN_STATUSES)
+
+
+def cluster_open_orders(distributor, precision=CLUSTER_PRECISION, limit=MAX_CLUSTERS):
+    """Open orders grouped by geohash cell, busiest first, counted and averaged in the database.
+
+    Returns {'clusters': [...], 'unlocated': n} where each cluster has its cell, order
+    count and centre. Orders without coordinates are only counted.
+    """
+    orders = open_orders(distributor)
+    clusters = (
+        orders.exclude(delivery_geohash='')
+        .annotate(cell=Substr('delivery_geohash', 1, precision))
+        .values('cell')
+        .annotate(count=Count('id'), latitude=Avg('delivery_latitude'), longitude=Avg('delivery_longitude'))
+        .order_by('-count', 'cell')[:limit]
+    )
+    return {
+        'precision': precision,
+        'clusters': [
+            {
+                'cell': cluster['cell'],
+                'orders': cluster['count'],
+                'latitude': round(cluster['latitude'], 6),
+                'longitude': round(cluster['longitude'], 6),
+            }
+            for cluster in clusters
+        ],
+        'unlocated': orders.filter(delivery_geohash='').count(),
+    }
+
+
+def dispatch_batches(distributor, cell, batch_size=DISPATCH_BATCH_SIZE, origin=None):
+    """Open orders in one geohash cell split into nearest-neighbour dispatch batches.
+
+    Reads at most MAX_DISPATCH_ORDERS orders from one index range scan; ``truncated``
+    says whether the cell held more, in which case a longer (smaller) cell should be asked for.
+    """
+    # A range rather than startswith, so the (status, delivery_geohash) index serves it on every backend
+    stops = list(
+        open_orders(distributor)
+        .filter(delivery_geohash__gte=cell, delivery_geohash__lt=cell + '~')
+        .order_by('delivery_geohash')
+        .values(*DISPATCH_FIELDS)[:MAX_DISPATCH_ORDERS + 1]
+    )
+    truncated = len(stops) > MAX_DISPATCH_ORDERS
+    stops = stops[:MAX_DISPATCH_ORDERS]
+
+    batches = nearest_neighbour_batches(
+        stops, batch_size, origin=origin,
+        position=lambda stop: (stop['delivery_latitude'], stop['delivery_longitude'])
+    )
+    return {
+        'cell': cell,
+        'orders': len(stops),
+        'truncated': truncated,
+        'batches': [
+            [
+                {
+                    'id': stop['id'],
+                    'order_id': stop['order_id'],
+                    'status': stop['status'],
+                    'name': stop['delivery_name'],
+                    'phone': stop['delivery_phone'],
+                    'address': stop['delivery_address'],
+                    'latitude': stop['delivery_latitude'],
+                    'longitude': stop['delivery_longitude'],
+                }
+                for stop in batch
+            ]
+            for batch in batches
+        ],
+    }
+
+
+def valid_cell(cell):
+    return bool(cell) and len(cell) <= GEOHASH_PRECISION and all(char in GEOHASH_ALPHABET for char in cell)
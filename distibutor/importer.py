@@ -0,0 +1,230 @@
+import csv
+import io
+import json
+import re
+from django.core.exceptions import SuspiciousFileOperation, ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils.text import slugify
+
+from user.images import IMAGE_FIELDS
+from user.models import Product
+from user.search import get_search_backend
+from user.specs import SPEC_KEYS
+from user.storage import change_references
+
+
+IMPORT_CHUNK_SIZE = 500
+
+# Largest value a PositiveIntegerField holds on every backend
+MAX_STOCK = 2147483647
+
+BRANDS = {value.lower(): value for value, _ in Product.BRAND_CHOICES}
+
+
+class ImportResult:
+    """Outcome of one catalog import: rows created and per-row errors"""
+
+    def __init__(self):
+        self.created = 0
+        self.errors = []
+
+    def add_error(self, line, messages):
+        self.errors.append({'line': line, 'errors': messages})
+
+    def as_dict(self, max_errors=500):
+        return {
+            'created': self.created,
+            'failed': len(self.errors),
+            'errors': self.errors[:max_errors],
+        }
+
+
+def read_rows(stream, fmt):
+    """Yield (line_number, row dict) from a binary CSV or JSONL stream without loading it whole"""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        for line_number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield line_number, e
+                continue
+            yield line_number, row if isinstance(row, dict) else ValueError('Each line must be a JSON object')
+
+
+def _decimal(field_name, value):
+    """``value`` as the Product decimal field would store it, or None if the column cannot hold it"""
+    try:
+        return Product._meta.get_field(field_name).clean(str(value).strip(), None)
+    except ValidationError:
+        return None
+
+
+def _image_exists(field_name, name):
+    try:
+        return Product._meta.get_field(field_name).storage.exists(name)
+    except SuspiciousFileOperation:
+        return False
+
+
+def _int(value, default=0):
+    if value in (None, ''):
+        return default
+    try:
+        return int(str(value).strip())
+    except ValueError:
+        return None
+
+
+def validate_row(row):
+    """Return (product fields, errors) for one import row"""
+    errors = []
+    text = {key: ('' if value is None else value) for key, value in row.items() if key}
+
+    brand = BRANDS.get(str(text.get('brand', '')).strip().lower())
+    if not brand:
+        errors.append('Unknown brand')
+
+    model_name = str(text.get('model_name', '')).strip()
+    if not model_name:
+        errors.append('model_name is required')
+    elif len(model_name) > 100:
+        errors.append('model_name is longer than 100 characters')
+
+    price = _decimal('price', text.get('price'))
+    if price is None or price <= 0:
+        errors.append('price must be a positive number with at most 8 digits before the point and 2 after')
+
+    original_price = None
+    if text.get('original_price') not in ('', None):
+        original_price = _decimal('original_price', text.get('original_price'))
+        if original_price is None:
+            errors.append('original_price must be a number with at most 8 digits before the point and 2 after')
+
+    discount = _int(text.get('discount'))
+    if discount is None or not 0 <= discount <= 100:
+        errors.append('discount must be a whole number from 0 to 100')
+
+    stock = _int(text.get('stock'))
+    if stock is None or not 0 <= stock <= MAX_STOCK:
+        errors.append(f'stock must be a whole number from 0 to {MAX_STOCK}')
+
+    specifications = text.get('specifications')
+    if not isinstance(specifications, dict):
+        specifications = {key: text.get(key) or None for key in SPEC_KEYS}
+
+    # Images are referenced by existing media names, e.g. from a previous upload
+    images = {field: str(text.get(field, '')).strip() for field in IMAGE_FIELDS}
+    for field, name in images.items():
+        if name and not _image_exists(field, name):
+            errors.append(f'{field} {name} does not exist')
+
+    if errors:
+        return None, errors
+
+    fields = {
+        'brand': brand,
+        'model_name': model_name,
+        'price': price,
+        'original_price': original_price,
+        'discount': discount,
+        'stock': stock,
+        'features': str(text.get('features', '')),
+        'specifications': specifications,
+        **images,
+    }
+    return fields, []
+
+
+def allocate_slugs(products):
+    """Give every product a unique slug with at most two queries per chunk"""
+    bases = {product.slug for product in products}
+    taken = set(Product.objects.filter(slug__in=bases).values_list('slug', flat=True))
+
+    # Only bases that already exist need their numbered suffixes looked up
+    colliding = [base for base in bases if base in taken]
+    if colliding:
+        suffixed = Q()
+        for base in colliding:
+            suffixed |= Q(slug__startswith=f'{base}-')
+        taken.update(Product.objects.filter(suffixed).values_list('slug', flat=True))
+
+    next_counter = {}
+    for product in products:
+        base = product.slug
+        slug = base
+        counter = next_counter.get(base, 1)
+        while slug in taken:
+            slug = f'{base}-{counter}'
+            counter += 1
+        next_counter[base] = counter
+        taken.add(slug)
+        product.slug = slug
+
+
+def _create_chunk(distributor, chunk, result):
+    """Insert one chunk in a single transaction, retrying once if a slug was taken concurrently"""
+    for attempt in range(2):
+        products = []
+        for line, fields in chunk:
+            product = Product(distributor=distributor, slug=slugify(f"{fields['brand']}-{fields['model_name']}"), **fields)
+            product.apply_spec_attributes()
+            products.append(product)
+        allocate_slugs(products)
+
+        try:
+            with transaction.atomic():
+                created = Product.objects.bulk_create(products)
+                get_search_backend().index_products(created)
+                change_references(
+                    [getattr(product, field).name for product in created for field in IMAGE_FIELDS if getattr(product, field)],
+                    1
+                )
+        except IntegrityError as e:
+            if attempt == 0:
+                continue
+            for line, fields in chunk:
+                result.add_error(line, [f'Could not save: {e}'])
+            return
+        result.created += len(created)
+        return
+
+
+def import_products(distributor, stream, fmt, chunk_size=IMPORT_CHUNK_SIZE):
+    """Stream rows from a CSV/JSONL file into the catalog in chunked bulk inserts.
+
+    A file that is not UTF-8 stops the import where the bad bytes are found; rows
+    read before them are still imported.
+    """
+    result = ImportResult()
+    chunk = []
+    line = 0
+    try:
+        for line, row in read_rows(stream, fmt):
+            if isinstance(row, Exception):
+                result.add_error(line, [f'Invalid JSON: {row}'])
+                continue
+            fields, errors = validate_row(row)
+            if errors:
+                result.add_error(line, errors)
+                continue
+            chunk.append((line, fields))
+            if len(chunk) >= chunk_size:
+                _create_chunk(distributor, chunk, result)
+                chunk = []
+    except UnicodeDecodeError:
+        result.add_error(line + 1, ['The file is not UTF-8 text; save it as UTF-8 and upload it again'])
+    if chunk:
+        _create_chunk(distributor, chunk, result)
+    return result
+
+
+def detect_format(filename):
+    return 'jsonl' if re.search(r'\.(jsonl|ndjson|json)$', filename or '', re.IGNORECASE) else 'csv'
@@ -0,0 +1,123 @@
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils import timezone
+
+from user.models import Product
+from user.page_cache import invalidate_product_pages
+from user.reservations import held_stock, stock_from_on_hand
+
+from .importer import MAX_STOCK, _decimal
+
+
+SYNC_CHUNK_SIZE = 500
+SYNC_FIELDS = ['stock', 'price', 'discount']
+
+
+def _whole_number(value):
+    """``value`` as an int, or None for booleans, fractions and anything that is not a number"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        return int(value) if value.is_integer() else None
+    try:
+        return int(str(value).strip())
+    except ValueError:
+        return None
+
+
+def _clean_update(update):
+    """Validate one {'slug', 'stock', 'price', 'discount'} item; returns (slug, values, errors)"""
+    if not isinstance(update, dict):
+        return None, {}, ['Each update must be an object']
+
+    slug = update.get('slug')
+    values, errors = {}, []
+    if not slug or not isinstance(slug, str):
+        errors.append('slug is required')
+
+    if update.get('stock') is not None:
+        stock = _whole_number(update['stock'])
+        if stock is None or not 0 <= stock <= MAX_STOCK:
+            errors.append(f'stock must be a whole number from 0 to {MAX_STOCK}')
+        else:
+            values['stock'] = stock
+
+    if update.get('price') is not None:
+        try:
+            price = _decimal('price', Decimal(str(update['price'])).quantize(Decimal('0.01')))
+        except (InvalidOperation, ValueError):
+            price = None
+        if price is None or price <= 0:
+            errors.append('price must be a positive number with at most 8 digits before the point and 2 after')
+        else:
+            values['price'] = price
+
+    if update.get('discount') is not None:
+        discount = _whole_number(update['discount'])
+        if discount is None or not 0 <= discount <= 100:
+            errors.append('discount must be a whole number from 0 to 100')
+        else:
+            values['discount'] = discount
+
+    if not errors and not values:
+        errors.append('Nothing to update')
+    return slug, values, errors
+
+
+def apply_inventory_updates(distributor, updates):
+    """Apply stock/price/discount values to a distributor's products in one transaction.
+
+    ``stock`` is the count on hand; units held for unpaid orders are taken off it
+    before it is stored. Only rows whose values actually change are written, with
+    one bulk UPDATE per chunk.
+    """
+    summary = {'received': len(updates), 'updated': 0, 'unchanged': 0, 'not_found': [], 'errors': []}
+
+    wanted = {}
+    for index, update in enumerate(updates):
+        slug, values, errors = _clean_update(update)
+        if errors:
+            summary['errors'].append({'index': index, 'slug': slug, 'errors': errors})
+        else:
+            # Later entries for the same slug win
+            wanted.setdefault(slug, {}).update(values)
+
+    slugs = list(wanted)
+    now = timezone.now()
+    changed_ids = []
+    with transaction.atomic():
+        for start in range(0, len(slugs), SYNC_CHUNK_SIZE):
+            chunk = slugs[start:start + SYNC_CHUNK_SIZE]
+            products = Product.objects.select_for_update().filter(
+                distributor=distributor, slug__in=chunk
+            ).only('id', 'slug', *SYNC_FIELDS)
+            # The row locks keep new holds from landing between this read and the write
+            products = list(products)
+            held = held_stock([product.id for product in products if 'stock' in wanted[product.slug]])
+
+            changed = []
+            found = set()
+            for product in products:
+                found.add(product.slug)
+                values = dict(wanted[product.slug])
+                if 'stock' in values:
+                    values['stock'] = stock_from_on_hand(values['stock'], held.get(product.id, 0))
+                if all(getattr(product, field) == value for field, value in values.items()):
+                    summary['unchanged'] += 1
+                    continue
+                for field, value in values.items():
+                    setattr(product, field, value)
+                product.updated_at = now
+                changed.append(product)
+
+            Product.objects.bulk_update(changed, SYNC_FIELDS + ['updated_at'])
+            changed_ids.extend(product.id for product in changed)
+            summary['updated'] += len(changed)
+            summary['not_found'].extend(slug for slug in chunk if slug not in found)
+
+    # bulk_update skips post_save, so clear the cached pages here
+    transaction.on_commit(lambda: invalidate_product_pages(changed_ids))
+    return summary
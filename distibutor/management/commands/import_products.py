@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from distibutor.importer import IMPORT_CHUNK_SIZE, detect_format, import_products
+from user.models import User
+
+
+class Command(BaseCommand):
+    help = 'Import products for a distributor from a CSV or JSONL file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or JSONL file to import')
+        parser.add_argument('--distributor', required=True, help='Email of the distributor who owns the products')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Defaults to the file extension')
+        parser.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            distributor = User.objects.get(email=options['distributor'], user_type='distributor')
+        except User.DoesNotExist:
+            raise CommandError(f"No distributor with email {options['distributor']}")
+
+        fmt = options['format'] or detect_format(options['path'])
+        with open(options['path'], 'rb') as stream:
+            result = import_products(distributor, stream, fmt, chunk_size=options['chunk_size'])
+
+        for error in result.errors:
+            self.stderr.write(f"Line {error['line']}: {'; '.join(error['errors'])}")
+        self.stdout.write(self.style.SUCCESS(f'Imported {result.created} products ({len(result.errors)} rows failed)'))
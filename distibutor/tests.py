@@ -1,3 +1,286 @@
-from django.test import TestCase
+import io
+import os
+import tempfile
+from decimal import Decimal
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from user.models import Cart, Order, Product, StockReservation, User
+from user.geo import geohash
+from user.orders import delivery_details, place_order
+from user.pricing import price_cart, price_product
+
+from .dispatch import cluster_open_orders, dispatch_batches
+from .importer import MAX_STOCK, import_products, validate_row
+from .inventory import apply_inventory_updates
+
+
+def _distributor(username='dist', phone='9000000000'):
+    return User.objects.create_user(
+        username=username, email=f'{username}@example.com', phone=phone, password='pw', user_type='distributor'
+    )
+
+
+def _product(distributor, model_name='Galaxy', **fields):
+    defaults = {'brand': 'Samsung', 'price': Decimal('10000'), 'stock': 10, 'image1': '', 'specifications': {}}
+    defaults.update(fields)
+    return Product.objects.create(
+        distributor=distributor, model_name=model_name, slug=model_name.lower().replace(' ', '-'), **defaults
+    )
+
+
+def _shopper(username='shopper'):
+    return User.objects.create_user(username=username, email=f'{username}@example.com', phone='9111111111', password='pw')
+
+
+DELIVERY = {
+    'delivery_name': 'Shopper', 'delivery_phone': '9111111111', 'delivery_email': 'shopper@example.com',
+    'delivery_address': 'Address', 'delivery_location': None,
+}
+
+
+def _csv(*rows):
+    header = 'brand,model_name,price,stock,image1'
+    return io.BytesIO('\n'.join([header, *rows]).encode())
+
+
+class ImporterValidationTests(TestCase):
+    def setUp(self):
+        self.distributor = _distributor()
+
+    def test_prices_the_column_cannot_hold_are_row_errors(self):
+        for price in ['nan', 'NaN', 'Infinity', '-inf', '1e30', '123456789', '19.999', 'abc', '0']:
+            fields, errors = validate_row({'brand': 'Samsung', 'model_name': 'Galaxy', 'price': price})
+            self.assertIsNone(fields, price)
+            self.assertTrue(any(error.startswith('price') for error in errors), price)
+
+        fields, errors = validate_row({
+            'brand': 'Samsung', 'model_name': 'Galaxy', 'price': '1e30', 'original_price': 'Infinity'
+        })
+        self.assertIn('original_price', ' '.join(errors))
+
+    def test_stock_outside_the_column_is_a_row_error(self):
+        fields, errors = validate_row({'brand': 'Samsung', 'model_name': 'Galaxy', 'price': '10', 'stock': '1' * 20})
+        self.assertIsNone(fields)
+
+    def test_bad_rows_do_not_stop_the_import(self):
+        result = import_products(self.distributor, _csv(
+            'Samsung,Galaxy A,nan,5,',
+            'Samsung,Galaxy B,Infinity,5,',
+            'Samsung,Galaxy C,999.99,5,',
+        ), 'csv')
+        self.assertEqual(result.created, 1)
+        self.assertEqual([error['line'] for error in result.errors], [2, 3])
+        self.assertEqual(Product.objects.get().price, Product._meta.get_field('price').to_python('999.99'))
+
+    def test_file_that_is_not_utf8(self):
+        stream = io.BytesIO(b'brand,model_name,price,stock\nSamsung,Gal\xe1xy,10,1\n')
+        result = import_products(self.distributor, stream, 'csv')
+        self.assertEqual(result.created, 0)
+        self.assertIn('UTF-8', result.errors[0]['errors'][0])
+
+    def test_missing_images_are_row_errors(self):
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            os.makedirs(os.path.join(media_root, 'products'))
+            with open(os.path.join(media_root, 'products', 'front.jpg'), 'wb') as image:
+                image.write(b'jpeg')
+
+            result = import_products(self.distributor, _csv(
+                'Samsung,Galaxy A,10,1,products/front.jpg',
+                'Samsung,Galaxy B,10,1,products/nope.jpg',
+                'Samsung,Galaxy C,10,1,../../etc/passwd',
+            ), 'csv')
+
+        self.assertEqual(result.created, 1)
+        self.assertEqual(result.errors[0]['errors'], ['image1 products/nope.jpg does not exist'])
+        self.assertEqual(len(result.errors), 2)
+
+
+class InventorySyncTests(TestCase):
+    def setUp(self):
+        self.distributor = _distributor()
+        self.product = _product(self.distributor, stock=10, discount=0)
+        self.other = _product(_distributor('rival', '9000000001'), model_name='Pixel', stock=4)
+
+    def test_summary_counts_each_outcome(self):
+        summary = apply_inventory_updates(self.distributor, [
+            {'slug': 'galaxy', 'stock': 12, 'price': '9999.5', 'discount': 10},
+            {'slug': 'galaxy', 'discount': 10},
+            {'slug': 'missing', 'stock': 1},
+            {'slug': 'galaxy'},
+        ])
+        self.assertEqual(summary['received'], 4)
+        self.assertEqual(summary['updated'], 1)
+        self.assertEqual(summary['unchanged'], 0)
+        self.assertEqual(summary['not_found'], ['missing'])
+        self.assertEqual(summary['errors'], [{'index': 3, 'slug': 'galaxy', 'errors': ['Nothing to update']}])
+
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.stock, self.product.price, self.product.discount), (12, Decimal('9999.50'), 10))
+
+        summary = apply_inventory_updates(self.distributor, [{'slug': 'galaxy', 'stock': 12}])
+        self.assertEqual((summary['updated'], summary['unchanged']), (0, 1))
+
+    def test_slug_owned_by_another_distributor_is_not_found(self):
+        summary = apply_inventory_updates(self.distributor, [{'slug': 'pixel', 'stock': 0}])
+        self.assertEqual(summary['not_found'], ['pixel'])
+        self.other.refresh_from_db()
+        self.assertEqual(self.other.stock, 4)
+
+    def test_bad_values_are_row_errors(self):
+        bad = [
+            {'price': '123456789012.5'}, {'price': 'nan'}, {'price': 'Infinity'}, {'price': '1e30'},
+            {'price': '0'}, {'price': 'abc'}, {'price': True},
+            {'stock': True}, {'stock': 5.9}, {'stock': -1}, {'stock': MAX_STOCK + 1}, {'stock': 'x'},
+            {'discount': False}, {'discount': 2.5}, {'discount': 101}, {'discount': '-1'},
+        ]
+        summary = apply_inventory_updates(self.distributor, [{'slug': 'galaxy', **values} for values in bad])
+        self.assertEqual(len(summary['errors']), len(bad))
+        self.assertEqual(summary['updated'], 0)
+
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.stock, self.product.price, self.product.discount), (10, Decimal('10000'), 0))
+
+    def test_whole_floats_and_strings_are_accepted(self):
+        summary = apply_inventory_updates(self.distributor, [{'slug': 'galaxy', 'stock': 6.0, 'discount': ' 5 '}])
+        self.assertEqual(summary['errors'], [])
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.stock, self.product.discount), (6, 5))
+
+
+class HeldStockTests(TestCase):
+    """Distributors write the count on hand; units held for unpaid orders stay off the shelf"""
+
+    def setUp(self):
+        self.distributor = _distributor()
+        self.product = _product(self.distributor, stock=10)
+        place_order(_shopper(), price_product(self.product.id, 3), DELIVERY)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 7)
+        self.assertEqual(StockReservation.objects.get().quantity, 3)
+
+    def test_sync_subtracts_held_units(self):
+        summary = apply_inventory_updates(self.distributor, [{'slug': self.product.slug, 'stock': 10}])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 7)
+        self.assertEqual(summary['unchanged'], 1)
+
+        apply_inventory_updates(self.distributor, [{'slug': self.product.slug, 'stock': 2}])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 0)
+
+    def test_edit_form_shows_and_saves_on_hand(self):
+        self.client.force_login(self.distributor)
+        url = reverse('edit_product', args=[self.product.id])
+        self.assertEqual(self.client.get(url).context['on_hand'], 10)
+
+        self.client.post(url, {
+            'brand': 'Samsung', 'model_name': 'Galaxy', 'price': '10000', 'discount': '0',
+            'features': 'Fast', 'stock': '12',
+        })
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 9)
+
+    def test_edit_form_rejects_negative_stock(self):
+        self.client.force_login(self.distributor)
+        response = self.client.post(reverse('edit_product', args=[self.product.id]), {'stock': '-4'})
+        self.assertEqual(response.status_code, 302)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 7)
+
+
+class OrderStatusViewTests(TestCase):
+    def setUp(self):
+        self.distributor = _distributor()
+        self.rival = _distributor('rival', '9000000001')
+        product = _product(self.distributor)
+        self.order = place_order(_shopper(), price_product(product.id, 1), DELIVERY)
+
+    def test_distributor_moves_only_their_orders_along_allowed_paths(self):
+        self.client.force_login(self.rival)
+        self.client.post(reverse('update_order_status', args=[self.order.id]), {'status': 'confirmed'})
+        self.assertEqual(Order.objects.get().status, 'pending')
+
+        self.client.force_login(self.distributor)
+        self.client.post(reverse('update_order_status', args=[self.order.id]), {'status': 'shipped'})
+        self.assertEqual(Order.objects.get().status, 'pending')
+        self.client.post(reverse('bulk_update_order_status'), {'status': 'confirmed', 'order_ids': [self.order.id]})
+        self.assertEqual(Order.objects.get().status, 'confirmed')
+
+    def test_bulk_update_rejects_bad_selections(self):
+        self.client.force_login(self.distributor)
+        for data in ({'status': 'confirmed', 'order_ids': ['x']}, {'status': 'lost', 'order_ids': [self.order.id]}):
+            response = self.client.post(reverse('bulk_update_order_status'), data)
+            self.assertRedirects(response, reverse('distributor_orders'), fetch_redirect_response=False)
+        self.assertEqual(Order.objects.get().status, 'pending')
+
+
+class DispatchTests(TestCase):
+    def setUp(self):
+        self.distributor = _distributor()
+        product = _product(self.distributor, stock=100)
+        shopper = _shopper()
+        # Five stops along one street, placed out of order, and one without coordinates
+        self.stops = {}
+        for offset in [4, 1, 3, 0, 2, None]:
+            location = {} if offset is None else {'latitude': '12.9700', 'longitude': f'{77.5900 + offset / 1000:.4f}'}
+            order = place_order(shopper, price_product(product.id, 1), delivery_details({**DELIVERY, **location}))
+            self.stops[offset] = order.id
+        Order.objects.update(status='confirmed')
+        self.cell = geohash(12.97, 77.59, 5)
+
+    def test_clusters_count_located_and_unlocated_orders(self):
+        result = cluster_open_orders(self.distributor)
+        self.assertEqual([(cluster['cell'], cluster['orders']) for cluster in result['clusters']], [(self.cell, 5)])
+        self.assertEqual(result['unlocated'], 1)
+
+    def test_batches_chain_nearest_stops_up_to_the_batch_size(self):
+        result = dispatch_batches(self.distributor, self.cell, batch_size=2, origin=(12.97, 77.60))
+        self.assertEqual(result['orders'], 5)
+        self.assertFalse(result['truncated'])
+        self.assertEqual(
+            [[stop['id'] for stop in batch] for batch in result['batches']],
+            [[self.stops[4], self.stops[3]], [self.stops[2], self.stops[1]], [self.stops[0]]],
+        )
+
+    def test_other_cells_and_closed_orders_are_left_out(self):
+        Order.objects.filter(id=self.stops[0]).update(status='shipped')
+        result = dispatch_batches(self.distributor, self.cell, batch_size=20)
+        self.assertEqual(sorted(stop['id'] for stop in result['batches'][0]), sorted(self.stops[offset] for offset in [1, 2, 3, 4]))
+        self.assertEqual(dispatch_batches(self.distributor, 'zzzzz')['batches'], [])
+
+
+class SharedOrderStatusTests(TestCase):
+    """An order with lines from two distributors cannot be moved by either one alone"""
+
+    def setUp(self):
+        self.distributor = _distributor()
+        self.rival = _distributor('rival', '9000000001')
+        shopper = _shopper()
+        products = [_product(self.distributor), _product(self.rival, model_name='Pixel')]
+        Cart.objects.bulk_create([Cart(user=shopper, product=product, quantity=1) for product in products])
+        self.shared = place_order(shopper, price_cart(shopper), DELIVERY)
+        self.own = place_order(shopper, price_product(products[0].id, 1), DELIVERY)
+        self.assertEqual(self.shared.distributor_links.count(), 2)
+
+    def status(self, order):
+        return Order.objects.get(id=order.id).status
+
+    def test_single_update_refuses_a_shared_order(self):
+        for distributor in (self.distributor, self.rival):
+            self.client.force_login(distributor)
+            self.client.post(reverse('update_order_status', args=[self.shared.id]), {'status': 'cancelled'})
+            self.assertEqual(self.status(self.shared), 'pending')
+
+        self.client.force_login(self.distributor)
+        self.client.post(reverse('update_order_status', args=[self.own.id]), {'status': 'confirmed'})
+        self.assertEqual(self.status(self.own), 'confirmed')
+
+    def test_bulk_update_skips_shared_orders(self):
+        self.client.force_login(self.distributor)
+        response = self.client.post(
+            reverse('bulk_update_order_status'), {'status': 'confirmed', 'order_ids': [self.shared.id, self.own.id]}, follow=True
+        )
+        self.assertEqual((self.status(self.shared), self.status(self.own)), ('pending', 'confirmed'))
+        self.assertIn(self.shared.order_id, ' '.join(str(message) for message in response.context['messages']))
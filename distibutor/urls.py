@@ -7,8 +7,13 @@ urlpatterns = [
     path('logout/', views.distributor_logout, name='distributor_logout'),
     path('dashboard/', views.distributor_dashboard, name='distributor_dashboard'),
     path('add-product/', views.add_product, name='add_product'),
+    path('import-products/', views.import_products_view, name='import_products'),
+    path('inventory/sync/', views.sync_inventory, name='sync_inventory'),
+    path('dispatch/clusters/', views.dispatch_clusters, name='dispatch_clusters'),
+    path('dispatch/batches/', views.dispatch_route_batches, name='dispatch_batches'),
     path('edit-product/<int:product_id>/', views.edit_product, name='edit_product'),
     path('delete-product/<int:product_id>/', views.delete_product, name='delete_product'),
     path('orders/', views.distributor_orders, name='distributor_orders'),
     path('update-order/<int:order_id>/', views.update_order_status, name='update_order_status'),
+    path('update-orders/', views.bulk_update_order_status, name='bulk_update_order_status'),
 ]
@@ -5,8 +5,18 @@ from django.contrib import messages
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.conf import settings
-from user.models import User, Product, Order, send_welcome_email
+from django.db import transaction
+from user.models import User, Product, Order
+from user.notifications import queue_welcome_email
 from django.utils.text import slugify
+from .importer import detect_format, import_products
+from .inventory import apply_inventory_updates
+from .dispatch import CLUSTER_PRECISION, DISPATCH_BATCH_SIZE, cluster_open_orders, dispatch_batches, valid_cell
+from user.orders import get_distributor_order_page
+from user.order_status import BULK_TRANSITION_LIMIT, distributor_movable_orders, transition_orders
+from user.geo import GEOHASH_PRECISION, parse_coordinates
+from user.sales import sales_summary
+from user.reservations import held_stock, stock_from_on_hand
 import json
 
 
@@ -36,17 +46,18 @@ def distributor_signup(request):
             messages.error(request, 'Phone number already registered!')
             return render(request, 'distributor/signup.html')
         
-        # Create distributor
-        user = User.objects.create_user(
-            username=username,
-            email=email,
-            phone=phone,
-            password=password,
-            user_type='distributor'
-        )
-        
-        # Send welcome email
-        send_welcome_email(user)
+        with transaction.atomic():
+            # Create distributor
+            user = User.objects.create_user(
+                username=username,
+                email=email,
+                phone=phone,
+                password=password,
+                user_type='distributor'
+            )
+            
+            # Queue welcome email for the notification worker
+            queue_welcome_email(user)
         
         messages.success(request, 'Distributor account created! Please login.')
         return redirect('distributor_login')
@@ -97,19 +108,14 @@ def distributor_dashboard(request):
     
     products = Product.objects.filter(distributor=request.user).order_by('-created_at')
     
-    # Get order statistics
-    total_orders = Order.objects.filter(
-        items__product__distributor=request.user
-    ).distinct().count()
-    
-    total_sales = 0
-    for product in products:
-        total_sales += product.stock  # This is simplified
+    # Sales figures come from the daily rollups, not the orders themselves
+    sales = sales_summary(request.user)
     
     context = {
         'products': products,
         'total_products': products.count(),
-        'total_orders': total_orders
+        'total_orders': sales['total_orders'],
+        'sales': sales
     }
     return render(request, 'distributor/dashboard.html', context)
 
@@ -176,6 +182,94 @@ def add_product(request):
     return render(request, 'distributor/add_product.html', {'brands': brands})
 
 
+@login_required
+def import_products_view(request):
+    """Bulk import products from an uploaded CSV or JSONL file"""
+    if request.user.user_type != 'distributor':
+        messages.error(request, 'Access denied!')
+        return redirect('login')
+    
+    result = None
+    if request.method == 'POST':
+        upload = request.FILES.get('file')
+        if not upload:
+            messages.error(request, 'Please choose a CSV or JSONL file!')
+            return redirect('import_products')
+        
+        result = import_products(request.user, upload.file, detect_format(upload.name)).as_dict()
+        
+        if 'application/json' in request.headers.get('Accept', ''):
+            return JsonResponse(result)
+        
+        messages.success(request, f"Imported {result['created']} products ({result['failed']} rows failed)")
+    
+    return render(request, 'distributor/import_products.html', {'result': result})
+
+
+@login_required
+def sync_inventory(request):
+    """Apply a JSON batch of stock/price/discount updates keyed by product slug"""
+    if request.user.user_type != 'distributor':
+        return JsonResponse({'error': 'Access denied'}, status=403)
+    
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST required'}, status=405)
+    
+    try:
+        data = json.loads(request.body)
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    
+    updates = data.get('updates') if isinstance(data, dict) else data
+    if not isinstance(updates, list):
+        return JsonResponse({'error': 'Expected a list of updates'}, status=400)
+    
+    return JsonResponse(apply_inventory_updates(request.user, updates))
+
+
+@login_required
+def dispatch_clusters(request):
+    """Open orders grouped into geohash cells: ?precision=1-9 (default 5)"""
+    if request.user.user_type != 'distributor':
+        return JsonResponse({'error': 'Access denied'}, status=403)
+    
+    try:
+        precision = int(request.GET.get('precision', CLUSTER_PRECISION))
+    except ValueError:
+        return JsonResponse({'error': 'precision must be a whole number'}, status=400)
+    if not 1 <= precision <= GEOHASH_PRECISION:
+        return JsonResponse({'error': f'precision must be between 1 and {GEOHASH_PRECISION}'}, status=400)
+    
+    return JsonResponse(cluster_open_orders(request.user, precision))
+
+
+@login_required
+def dispatch_route_batches(request):
+    """Nearest-neighbour dispatch batches for one cell: ?cell=<geohash>&size=20[&latitude=..&longitude=..]"""
+    if request.user.user_type != 'distributor':
+        return JsonResponse({'error': 'Access denied'}, status=403)
+    
+    cell = request.GET.get('cell', '').lower()
+    if not valid_cell(cell):
+        return JsonResponse({'error': 'cell must be a geohash'}, status=400)
+    
+    try:
+        size = int(request.GET.get('size', DISPATCH_BATCH_SIZE))
+    except ValueError:
+        return JsonResponse({'error': 'size must be a whole number'}, status=400)
+    if size < 1:
+        return JsonResponse({'error': 'size must be 1 or more'}, status=400)
+    
+    # Optional depot each batch starts nearest to
+    origin = None
+    if request.GET.get('latitude') or request.GET.get('longitude'):
+        origin = parse_coordinates(request.GET.get('latitude'), request.GET.get('longitude'))
+        if origin is None:
+            return JsonResponse({'error': 'Invalid latitude/longitude'}, status=400)
+    
+    return JsonResponse(dispatch_batches(request.user, cell, size, origin))
+
+
 @login_required
 def edit_product(request, product_id):
     """Edit existing product"""
@@ -186,13 +280,21 @@ def edit_product(request, product_id):
     product = get_object_or_404(Product, id=product_id, distributor=request.user)
     
     if request.method == 'POST':
+        # The form edits the count on hand; units held for unpaid orders are not on the shelf
+        try:
+            on_hand = int(request.POST.get('stock') or 0)
+        except ValueError:
+            on_hand = -1
+        if on_hand < 0:
+            messages.error(request, 'Stock must be a whole number of 0 or more!')
+            return redirect('edit_product', product_id=product.id)
+        
         product.brand = request.POST.get('brand')
         product.model_name = request.POST.get('model_name')
         product.price = request.POST.get('price')
         product.original_price = request.POST.get('original_price') or None
         product.discount = request.POST.get('discount', 0)
         product.features = request.POST.get('features')
-        product.stock = request.POST.get('stock', 0)
         
         # Specifications
         product.specifications = {
@@ -217,14 +319,19 @@ def edit_product(request, product_id):
         if request.FILES.get('image4'):
             product.image4 = request.FILES.get('image4')
         
-        product.save()
+        with transaction.atomic():
+            # Locking the row keeps new holds from landing between the read and the save
+            Product.objects.select_for_update().filter(id=product.id).exists()
+            product.stock = stock_from_on_hand(on_hand, held_stock([product.id]).get(product.id, 0))
+            product.save()
         messages.success(request, 'Product updated successfully!')
         return redirect('distributor_dashboard')
     
     brands = Product.BRAND_CHOICES
     context = {
         'product': product,
-        'brands': brands
+        'brands': brands,
+        'on_hand': product.stock + held_stock([product.id]).get(product.id, 0)
     }
     return render(request, 'distributor/edit_product.html', context)
 
@@ -249,13 +356,13 @@ def distributor_orders(request):
         messages.error(request, 'Access denied!')
         return redirect('login')
     
-    # Get orders containing distributor's products
-    orders = Order.objects.filter(
-        items__product__distributor=request.user
-    ).distinct().order_by('-created_at')
+    # Orders containing distributor's products, one page at a time
+    links, next_cursor = get_distributor_order_page(request.user, request.GET.get('cursor'))
     
     context = {
-        'orders': orders
+        'links': links,
+        'next_cursor': next_cursor,
+        'is_first_page': not request.GET.get('cursor')
     }
     return render(request, 'distributor/orders.html', context)
 
@@ -268,13 +375,67 @@ def update_order_status(request, order_id):
         return redirect('login')
     
     if request.method == 'POST':
-        order = get_object_or_404(Order, id=order_id)
         new_status = request.POST.get('status')
+        if new_status not in dict(Order.STATUS_CHOICES):
+            messages.error(request, 'Invalid status!')
+            return redirect('distributor_orders')
+        
+        # Only orders holding this distributor's products and nobody else's
+        orders, shared = distributor_movable_orders(request.user, [order_id])
+        if shared:
+            messages.error(request, f'Order {shared[0]} also holds other distributors\' items, so its status cannot be changed here!')
+            return redirect('distributor_orders')
+        moved, skipped = transition_orders(orders, new_status, changed_by=request.user)
+        
+        if moved:
+            messages.success(request, f'Order status updated to {new_status}!')
+        elif skipped:
+            order_code, status = skipped[0]
+            messages.error(request, f'Order {order_code} cannot go from {status} to {new_status}!')
+        else:
+            messages.error(request, 'Order not found!')
+        return redirect('distributor_orders')
+    
+    return redirect('distributor_orders')
+
+
+@login_required
+def bulk_update_order_status(request):
+    """Move a batch of selected orders to one status"""
+    if request.user.user_type != 'distributor':
+        messages.error(request, 'Access denied!')
+        return redirect('login')
+    
+    if request.method == 'POST':
+        new_status = request.POST.get('status')
+        try:
+            order_ids = {int(order_id) for order_id in request.POST.getlist('order_ids')}
+        except ValueError:
+            messages.error(request, 'Invalid order selection!')
+            return redirect('distributor_orders')
+        
+        if new_status not in dict(Order.STATUS_CHOICES):
+            messages.error(request, 'Invalid status!')
+            return redirect('distributor_orders')
+        if not order_ids:
+            messages.error(request, 'Select at least one order!')
+            return redirect('distributor_orders')
+        if len(order_ids) > BULK_TRANSITION_LIMIT:
+            messages.error(request, f'Select at most {BULK_TRANSITION_LIMIT} orders at a time!')
+            return redirect('distributor_orders')
         
-        order.status = new_status
-        order.save()
+        orders, shared = distributor_movable_orders(request.user, order_ids)
+        moved, skipped = transition_orders(orders, new_status, changed_by=request.user)
         
-        messages.success(request, f'Order status updated to {new_status}!')
+        if moved:
+            messages.success(request, f'{len(moved)} orders updated to {new_status}!')
+        if skipped:
+            examples = ', '.join(f'{order_code} ({status})' for order_code, status in skipped[:5])
+            messages.warning(request, f'{len(skipped)} orders cannot go to {new_status}: {examples}')
+        if shared:
+            messages.warning(request, f'{len(shared)} orders also hold other distributors\' items and were left alone: {", ".join(shared[:5])}')
+        if not moved and not skipped and not shared:
+            messages.error(request, 'No matching orders found!')
         return redirect('distributor_orders')
     
     return redirect('distributor_orders')
@@ -1,5 +1,15 @@
-from django.contrib import admin
+from decimal import Decimal
+
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.db import transaction
+from django.db.models import Count, F, Value
+from django.db.models.functions import Round
+from django.utils import timezone
 from .models import User, Distributor, Product, Cart, Order, OrderItem, Review
+from .page_cache import invalidate_product_pages
+from .paginators import ApproximateCountPaginator
 
 
 @admin.register(User)
@@ -19,15 +29,15 @@ class DistributorAdmin(admin.ModelAdmin):
     readonly_fields = ['password', 'last_login', 'created_at', 'updated_at']
     
     def get_queryset(self, request):
-        """Filter to show only distributor users"""
+        """Filter to show only distributor users, with their product counts in the same query"""
         queryset = super().get_queryset(request)
-        return queryset.filter(user_type='distributor')
+        return queryset.filter(user_type='distributor').annotate(product_count=Count('products'))
     
     def product_count(self, obj):
         """Show number of products added by this distributor"""
-        count = Product.objects.filter(distributor=obj).count()
-        return count
+        return obj.product_count
     product_count.short_description = 'Products'
+    product_count.admin_order_field = 'product_count'
 
 
 # Register DistributorAdmin with the Distributor proxy model (not the base User model)
@@ -35,12 +45,75 @@ class DistributorAdmin(admin.ModelAdmin):
 admin.site.register(Distributor, DistributorAdmin)
 
 
+class ProductActionForm(ActionForm):
+    """Action bar with a value for the bulk price and discount actions"""
+    value = forms.DecimalField(
+        required=False, max_digits=6, decimal_places=2,
+        help_text='Percent for "Change price" (e.g. -10) or "Set discount" (0-100)'
+    )
+
+
+def _update_products(queryset, **changes):
+    """Apply changes to the selected products with one UPDATE; returns the number changed"""
+    with transaction.atomic():
+        product_ids = list(queryset.values_list('id', flat=True))
+        updated = Product.objects.filter(id__in=product_ids).update(updated_at=timezone.now(), **changes)
+        # A queryset update skips the post_save signal that drops cached pages
+        transaction.on_commit(lambda: invalidate_product_pages(product_ids))
+    return updated
+
+
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
     list_display = ['brand', 'model_name', 'price', 'discount', 'stock', 'is_available', 'created_at']
     list_filter = ['brand', 'is_available', 'created_at']
     search_fields = ['model_name', 'brand']
     prepopulated_fields = {'slug': ('model_name',)}
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
+    action_form = ProductActionForm
+    actions = ['make_available', 'make_unavailable', 'change_price', 'set_discount']
+    
+    @admin.action(description='Mark selected products available')
+    def make_available(self, request, queryset):
+        updated = _update_products(queryset, is_available=True)
+        self.message_user(request, f'{updated} products marked available.')
+    
+    @admin.action(description='Mark selected products unavailable')
+    def make_unavailable(self, request, queryset):
+        updated = _update_products(queryset, is_available=False)
+        self.message_user(request, f'{updated} products marked unavailable.')
+    
+    @admin.action(description='Change price of selected products by a percent')
+    def change_price(self, request, queryset):
+        percent = request.POST.get('value')
+        try:
+            percent = Decimal(percent)
+        except (TypeError, ArithmeticError):
+            percent = None
+        if percent is None or not percent.is_finite():
+            self.message_user(request, 'Enter the price change as a percent, e.g. 5 or -10.', messages.ERROR)
+            return
+        if percent <= -100:
+            self.message_user(request, 'A price cannot drop by 100% or more.', messages.ERROR)
+            return
+        factor = (Decimal('100') + percent) / Decimal('100')
+        updated = _update_products(queryset, price=Round(F('price') * Value(factor), 2))
+        self.message_user(request, f'Changed the price of {updated} products by {percent}%.')
+    
+    @admin.action(description='Set discount of selected products')
+    def set_discount(self, request, queryset):
+        discount = request.POST.get('value')
+        try:
+            discount = Decimal(discount)
+        except (TypeError, ArithmeticError):
+            discount = None
+        if discount is None or not discount.is_finite() or discount != discount.to_integral_value() \
+                or not 0 <= discount <= 100:
+            self.message_user(request, 'Enter a whole discount percent from 0 to 100.', messages.ERROR)
+            return
+        updated = _update_products(queryset, discount=int(discount))
+        self.message_user(request, f'Set a {discount:.0f}% discount on {updated} products.')
 
 
 @admin.register(Cart)
@@ -48,6 +121,9 @@ class CartAdmin(admin.ModelAdmin):
     list_display = ['user', 'product', 'quantity', 'added_at']
     list_filter = ['added_at']
     search_fields = ['user__email', 'product__model_name']
+    list_select_related = ['user', 'product']
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(Order)
@@ -56,12 +132,18 @@ class OrderAdmin(admin.ModelAdmin):
     list_filter = ['status', 'payment_status', 'created_at']
     search_fields = ['order_id', 'user__email']
     readonly_fields = ['order_id', 'created_at', 'updated_at']
+    list_select_related = ['user']
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(OrderItem)
 class OrderItemAdmin(admin.ModelAdmin):
     list_display = ['order', 'product_name', 'product_price', 'quantity']
     search_fields = ['order__order_id', 'product_name']
+    list_select_related = ['order__user']
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(Review)
@@ -69,3 +151,6 @@ class ReviewAdmin(admin.ModelAdmin):
     list_display = ['product', 'user', 'rating', 'created_at']
     list_filter = ['rating', 'created_at']
     search_fields = ['user__email', 'product__model_name']
+    list_select_related = ['product', 'user']
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
@@ -0,0 +1,119 @@
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.http import Http404
+from django.utils import timezone
+
+from .models import (
+    ArchivedDistributorOrder, ArchivedOrder, ArchivedOrderItem, DistributorOrder, Order, OrderItem, OrderStatusHistory,
+)
+
+
+ARCHIVE_BATCH_SIZE = 500
+
+# Only orders that can no longer change are archived
+ARCHIVABLE_STATUSES = ['delivered', 'cancelled']
+
+
+def archive_cutoff(now=None, days=None):
+    """Orders last changed before this are old enough to archive"""
+    days = settings.ORDER_ARCHIVE_DAYS if days is None else days
+    return (now or timezone.now()) - timedelta(days=days)
+
+
+def archivable_orders(cutoff):
+    return Order.objects.filter(status__in=ARCHIVABLE_STATUSES, updated_at__lt=cutoff)
+
+
+def _copy(model, source, **extra):
+    """An unsaved ``model`` row holding every concrete field of ``source``"""
+    values = {field.attname: getattr(source, field.attname) for field in source._meta.concrete_fields}
+    return model(**values, **extra)
+
+
+def archive_batch(cutoff, batch_size=ARCHIVE_BATCH_SIZE):
+    """Move one batch of old orders, their items, distributor links and status history to the archive tables.
+
+    Returns (orders, items) moved; (0, 0) once nothing is left.
+    """
+    with transaction.atomic():
+        order_ids = list(
+            archivable_orders(cutoff).select_for_update().order_by('updated_at', 'id')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not order_ids:
+            return 0, 0
+
+        history = defaultdict(list)
+        for change in OrderStatusHistory.objects.filter(order_id__in=order_ids).order_by('created_at', 'id'):
+            history[change.order_id].append({
+                'from': change.from_status,
+                'to': change.to_status,
+                'changed_by': change.changed_by_id,
+                'at': change.created_at.isoformat(),
+            })
+
+        ArchivedOrder.objects.bulk_create([
+            _copy(ArchivedOrder, order, status_history=history[order.id])
+            for order in Order.objects.filter(id__in=order_ids)
+        ])
+        items = ArchivedOrderItem.objects.bulk_create([
+            _copy(ArchivedOrderItem, item) for item in OrderItem.objects.filter(order_id__in=order_ids)
+        ])
+        ArchivedDistributorOrder.objects.bulk_create([
+            _copy(ArchivedDistributorOrder, link) for link in DistributorOrder.objects.filter(order_id__in=order_ids)
+        ])
+
+        # Takes the items, distributor links, history and any stale holds with it
+        Order.objects.filter(id__in=order_ids).delete()
+
+    return len(order_ids), len(items)
+
+
+def archive_orders(days=None, batch_size=ARCHIVE_BATCH_SIZE, max_batches=None, dry_run=False):
+    """Archive every delivered or cancelled order untouched for ``days`` in bounded batches.
+
+    Each batch is its own transaction, so the hot tables are never locked for long and
+    an interrupted run loses nothing. A dry run only counts what is eligible.
+    Returns a report: orders, items, batches, seconds and orders_per_second.
+    """
+    cutoff = archive_cutoff(days=days)
+    started = time.monotonic()
+
+    if dry_run:
+        eligible = archivable_orders(cutoff)
+        orders = eligible.count()
+        items = OrderItem.objects.filter(order__in=eligible).count()
+        batches = -(-orders // batch_size)
+    else:
+        orders = items = batches = 0
+        while max_batches is None or batches < max_batches:
+            moved_orders, moved_items = archive_batch(cutoff, batch_size)
+            if not moved_orders:
+                break
+            orders += moved_orders
+            items += moved_items
+            batches += 1
+
+    seconds = time.monotonic() - started
+    return {
+        'cutoff': cutoff,
+        'orders': orders,
+        'items': items,
+        'batches': batches,
+        'seconds': seconds,
+        'orders_per_second': orders / seconds if seconds and not dry_run else None,
+    }
+
+
+def get_any_order(user, order_id):
+    """A shopper's order from the hot table, falling back to the archive; raises Http404"""
+    order = Order.objects.filter(order_id=order_id, user=user).first()
+    if order is None:
+        order = ArchivedOrder.objects.filter(order_id=order_id, user=user).first()
+    if order is None:
+        raise Http404('No order matches the given query.')
+    return order
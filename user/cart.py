@@ -0,0 +1,197 @@
+from django.core import signing
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, IntegerField, OuterRef, Subquery, Value, When
+from django.db.models.functions import Least
+
+from .models import Cart, Product
+from .page_cache import cart_product_ids, invalidate_cart_products
+from .pricing import price_cart, price_products
+
+
+CART_COOKIE = 'cart'
+CART_COOKIE_SALT = 'user.cart'
+CART_COOKIE_MAX_AGE = 60 * 60 * 24 * 30
+
+# Keeps the signed cookie well under browser size limits
+MAX_COOKIE_CART_LINES = 50
+
+
+def _stock_of_line():
+    """Current stock of a cart row's product, for clamping quantities inside an UPDATE"""
+    return Subquery(Product.objects.filter(pk=OuterRef('product_id')).values('stock')[:1])
+
+
+def clean_changes(lines):
+    """Read [{'product_id', 'quantity'}] into {product_id: quantity}, later entries winning"""
+    if not isinstance(lines, list):
+        raise ValueError('lines must be a list')
+    changes = {}
+    for line in lines:
+        try:
+            changes[int(line['product_id'])] = max(int(line['quantity']), 0)
+        except (KeyError, TypeError, ValueError):
+            raise ValueError('Each line needs a numeric product_id and quantity')
+    return changes
+
+
+class DatabaseCart:
+    """Cart rows stored against a signed-in user"""
+
+    def __init__(self, user):
+        self.user = user
+
+    def product_ids(self):
+        return cart_product_ids(self.user)
+
+    def price(self):
+        return price_cart(self.user)
+
+    def _drop_empty(self, product_ids):
+        """Delete lines an UPDATE clamped to nothing because the product sold out"""
+        Cart.objects.filter(user=self.user, product_id__in=product_ids, quantity__lte=0).delete()
+
+    def add(self, product, quantity):
+        """Increment in the database, clamped to stock, so concurrent adds never lose an update"""
+        lines = Cart.objects.filter(user=self.user, product=product)
+        if not lines.update(quantity=Least(F('quantity') + quantity, _stock_of_line())):
+            if min(quantity, product.stock) <= 0:
+                return
+            try:
+                with transaction.atomic():
+                    Cart.objects.create(user=self.user, product=product, quantity=min(quantity, product.stock))
+                return
+            except IntegrityError:
+                # Another request inserted the row first
+                lines.update(quantity=Least(F('quantity') + quantity, _stock_of_line()))
+        self._drop_empty([product.id])
+
+    def set_quantity(self, product_id, quantity):
+        self.apply_changes({product_id: quantity})
+
+    def apply_changes(self, changes):
+        """Set several line quantities in one transaction: one DELETE and one clamped UPDATE"""
+        removed = [product_id for product_id, quantity in changes.items() if quantity <= 0]
+        kept = {product_id: quantity for product_id, quantity in changes.items() if quantity > 0}
+        with transaction.atomic():
+            if removed:
+                Cart.objects.filter(user=self.user, product_id__in=removed).delete()
+            if kept:
+                Cart.objects.filter(user=self.user, product_id__in=kept).update(quantity=Least(
+                    Case(
+                        *[When(product_id=product_id, then=Value(quantity)) for product_id, quantity in kept.items()],
+                        output_field=IntegerField(),
+                    ),
+                    _stock_of_line(),
+                ))
+                self._drop_empty(kept)
+
+    def remove(self, product_id):
+        Cart.objects.filter(user=self.user, product_id=product_id).delete()
+
+    def clear(self):
+        Cart.objects.filter(user=self.user).delete()
+
+
+class CookieCart:
+    """Anonymous cart kept in a signed cookie, so browsing costs no database writes"""
+
+    def __init__(self, request):
+        self.lines = self._load(request)
+        self.modified = False
+
+    @staticmethod
+    def _load(request):
+        data = request.COOKIES.get(CART_COOKIE)
+        if not data:
+            return {}
+        try:
+            lines = signing.loads(data, salt=CART_COOKIE_SALT, max_age=CART_COOKIE_MAX_AGE)
+            return {int(product_id): int(quantity) for product_id, quantity in lines.items()}
+        except (signing.BadSignature, ValueError, TypeError, AttributeError):
+            return {}
+
+    def product_ids(self):
+        return set(self.lines)
+
+    def price(self):
+        return price_products(self.lines)
+
+    def add(self, product, quantity):
+        if product.id not in self.lines and len(self.lines) >= MAX_COOKIE_CART_LINES:
+            return
+        quantity = min(self.lines.get(product.id, 0) + quantity, product.stock)
+        if quantity <= 0:
+            self.remove(product.id)
+            return
+        self.lines[product.id] = quantity
+        self.modified = True
+
+    def set_quantity(self, product_id, quantity):
+        self.apply_changes({product_id: quantity})
+
+    def apply_changes(self, changes):
+        """Set several line quantities, clamped to stock read in one query"""
+        kept = [product_id for product_id, quantity in changes.items() if quantity > 0 and product_id in self.lines]
+        stock = dict(Product.objects.filter(id__in=kept).values_list('id', 'stock')) if kept else {}
+        for product_id, quantity in changes.items():
+            if quantity <= 0 or stock.get(product_id, 0) <= 0:
+                self.remove(product_id)
+            else:
+                self.lines[product_id] = min(quantity, stock[product_id])
+                self.modified = True
+
+    def remove(self, product_id):
+        if self.lines.pop(product_id, None) is not None:
+            self.modified = True
+
+    def clear(self):
+        if self.lines:
+            self.lines = {}
+            self.modified = True
+
+    def save(self, response):
+        """Write the cookie back, or drop it once the cart is empty"""
+        if self.lines:
+            response.set_cookie(
+                CART_COOKIE, signing.dumps(self.lines, salt=CART_COOKIE_SALT, compress=True),
+                max_age=CART_COOKIE_MAX_AGE, httponly=True, samesite='Lax',
+            )
+        else:
+            response.delete_cookie(CART_COOKIE, samesite='Lax')
+
+
+def get_cart(request):
+    """The cart for this request, whichever backend holds it"""
+    if request.user.is_authenticated:
+        return DatabaseCart(request.user)
+    if not hasattr(request, '_cookie_cart'):
+        request._cookie_cart = CookieCart(request)
+    return request._cookie_cart
+
+
+def merge_cookie_cart(request, user):
+    """Fold an anonymous cookie cart into the user's Cart rows with one bulk upsert"""
+    cookie_cart = getattr(request, '_cookie_cart', None) or CookieCart(request)
+    if not cookie_cart.lines:
+        return 0
+
+    # Stock and any existing cart quantity for every cookie line in one query
+    products = Product.objects.filter(id__in=cookie_cart.lines, is_available=True).annotate(
+        in_cart=Subquery(Cart.objects.filter(user=user, product=OuterRef('pk')).values('quantity')[:1])
+    ).values_list('id', 'stock', 'in_cart')
+
+    rows = []
+    for product_id, stock, in_cart in products:
+        quantity = min(stock, (in_cart or 0) + cookie_cart.lines[product_id])
+        if quantity > 0:
+            rows.append(Cart(user=user, product_id=product_id, quantity=quantity))
+
+    Cart.objects.bulk_create(
+        rows, update_conflicts=True, unique_fields=['user', 'product'], update_fields=['quantity']
+    )
+    invalidate_cart_products(user.id)
+
+    # The middleware drops the cookie on the way out
+    cookie_cart.clear()
+    request._cookie_cart = cookie_cart
+    return len(rows)
@@ -0,0 +1,118 @@
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+from django.db.models.functions import Substr
+
+from .models import Product
+from .search import get_search_backend
+from .specs import apply_spec_filters
+
+
+CATALOG_PAGE_SIZE = 24
+
+# Fields the product cards actually render
+CARD_FIELDS = [
+    'id', 'brand', 'model_name', 'slug', 'image1', 'image_variants', 'price', 'discount', 'stock', 'created_at',
+    'average_rating', 'review_count',
+]
+
+# Sort name -> (keyset field, descending, cursor value parser); id breaks ties ascending
+CATALOG_SORTS = {
+    'newest': ('created_at', True, datetime.fromisoformat),
+    'rating': ('average_rating', True, float),
+    'relevance': ('search_rank', False, float),
+}
+
+
+def catalog_queryset(brand=None, search=None, spec_filters=None):
+    """Available products with only the card fields loaded"""
+    products = Product.objects.filter(is_available=True).only(*CARD_FIELDS).annotate(
+        features_preview=Substr('features', 1, 160)
+    )
+
+    if brand:
+        products = products.filter(brand=brand)
+
+    if spec_filters:
+        products = apply_spec_filters(products, spec_filters)
+
+    if search:
+        products = get_search_backend().search(products, search)
+
+    return products
+
+
+def encode_cursor(*values):
+    """Encode a keyset position as an opaque cursor"""
+    raw = '|'.join(str(value) for value in values)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, *types):
+    """Decode a cursor back to a tuple of the given types, or None if it is malformed"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+        if len(values) != len(types):
+            return None
+        return tuple(cast(value) for cast, value in zip(types, values))
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def resolve_sort(requested, search=None):
+    """Pick a supported sort order, defaulting to relevance for searches"""
+    if requested in CATALOG_SORTS and (requested != 'relevance' or search):
+        return requested
+    return 'relevance' if search else 'newest'
+
+
+def _cursor_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, float):
+        return repr(value)
+    return value
+
+
+def get_catalog_page(products, cursor=None, sort='newest', page_size=CATALOG_PAGE_SIZE):
+    """Return (products, next_cursor) for one keyset page ordered on (sort key, id)"""
+    field, descending, parse = CATALOG_SORTS[sort]
+    products = products.order_by(f"{'-' if descending else ''}{field}", 'id')
+
+    position = decode_cursor(cursor, parse, int) if cursor else None
+    if position:
+        value, product_id = position
+        past = f"{field}__{'lt' if descending else 'gt'}"
+        products = products.filter(
+            Q(**{past: value}) | Q(**{field: value, 'id__gt': product_id})
+        )
+
+    # Fetch one extra row to know whether another page exists
+    page = list(products[:page_size + 1])
+    next_cursor = None
+    if len(page) > page_size:
+        page = page[:page_size]
+        last = page[-1]
+        next_cursor = encode_cursor(_cursor_value(getattr(last, field)), last.id)
+
+    return page, next_cursor
+
+
+def product_card_data(product):
+    """Serialise a product card for the infinite-scroll feed"""
+    return {
+        'id': product.id,
+        'brand': product.brand,
+        'model_name': product.model_name,
+        'slug': product.slug,
+        'image': product.card_image,
+        'price': str(product.price),
+        'discounted_price': str(product.get_discounted_price()),
+        'discount': product.discount,
+        'in_stock': product.stock > 0,
+        'average_rating': round(product.average_rating, 1),
+        'review_count': product.review_count,
+        'features': product.features_preview,
+    }
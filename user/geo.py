@@ -0,0 +1,75 @@
+import math
+
+
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+# Stored precision: 9 characters is a cell of roughly 5m x 5m
+GEOHASH_PRECISION = 9
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def parse_coordinates(latitude, longitude):
+    """(latitude, longitude) as floats from form values, or None if missing or out of range"""
+    try:
+        latitude, longitude = float(latitude), float(longitude)
+    except (TypeError, ValueError):
+        return None
+    if not (math.isfinite(latitude) and math.isfinite(longitude)):
+        return None
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return None
+    return latitude, longitude
+
+
+def geohash(latitude, longitude, precision=GEOHASH_PRECISION):
+    """Geohash of a point; points sharing a prefix share a cell, and sorting keeps neighbours close"""
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars = []
+    bits = value = 0
+    even = True
+    while len(chars) < precision:
+        # Bits alternate between longitude and latitude, halving the range each time
+        span, coordinate = (lng_range, longitude) if even else (lat_range, latitude)
+        middle = (span[0] + span[1]) / 2
+        if coordinate >= middle:
+            value = value << 1 | 1
+            span[0] = middle
+        else:
+            value <<= 1
+            span[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits = value = 0
+    return ''.join(chars)
+
+
+def haversine_km(a, b):
+    """Great-circle distance in km between two (latitude, longitude) points"""
+    lat1, lng1, lat2, lng2 = map(math.radians, (a[0], a[1], b[0], b[1]))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(h))
+
+
+def nearest_neighbour_batches(stops, batch_size, origin=None, position=lambda stop: stop):
+    """Split stops into batches of up to batch_size by chaining each stop to its nearest unvisited one.
+
+    Each batch starts from the stop nearest ``origin`` (or the first stop left when no
+    origin is given). ``position`` maps a stop to its (latitude, longitude).
+    """
+    remaining = list(stops)
+    batches = []
+    while remaining:
+        if origin is None:
+            current = remaining.pop(0)
+        else:
+            current = remaining.pop(min(range(len(remaining)), key=lambda i: haversine_km(origin, position(remaining[i]))))
+        batch = [current]
+        while remaining and len(batch) < batch_size:
+            here = position(current)
+            current = remaining.pop(min(range(len(remaining)), key=lambda i: haversine_km(here, position(remaining[i]))))
+            batch.append(current)
+        batches.append(batch)
+    return batches
@@ -0,0 +1,113 @@
+import time
+import uuid
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseRedirect
+from django.utils import timezone
+
+from .models import IdempotencyKey
+
+
+IDEMPOTENCY_FIELD = 'idempotency_key'
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+
+# How long a duplicate waits for the first submission to finish before giving up
+IN_FLIGHT_WAIT_SECONDS = 5
+IN_FLIGHT_POLL_SECONDS = 0.1
+
+
+def new_idempotency_key():
+    """Token rendered into a form so its resubmissions can be recognised"""
+    return uuid.uuid4().hex
+
+
+def _claim(user, scope, key):
+    """Insert the key as in flight; returns the new row, or None if it already exists"""
+    try:
+        with transaction.atomic():
+            return IdempotencyKey.objects.create(
+                user=user, scope=scope, key=key,
+                expires_at=timezone.now() + timedelta(hours=settings.IDEMPOTENCY_KEY_HOURS),
+            )
+    except IntegrityError:
+        return None
+
+
+def _wait_for_outcome(user, scope, key):
+    """The stored outcome of an earlier submission, waiting while it is still in flight.
+
+    Returns None if the earlier row has expired (and removes it) so the caller can retry.
+    """
+    deadline = time.monotonic() + IN_FLIGHT_WAIT_SECONDS
+    while True:
+        record = IdempotencyKey.objects.filter(user=user, scope=scope, key=key).first()
+        if record is None:
+            return None
+        if record.expires_at <= timezone.now():
+            record.delete()
+            return None
+        if record.response_status is not None or time.monotonic() >= deadline:
+            return record
+        time.sleep(IN_FLIGHT_POLL_SECONDS)
+
+
+def idempotent(scope):
+    """Run a POST view once per idempotency key and replay its redirect for duplicates.
+
+    The key comes from the Idempotency-Key header or the idempotency_key form field;
+    requests without one run as before.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            key = request.headers.get(IDEMPOTENCY_HEADER) or request.POST.get(IDEMPOTENCY_FIELD)
+            if request.method != 'POST' or not key:
+                return view(request, *args, **kwargs)
+            if len(key) > 64:
+                return HttpResponseBadRequest('Invalid idempotency key')
+
+            record = _claim(request.user, scope, key)
+            while record is None:
+                earlier = _wait_for_outcome(request.user, scope, key)
+                if earlier is None:
+                    record = _claim(request.user, scope, key)
+                elif earlier.response_status is None:
+                    return HttpResponse('This request is already being processed.', status=409)
+                else:
+                    response = HttpResponseRedirect(earlier.response_location)
+                    response.status_code = earlier.response_status
+                    return response
+
+            try:
+                response = view(request, *args, **kwargs)
+            except Exception:
+                record.delete()
+                raise
+
+            if 300 <= response.status_code < 400 and response.has_header('Location'):
+                IdempotencyKey.objects.filter(id=record.id).update(
+                    response_status=response.status_code, response_location=response['Location']
+                )
+            else:
+                # Only redirects can be replayed; anything else may simply be retried
+                record.delete()
+            return response
+        return wrapper
+    return decorator
+
+
+def purge_expired_keys(batch_size=1000, now=None):
+    """Delete expired keys in small batches through the expires_at index"""
+    now = now or timezone.now()
+    purged = 0
+    while True:
+        ids = list(
+            IdempotencyKey.objects.filter(expires_at__lte=now).order_by('expires_at')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return purged
+        purged += IdempotencyKey.objects.filter(id__in=ids).delete()[0]
@@ -0,0 +1,147 @@
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+
+logger = logging.getLogger(__name__)
+
+IMAGE_FIELDS = ['image1', 'image2', 'image3', 'image4']
+
+# Variant name -> target width in pixels
+VARIANT_WIDTHS = {
+    'thumb': 160,
+    'card': 400,
+    'zoom': 1200,
+}
+VARIANT_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+_executor = None
+
+
+def get_executor():
+    """Process pool shared by every variant job in this worker"""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=getattr(settings, 'IMAGE_VARIANT_WORKERS', 2))
+    return _executor
+
+
+def variant_name(name, variant, fmt):
+    """products/download.jpg -> products/variants/download/card.webp"""
+    directory, filename = os.path.split(name)
+    stem = os.path.splitext(filename)[0]
+    return f'{directory}/variants/{stem}/{variant}.{fmt}'
+
+
+def render_variants(source_path, target_dir):
+    """Write every size/format variant of one image. Runs in a pool process."""
+    os.makedirs(target_dir, exist_ok=True)
+    with Image.open(source_path) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+
+        for variant, width in VARIANT_WIDTHS.items():
+            resized = image.copy()
+            resized.thumbnail((width, width * 4), Image.LANCZOS)
+
+            # JPEG has no alpha channel, so flatten transparent images onto white
+            flat = resized
+            if resized.mode == 'RGBA':
+                flat = Image.new('RGB', resized.size, (255, 255, 255))
+                flat.paste(resized, mask=resized.getchannel('A'))
+
+            for fmt, (pil_format, options) in VARIANT_FORMATS.items():
+                target = os.path.join(target_dir, f'{variant}.{fmt}')
+                (flat if pil_format == 'JPEG' else resized).save(target, pil_format, **options)
+
+
+def variant_job(name):
+    source_path = default_storage.path(name)
+    target_dir = os.path.dirname(default_storage.path(variant_name(name, 'card', 'jpg')))
+    return source_path, target_dir
+
+
+def stale_image_fields(product):
+    """Image fields whose stored variants are missing or belong to an older upload"""
+    done = product.image_variants or {}
+    return {
+        field: getattr(product, field).name
+        for field in IMAGE_FIELDS
+        if getattr(product, field) and done.get(field) != getattr(product, field).name
+    }
+
+
+def _mark_variants_ready(product_id, names):
+    """Record finished variants, ignoring fields re-uploaded while the job ran"""
+    from .models import Product
+    from .page_cache import invalidate_product_page
+
+    close_old_connections()
+    try:
+        with transaction.atomic():
+            product = Product.objects.select_for_update().only('image_variants', *IMAGE_FIELDS).filter(id=product_id).first()
+            if product is None:
+                return
+            variants = dict(product.image_variants or {})
+            for field, name in names.items():
+                if getattr(product, field).name == name:
+                    variants[field] = name
+            Product.objects.filter(id=product_id).update(image_variants=variants)
+        invalidate_product_page(product_id)
+    finally:
+        close_old_connections()
+
+
+def render_product_variants(jobs):
+    """Render every (source_path, target_dir) job for one product. Runs in a pool process."""
+    for source_path, target_dir in jobs:
+        render_variants(source_path, target_dir)
+
+
+def schedule_image_variants(product):
+    """Render a product's stale image variants in the process pool after commit"""
+    names = stale_image_fields(product)
+    if not names:
+        return
+
+    def submit():
+        jobs = [variant_job(name) for name in names.values()]
+        future = get_executor().submit(render_product_variants, jobs)
+
+        def on_done(future):
+            if future.exception() is None:
+                _mark_variants_ready(product.id, names)
+            else:
+                logger.error('Error rendering image variants for product %s', product.id, exc_info=future.exception())
+
+        future.add_done_callback(on_done)
+
+    transaction.on_commit(submit)
+
+
+def image_set(product, field):
+    """URLs for one image field: the original plus srcset strings once variants exist"""
+    image = getattr(product, field)
+    if not image:
+        return None
+
+    images = {'src': image.url, 'thumb': image.url, 'srcset': '', 'webp_srcset': ''}
+    if (product.image_variants or {}).get(field) == image.name:
+        urls = {
+            fmt: {variant: default_storage.url(variant_name(image.name, variant, fmt)) for variant in VARIANT_WIDTHS}
+            for fmt in VARIANT_FORMATS
+        }
+        images['src'] = urls['jpg']['card']
+        images['thumb'] = urls['jpg']['thumb']
+        images['srcset'] = ', '.join(f"{urls['jpg'][v]} {w}w" for v, w in VARIANT_WIDTHS.items())
+        images['webp_srcset'] = ', '.join(f"{urls['webp'][v]} {w}w" for v, w in VARIANT_WIDTHS.items())
+    return images
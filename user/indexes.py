@@ -0,0 +1,33 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector
+from django.db.models import TextField
+from django.db.models.functions import Cast
+
+
+# Text search configuration for the vector and every query run against it. Only the
+# two-argument to_tsvector is IMMUTABLE, which an index expression must be.
+SEARCH_CONFIG = 'english'
+
+
+def product_search_vector():
+    """Weighted tsvector over a product's text; the GIN index is built on exactly this expression"""
+    return (
+        SearchVector('brand', weight='A', config=SEARCH_CONFIG) +
+        SearchVector('model_name', weight='A', config=SEARCH_CONFIG) +
+        SearchVector(Cast('specifications', TextField()), weight='B', config=SEARCH_CONFIG) +
+        SearchVector('features', weight='C', config=SEARCH_CONFIG)
+    )
+
+
+class PostgresGinIndex(GinIndex):
+    """GIN index that only exists on PostgreSQL; SQLite searches an FTS5 table instead"""
+
+    def create_sql(self, model, schema_editor, using='', **kwargs):
+        if schema_editor.connection.vendor != 'postgresql':
+            return ''
+        return super().create_sql(model, schema_editor, using=using, **kwargs)
+
+    def remove_sql(self, model, schema_editor, **kwargs):
+        if schema_editor.connection.vendor != 'postgresql':
+            return ''
+        return super().remove_sql(model, schema_editor, **kwargs)
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from user.archive import ARCHIVE_BATCH_SIZE, archive_orders
+
+
+class Command(BaseCommand):
+    help = 'Move old delivered and cancelled orders into the archive tables in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='Archive orders untouched this many days (default ORDER_ARCHIVE_DAYS)')
+        parser.add_argument('--batch-size', type=int, default=ARCHIVE_BATCH_SIZE)
+        parser.add_argument('--max-batches', type=int, help='Stop after this many batches')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be archived')
+
+    def handle(self, *args, **options):
+        report = archive_orders(
+            days=options['days'], batch_size=options['batch_size'],
+            max_batches=options['max_batches'], dry_run=options['dry_run']
+        )
+        cutoff = report['cutoff'].strftime('%Y-%m-%d %H:%M')
+
+        if options['dry_run']:
+            self.stdout.write(
+                f"Would archive {report['orders']} orders ({report['items']} items) last changed before {cutoff}, "
+                f"in {report['batches']} batches of {options['batch_size']}"
+            )
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {report['orders']} orders ({report['items']} items) last changed before {cutoff} "
+            f"in {report['batches']} batches"
+        ))
+        if report['orders_per_second']:
+            self.stdout.write(f"{report['seconds']:.1f}s, {report['orders_per_second']:.0f} orders/s")
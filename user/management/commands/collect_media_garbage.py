@@ -0,0 +1,70 @@
+import os
+import shutil
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from user.images import IMAGE_FIELDS
+from user.models import MediaBlob, Product
+from user.storage import product_media_storage, recount_references
+
+
+class Command(BaseCommand):
+    help = 'Delete product media files that no product references any more'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be deleted without deleting')
+        parser.add_argument('--recount', action='store_true', help='Recompute reference counts from the product table first')
+        parser.add_argument('--scan', action='store_true', help='Also track files on disk that no blob row knows about')
+        parser.add_argument('--grace-hours', type=int, default=24,
+                            help='Keep unreferenced files this long, covering uploads whose product is not saved yet')
+
+    def handle(self, *args, **options):
+        storage = product_media_storage()
+
+        if options['recount']:
+            changed = recount_references(Product, MediaBlob, IMAGE_FIELDS)
+            self.stdout.write(f'Corrected {changed} reference counts')
+
+        if options['scan']:
+            self.stdout.write(f'Tracked {self.scan_untracked(storage)} untracked files')
+
+        cutoff = timezone.now() - timedelta(hours=options['grace_hours'])
+        garbage = MediaBlob.objects.filter(ref_count__lte=0, updated_at__lt=cutoff).order_by('id')
+
+        deleted = freed = 0
+        for blob in garbage.iterator():
+            size = storage.size(blob.name) if storage.exists(blob.name) else 0
+            if options['dry_run']:
+                self.stdout.write(f'Would delete {blob.name} ({size} bytes)')
+            else:
+                self.delete_blob(storage, blob)
+            deleted += 1
+            freed += size
+
+        verb = 'Would free' if options['dry_run'] else 'Freed'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {freed} bytes across {deleted} files'))
+
+    def delete_blob(self, storage, blob):
+        """Delete a file and its rendered variants, unless it was re-referenced meanwhile"""
+        if not MediaBlob.objects.filter(id=blob.id, ref_count__lte=0).delete()[0]:
+            return
+        storage.delete(blob.name)
+        directory, filename = os.path.split(storage.path(blob.name))
+        shutil.rmtree(os.path.join(directory, 'variants', os.path.splitext(filename)[0]), ignore_errors=True)
+
+    def scan_untracked(self, storage):
+        """Create zero-reference rows for product files on disk with no blob row"""
+        root = storage.path('products')
+        names = []
+        for directory, subdirectories, files in os.walk(root):
+            subdirectories[:] = [name for name in subdirectories if name != 'variants']
+            for filename in files:
+                names.append(os.path.relpath(os.path.join(directory, filename), storage.location).replace(os.sep, '/'))
+
+        known = set(MediaBlob.objects.filter(name__in=names).values_list('name', flat=True))
+        MediaBlob.objects.bulk_create(
+            [MediaBlob(name=name) for name in names if name not in known], ignore_conflicts=True, batch_size=500
+        )
+        return len(names) - len(known)
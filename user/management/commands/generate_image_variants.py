@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand
+
+from user.images import IMAGE_FIELDS, variant_job, get_executor, render_product_variants, stale_image_fields
+from user.models import Product
+from user.page_cache import invalidate_product_page
+
+
+class Command(BaseCommand):
+    help = 'Render resized image variants for products that are missing them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Re-render variants that already exist')
+        parser.add_argument('--batch-size', type=int, default=100)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        products = Product.objects.only('id', 'image_variants', *IMAGE_FIELDS).order_by('id')
+        rendered = failed = 0
+
+        batch = []
+        for product in products.iterator(chunk_size=batch_size):
+            if options['force']:
+                product.image_variants = {}
+            names = stale_image_fields(product)
+            if names:
+                batch.append((product, names))
+            if len(batch) >= batch_size:
+                done, errors = self.render_batch(batch)
+                rendered, failed = rendered + done, failed + errors
+                batch = []
+        if batch:
+            done, errors = self.render_batch(batch)
+            rendered, failed = rendered + done, failed + errors
+
+        self.stdout.write(self.style.SUCCESS(f'Rendered variants for {rendered} products ({failed} failed)'))
+
+    def render_batch(self, batch):
+        """Render one batch across the process pool, then record it in one bulk update"""
+        futures = [
+            (product, names, get_executor().submit(render_product_variants, [variant_job(name) for name in names.values()]))
+            for product, names in batch
+        ]
+
+        finished = []
+        for product, names, future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                self.stderr.write(f'Product {product.id}: {e}')
+                continue
+            product.image_variants = dict(product.image_variants or {}, **names)
+            finished.append(product)
+
+        Product.objects.bulk_update(finished, ['image_variants'])
+        for product in finished:
+            invalidate_product_page(product.id)
+        return len(finished), len(futures) - len(finished)
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from user.notifications import NOTIFICATION_BATCH_SIZE, drain, queue_depth
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued emails and SMS from the notification outbox in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=NOTIFICATION_BATCH_SIZE)
+        parser.add_argument('--loop', action='store_true', help='Keep polling instead of exiting once the queue is empty')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds to sleep between polls with --loop')
+        parser.add_argument('--stats', action='store_true', help='Only print the queue depth')
+
+    def write_depth(self):
+        depth = queue_depth()
+        self.stdout.write(f"Queue depth: {depth['due']} due, {depth['scheduled']} awaiting retry, {depth['failed']} failed")
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            self.write_depth()
+            return
+
+        while True:
+            sent, failed = drain(batch_size=options['batch_size'])
+            if sent or failed or not options['loop']:
+                self.stdout.write(self.style.SUCCESS(f'Sent {sent} notifications ({failed} failed)'))
+                self.write_depth()
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from user.sales import rebuild_sales_rollups
+
+
+class Command(BaseCommand):
+    help = 'Recompute the daily per-distributor and per-product sales rollups from order items'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        products, distributors = rebuild_sales_rollups(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {products} product and {distributors} distributor daily sales rows'
+        ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from user.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the product full-text search index'
+
+    def handle(self, *args, **options):
+        count = get_search_backend().rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} products'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from user.ratings import reconcile_ratings
+
+
+class Command(BaseCommand):
+    help = 'Recompute stored product rating aggregates from reviews'
+
+    def handle(self, *args, **options):
+        fixed = reconcile_ratings()
+        self.stdout.write(self.style.SUCCESS(f'Reconciled {fixed} products'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from user.reservations import release_expired_reservations
+
+
+class Command(BaseCommand):
+    help = 'Return stock held by unpaid orders past their reservation expiry and cancel those orders'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        released, cancelled = release_expired_reservations(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Released {released} reservations, cancelled {cancelled} orders'))
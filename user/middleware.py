@@ -0,0 +1,12 @@
+class CartCookieMiddleware:
+    """Persist an anonymous shopper's cookie cart when a view changed it"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        cookie_cart = getattr(request, '_cookie_cart', None)
+        if cookie_cart is not None and cookie_cart.modified:
+            cookie_cart.save(response)
+        return response
@@ -0,0 +1,17 @@
+# Generated by Django 6.0.2 on 2026-10-18 00:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0002_distributor'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_available', '-created_at', 'id'], name='product_catalog_idx'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 6.0.2 on 2026-10-18 00:15
+
+from django.db import migrations
+
+
+SEARCH_TABLE = 'user_product_search'
+
+
+def create_search_index(apps, schema_editor):
+    # PostgreSQL searches through the GIN index declared on Product; SQLite needs an FTS5 table
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+
+    Product = apps.get_model('user', 'Product')
+    product_table = Product._meta.db_table
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+        "brand, model_name, features, specifications, "
+        "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+    )
+    schema_editor.execute(
+        f"INSERT INTO {SEARCH_TABLE} (rowid, brand, model_name, features, specifications) "
+        f"SELECT id, brand, model_name, COALESCE(features, ''), "
+        f"COALESCE((SELECT group_concat(value, ' ') FROM json_each({product_table}.specifications)), '') "
+        f"FROM {product_table}"
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0003_product_catalog_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,106 @@
+# Generated by Django 6.0.2 on 2026-10-18 00:16
+
+import re
+from decimal import Decimal, InvalidOperation
+
+from django.db import migrations, models
+
+
+# The spec parsers as they were when these columns were added, copied here so later
+# changes to user/specs.py cannot change what this migration writes
+NUMBER_RE = re.compile(r'(\d+(?:\.\d+)?)\s*([a-zA-Z"]*)')
+CAPACITY_RE = re.compile(r'(\d+(?:\.\d+)?)\s*([tgm])b\b', re.IGNORECASE)
+BARE_NUMBER_RE = re.compile(r'(?<![\w.])(\d+(?:\.\d+)?)(?![\w.])')
+
+
+def _first_number(text):
+    match = NUMBER_RE.search(str(text or ''))
+    if not match:
+        return None, ''
+    return Decimal(match.group(1)), match.group(2).lower()
+
+
+def parse_capacity_gb(text):
+    text = str(text or '')
+    match = CAPACITY_RE.search(text)
+    if match:
+        value, unit = Decimal(match.group(1)), match.group(2).lower()
+    else:
+        match = BARE_NUMBER_RE.search(text)
+        if not match:
+            return None
+        value, unit = Decimal(match.group(1)), 'g'
+    if unit == 't':
+        value *= 1024
+    elif unit == 'm':
+        value /= 1024
+    return int(value) or None
+
+
+def parse_battery_mah(text):
+    value, unit = _first_number(str(text or '').replace(',', ''))
+    if value is None:
+        return None
+    return int(value)
+
+
+def parse_display_inches(text):
+    value, unit = _first_number(text)
+    if value is None or not 1 <= value < 20:
+        return None
+    try:
+        return value.quantize(Decimal('0.01'))
+    except InvalidOperation:
+        return None
+
+
+def parse_spec_attributes(specifications):
+    specifications = specifications if isinstance(specifications, dict) else {}
+    return {
+        'ram_gb': parse_capacity_gb(specifications.get('ram')),
+        'storage_gb': parse_capacity_gb(specifications.get('storage')),
+        'battery_mah': parse_battery_mah(specifications.get('battery')),
+        'display_inches': parse_display_inches(specifications.get('display')),
+    }
+
+
+def backfill_spec_attributes(apps, schema_editor):
+    Product = apps.get_model('user', 'Product')
+    products = list(Product.objects.only('id', 'specifications'))
+    for product in products:
+        for field, value in parse_spec_attributes(product.specifications).items():
+            setattr(product, field, value)
+    Product.objects.bulk_update(
+        products, ['ram_gb', 'storage_gb', 'battery_mah', 'display_inches'], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0004_product_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='battery_mah',
+            field=models.PositiveIntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='display_inches',
+            field=models.DecimalField(blank=True, db_index=True, decimal_places=2, max_digits=4, null=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='ram_gb',
+            field=models.PositiveIntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='storage_gb',
+            field=models.PositiveIntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.RunPython(backfill_spec_attributes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 6.0.2 on 2026-10-18 00:22
+
+import user.storage
+from django.db import migrations, models
+
+
+def count_existing_references(apps, schema_editor):
+    # Counted here rather than through user.storage, so later changes there cannot change this migration
+    Product = apps.get_model('user', 'Product')
+    MediaBlob = apps.get_model('user', 'MediaBlob')
+    counts = {}
+    for field in ['image1', 'image2', 'image3', 'image4']:
+        names = Product.objects.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True}).values_list(field, flat=True)
+        for name in names.iterator():
+            counts[name] = counts.get(name, 0) + 1
+    MediaBlob.objects.bulk_create(
+        [MediaBlob(name=name, ref_count=count) for name, count in counts.items()], ignore_conflicts=True, batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0008_product_image_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='product',
+            name='image1',
+            field=models.ImageField(storage=user.storage.product_media_storage, upload_to='products/'),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='image2',
+            field=models.ImageField(blank=True, null=True, storage=user.storage.product_media_storage, upload_to='products/'),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='image3',
+            field=models.ImageField(blank=True, null=True, storage=user.storage.product_media_storage, upload_to='products/'),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='image4',
+            field=models.ImageField(blank=True, null=True, storage=user.storage.product_media_storage, upload_to='products/'),
+        ),
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('ref_count', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['ref_count', 'updated_at'], name='mediablob_gc_idx')],
+            },
+        ),
+        migrations.RunPython(count_existing_references, migrations.RunPython.noop),
+    ]
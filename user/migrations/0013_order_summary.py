@@ -0,0 +1,43 @@
+# Generated by Django 6.0.2 on 2026-10-18 00:35
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_order_summary(apps, schema_editor):
+    Order = apps.get_model('user', 'Order')
+    OrderItem = apps.get_model('user', 'OrderItem')
+
+    items = OrderItem.objects.filter(order=OuterRef('pk'))
+    Order.objects.update(
+        item_count=Coalesce(Subquery(
+            items.order_by().values('order').annotate(count=Count('id')).values('count')
+        ), 0),
+        lead_item_name=Coalesce(Subquery(items.order_by('id').values('product_name')[:1]), models.Value('')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0012_notification_outbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='lead_item_name',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', '-created_at', 'id'], name='order_user_history_idx'),
+        ),
+        migrations.RunPython(backfill_order_summary, migrations.RunPython.noop),
+    ]
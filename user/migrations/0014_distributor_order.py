@@ -0,0 +1,55 @@
+# Generated by Django 6.0.2 on 2026-10-18 00:37
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, Sum
+
+
+def backfill_distributor_orders(apps, schema_editor):
+    OrderItem = apps.get_model('user', 'OrderItem')
+    DistributorOrder = apps.get_model('user', 'DistributorOrder')
+
+    # Lines whose product has since been deleted no longer name a distributor and are skipped
+    rows = (
+        OrderItem.objects.filter(product__isnull=False)
+        .values('order_id', 'order__created_at', distributor_id=F('product__distributor_id'))
+        .annotate(item_count=Count('id'), subtotal=Sum(F('product_price') * F('quantity')))
+        .order_by('order_id')
+    )
+    DistributorOrder.objects.bulk_create(
+        (
+            DistributorOrder(
+                distributor_id=row['distributor_id'], order_id=row['order_id'], item_count=row['item_count'],
+                subtotal=row['subtotal'], created_at=row['order__created_at']
+            )
+            for row in rows.iterator()
+        ),
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0013_order_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DistributorOrder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('item_count', models.PositiveIntegerField(default=0)),
+                ('subtotal', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('created_at', models.DateTimeField()),
+                ('distributor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='distributor_orders', to=settings.AUTH_USER_MODEL)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='distributor_links', to='user.order')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['distributor', '-created_at', 'id'], name='distributor_order_list_idx')],
+                'unique_together': {('distributor', 'order')},
+            },
+        ),
+        migrations.RunPython(backfill_distributor_orders, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,90 @@
+# Generated by Django 6.0.2 on 2026-10-18 00:39
+
+import django.db.models.deletion
+from django.conf import settings
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, F, Q, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+
+
+def backfill_sales_rollups(apps, schema_editor):
+    OrderItem = apps.get_model('user', 'OrderItem')
+    ProductDailySales = apps.get_model('user', 'ProductDailySales')
+    DistributorDailySales = apps.get_model('user', 'DistributorDailySales')
+
+    sold = Q(order__status__in=['confirmed', 'processing', 'shipped', 'delivered'])
+    cancelled = Q(order__status='cancelled')
+    lines = OrderItem.objects.filter(sold | cancelled, product__isnull=False).annotate(
+        date=TruncDate('order__created_at')
+    ).order_by()
+    totals = {
+        'units': Coalesce(Sum('quantity', filter=sold), 0),
+        'revenue': Coalesce(
+            Sum(F('product_price') * F('quantity'), filter=sold), Value(Decimal('0')),
+            output_field=models.DecimalField(max_digits=12, decimal_places=2)
+        ),
+        'orders': Count('order', distinct=True, filter=sold),
+        'cancellations': Count('order', distinct=True, filter=cancelled),
+    }
+
+    ProductDailySales.objects.bulk_create(
+        (
+            ProductDailySales(
+                date=row.pop('date'), distributor_id=row.pop('product__distributor'), product_id=row.pop('product'), **row
+            )
+            for row in lines.values('date', 'product__distributor', 'product').annotate(**totals).iterator()
+        ),
+        batch_size=500,
+    )
+    DistributorDailySales.objects.bulk_create(
+        (
+            DistributorDailySales(date=row.pop('date'), distributor_id=row.pop('product__distributor'), **row)
+            for row in lines.values('date', 'product__distributor').annotate(**totals).iterator()
+        ),
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0014_distributor_order'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DistributorDailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('cancellations', models.PositiveIntegerField(default=0)),
+                ('distributor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('distributor', 'date')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductDailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('cancellations', models.PositiveIntegerField(default=0)),
+                ('distributor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='product_daily_sales', to=settings.AUTH_USER_MODEL)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='user.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['distributor', 'date'], name='product_sales_distributor_idx')],
+                'unique_together': {('product', 'date')},
+            },
+        ),
+        migrations.RunPython(backfill_sales_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,107 @@
+# Generated by Django 6.0.2 on 2026-10-18 00:47
+
+import math
+
+from django.db import migrations, models
+
+
+# Copies of user.geo as it was when these columns were added, so later changes there
+# cannot change what this migration writes
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+GEOHASH_PRECISION = 9
+
+
+def parse_coordinates(latitude, longitude):
+    try:
+        latitude, longitude = float(latitude), float(longitude)
+    except (TypeError, ValueError):
+        return None
+    if not (math.isfinite(latitude) and math.isfinite(longitude)):
+        return None
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return None
+    return latitude, longitude
+
+
+def geohash(latitude, longitude, precision=GEOHASH_PRECISION):
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars = []
+    bits = value = 0
+    even = True
+    while len(chars) < precision:
+        span, coordinate = (lng_range, longitude) if even else (lat_range, latitude)
+        middle = (span[0] + span[1]) / 2
+        if coordinate >= middle:
+            value = value << 1 | 1
+            span[0] = middle
+        else:
+            value <<= 1
+            span[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits = value = 0
+    return ''.join(chars)
+
+
+def backfill_delivery_coordinates(apps, schema_editor):
+    for model_name in ('Order', 'ArchivedOrder'):
+        model = apps.get_model('user', model_name)
+        located = []
+        for order in model.objects.filter(delivery_location__isnull=False).only('id', 'delivery_location').iterator():
+            location = order.delivery_location if isinstance(order.delivery_location, dict) else {}
+            coordinates = parse_coordinates(location.get('latitude'), location.get('longitude'))
+            if coordinates:
+                order.delivery_latitude, order.delivery_longitude = coordinates
+                order.delivery_geohash = geohash(*coordinates)
+                located.append(order)
+            if len(located) >= 500:
+                model.objects.bulk_update(located, ['delivery_latitude', 'delivery_longitude', 'delivery_geohash'])
+                located = []
+        model.objects.bulk_update(located, ['delivery_latitude', 'delivery_longitude', 'delivery_geohash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0017_order_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedorder',
+            name='delivery_geohash',
+            field=models.CharField(blank=True, max_length=12),
+        ),
+        migrations.AddField(
+            model_name='archivedorder',
+            name='delivery_latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='archivedorder',
+            name='delivery_longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='delivery_geohash',
+            field=models.CharField(blank=True, help_text='Geohash of the delivery location', max_length=12),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='delivery_latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='delivery_longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', 'delivery_geohash'], name='order_dispatch_idx'),
+        ),
+        migrations.RunPython(backfill_delivery_coordinates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 6.0.2 on 2026-10-18 01:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, Min, Sum
+
+
+def backfill_archived_distributor_orders(apps, schema_editor):
+    ArchivedOrderItem = apps.get_model('user', 'ArchivedOrderItem')
+    ArchivedDistributorOrder = apps.get_model('user', 'ArchivedDistributorOrder')
+
+    # The hot links were deleted with their orders, so rebuild them from the archived items.
+    # Their ids are gone too: negative ids from the items never collide with live links.
+    rows = (
+        ArchivedOrderItem.objects.filter(product__isnull=False)
+        .values('order_id', 'order__created_at', distributor_id=F('product__distributor_id'))
+        .annotate(first_item=Min('id'), item_count=Count('id'), subtotal=Sum(F('product_price') * F('quantity')))
+        .order_by('order_id')
+    )
+    ArchivedDistributorOrder.objects.bulk_create(
+        (
+            ArchivedDistributorOrder(
+                id=-row['first_item'], distributor_id=row['distributor_id'], order_id=row['order_id'],
+                item_count=row['item_count'], subtotal=row['subtotal'], created_at=row['order__created_at']
+            )
+            for row in rows.iterator()
+        ),
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0018_order_delivery_geo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedDistributorOrder',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('item_count', models.PositiveIntegerField(default=0)),
+                ('subtotal', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('created_at', models.DateTimeField()),
+                ('distributor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_distributor_orders', to=settings.AUTH_USER_MODEL)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='distributor_links', to='user.archivedorder')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['distributor', '-created_at', 'id'], name='archived_distributor_list_idx')],
+                'unique_together': {('distributor', 'order')},
+            },
+        ),
+        migrations.RunPython(backfill_archived_distributor_orders, migrations.RunPython.noop),
+    ]
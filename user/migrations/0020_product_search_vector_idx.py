@@ -0,0 +1,20 @@
+# Generated by Django 6.0.2 on 2026-10-18 01:08
+
+import django.contrib.postgres.search
+import django.db.models.functions.comparison
+import user.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0019_archived_distributor_order'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=user.indexes.PostgresGinIndex(django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.SearchVector('brand', config='english', weight='A'), '||', django.contrib.postgres.search.SearchVector('model_name', config='english', weight='A'), django.contrib.postgres.search.SearchConfig('english')), '||', django.contrib.postgres.search.SearchVector(django.db.models.functions.comparison.Cast('specifications', models.TextField()), config='english', weight='B'), django.contrib.postgres.search.SearchConfig('english')), '||', django.contrib.postgres.search.SearchVector('features', config='english', weight='C'), django.contrib.postgres.search.SearchConfig('english')), name='product_search_vector_idx'),
+        ),
+    ]
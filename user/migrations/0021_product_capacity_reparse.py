@@ -0,0 +1,53 @@
+# Generated by Django 6.0.2 on 2026-10-18 01:25
+
+import re
+from decimal import Decimal
+
+from django.db import migrations
+
+
+# Capacity parsing that reads the number next to its GB/TB unit; the first backfill
+# took the first number, so 'LPDDR5 8GB' was stored as 5
+CAPACITY_RE = re.compile(r'(\d+(?:\.\d+)?)\s*([tgm])b\b', re.IGNORECASE)
+BARE_NUMBER_RE = re.compile(r'(?<![\w.])(\d+(?:\.\d+)?)(?![\w.])')
+
+
+def parse_capacity_gb(text):
+    text = str(text or '')
+    match = CAPACITY_RE.search(text)
+    if match:
+        value, unit = Decimal(match.group(1)), match.group(2).lower()
+    else:
+        match = BARE_NUMBER_RE.search(text)
+        if not match:
+            return None
+        value, unit = Decimal(match.group(1)), 'g'
+    if unit == 't':
+        value *= 1024
+    elif unit == 'm':
+        value /= 1024
+    return int(value) or None
+
+
+def reparse_capacities(apps, schema_editor):
+    Product = apps.get_model('user', 'Product')
+    changed = []
+    for product in Product.objects.only('id', 'specifications', 'ram_gb', 'storage_gb').iterator():
+        specifications = product.specifications if isinstance(product.specifications, dict) else {}
+        ram_gb = parse_capacity_gb(specifications.get('ram'))
+        storage_gb = parse_capacity_gb(specifications.get('storage'))
+        if (product.ram_gb, product.storage_gb) != (ram_gb, storage_gb):
+            product.ram_gb, product.storage_gb = ram_gb, storage_gb
+            changed.append(product)
+    Product.objects.bulk_update(changed, ['ram_gb', 'storage_gb'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0020_product_search_vector_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(reparse_capacities, migrations.RunPython.noop),
+    ]
@@ -2,6 +2,10 @@ from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.utils import timezone
 
+from .indexes import PostgresGinIndex, product_search_vector
+from .order_ids import new_order_id
+from .storage import product_media_storage
+
 
 
 class User(AbstractUser):
@@ -54,10 +58,12 @@ class Product(models.Model):
     slug = models.SlugField(unique=True)
     
     # Pictures
-    image1 = models.ImageField(upload_to='products/')
-    image2 = models.ImageField(upload_to='products/', blank=True, null=True)
-    image3 = models.ImageField(upload_to='products/', blank=True, null=True)
-    image4 = models.ImageField(upload_to='products/', blank=True, null=True)
+    image1 = models.ImageField(upload_to='products/', storage=product_media_storage)
+    image2 = models.ImageField(upload_to='products/', storage=product_media_storage, blank=True, null=True)
+    image3 = models.ImageField(upload_to='products/', storage=product_media_storage, blank=True, null=True)
+    image4 = models.ImageField(upload_to='products/', storage=product_media_storage, blank=True, null=True)
+    # Image field -> source file name whose resized variants have been rendered
+    image_variants = models.JSONField(default=dict, blank=True)
     
     # Price
     price = models.DecimalField(max_digits=10, decimal_places=2)
@@ -70,20 +76,75 @@ class Product(models.Model):
     # Specifications
     specifications = models.JSONField(default=dict, help_text="Technical specifications in JSON format")
     
+    # Typed attributes parsed from specifications on save, used for filtering
+    ram_gb = models.PositiveIntegerField(null=True, blank=True, db_index=True)
+    storage_gb = models.PositiveIntegerField(null=True, blank=True, db_index=True)
+    battery_mah = models.PositiveIntegerField(null=True, blank=True, db_index=True)
+    display_inches = models.DecimalField(max_digits=4, decimal_places=2, null=True, blank=True, db_index=True)
+    
     # Stock
     stock = models.PositiveIntegerField(default=0)
     is_available = models.BooleanField(default=True)
     
+    # Rating aggregates, maintained by user.ratings as reviews change
+    review_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    average_rating = models.FloatField(default=0)
+    ratings_1 = models.PositiveIntegerField(default=0)
+    ratings_2 = models.PositiveIntegerField(default=0)
+    ratings_3 = models.PositiveIntegerField(default=0)
+    ratings_4 = models.PositiveIntegerField(default=0)
+    ratings_5 = models.PositiveIntegerField(default=0)
+    
     # Status
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination of the shopping catalog
+            models.Index(fields=['is_available', '-created_at', 'id'], name='product_catalog_idx'),
+            models.Index(fields=['is_available', '-average_rating', 'id'], name='product_rating_idx'),
+            # Full-text search on PostgreSQL; SQLite keeps an FTS5 table (see user.search)
+            PostgresGinIndex(product_search_vector(), name='product_search_vector_idx'),
+        ]
     
     def __str__(self):
         return f"{self.brand} {self.model_name}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember stored image names so saves can adjust media reference counts
+        from .images import IMAGE_FIELDS
+        from .storage import loaded_image_names
+        instance._image_names = loaded_image_names(instance, IMAGE_FIELDS)
+        return instance
+    
+    def save(self, *args, **kwargs):
+        self.apply_spec_attributes()
+        super().save(*args, **kwargs)
+    
+    def apply_spec_attributes(self):
+        from .specs import parse_spec_attributes
+        for field, value in parse_spec_attributes(self.specifications).items():
+            setattr(self, field, value)
+    
+    @property
+    def card_image(self):
+        from .images import image_set
+        return image_set(self, 'image1')
+    
+    @property
+    def gallery_images(self):
+        from .images import IMAGE_FIELDS, image_set
+        return [images for images in (image_set(self, field) for field in IMAGE_FIELDS) if images]
+    
+    @property
+    def rating_histogram(self):
+        return {stars: getattr(self, f'ratings_{stars}') for stars in range(5, 0, -1)}
+    
     def get_discounted_price(self):
         if self.discount > 0:
             return self.price - (self.price * self.discount / 100)
@@ -119,6 +180,16 @@ class Order(models.Model):
         ('cancelled', 'Cancelled'),
     ]
     
+    # Statuses each status may move to; delivered and cancelled are final
+    STATUS_TRANSITIONS = {
+        'pending': ['confirmed', 'cancelled'],
+        'confirmed': ['processing', 'cancelled'],
+        'processing': ['shipped', 'cancelled'],
+        'shipped': ['delivered'],
+        'delivered': [],
+        'cancelled': [],
+    }
+    
     PAYMENT_STATUS_CHOICES = [
         ('pending', 'Pending'),
         ('completed', 'Completed'),
@@ -135,6 +206,9 @@ class Order(models.Model):
     delivery_email = models.EmailField()
     delivery_address = models.TextField()
     delivery_location = models.JSONField(null=True, blank=True, help_text="Live location coordinates")
+    delivery_latitude = models.FloatField(null=True, blank=True)
+    delivery_longitude = models.FloatField(null=True, blank=True)
+    delivery_geohash = models.CharField(max_length=12, blank=True, help_text="Geohash of the delivery location")
     
     # Order Details
     total_amount = models.DecimalField(max_digits=10, decimal_places=2)
@@ -143,19 +217,42 @@ class Order(models.Model):
     payment_id = models.CharField(max_length=100, blank=True, null=True)
     razorpay_order_id = models.CharField(max_length=100, blank=True, null=True)
     
+    # Summary for order lists, written with the items
+    item_count = models.PositiveIntegerField(default=0)
+    lead_item_name = models.CharField(max_length=100, blank=True)
+    
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at', 'id'], name='order_user_history_idx'),
+            models.Index(fields=['status', 'updated_at'], name='order_archive_idx'),
+            models.Index(fields=['status', 'delivery_geohash'], name='order_dispatch_idx'),
+        ]
     
     def __str__(self):
         return f"Order {self.order_id} - {self.user.email}"
     
+    def can_transition_to(self, status):
+        return status in self.STATUS_TRANSITIONS.get(self.status, [])
+    
+    @property
+    def next_statuses(self):
+        """(value, label) pairs this order may move to next"""
+        labels = dict(self.STATUS_CHOICES)
+        return [(status, labels[status]) for status in self.STATUS_TRANSITIONS.get(self.status, [])]
+    
+    @property
+    def other_item_count(self):
+        """Lines beyond the lead item, for "and N more" summaries"""
+        return max(self.item_count - 1, 0)
+    
     def save(self, *args, **kwargs):
         if not self.order_id:
-            self.order_id = f"XM{timezone.now().strftime('%Y%m%d%H%M%S')}{self.id or ''}"
+            self.order_id = new_order_id()
         super().save(*args, **kwargs)
 
 
@@ -174,6 +271,238 @@ class OrderItem(models.Model):
         return self.product_price * self.quantity
 
 
+class ArchivedOrder(models.Model):
+    """A delivered or cancelled order moved out of the hot Order table; keeps its primary key"""
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_orders')
+    order_id = models.CharField(max_length=50, unique=True)
+    
+    # Delivery Details
+    delivery_name = models.CharField(max_length=100)
+    delivery_phone = models.CharField(max_length=10)
+    delivery_email = models.EmailField()
+    delivery_address = models.TextField()
+    delivery_location = models.JSONField(null=True, blank=True)
+    delivery_latitude = models.FloatField(null=True, blank=True)
+    delivery_longitude = models.FloatField(null=True, blank=True)
+    delivery_geohash = models.CharField(max_length=12, blank=True)
+    
+    # Order Details
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    payment_status = models.CharField(max_length=20, choices=Order.PAYMENT_STATUS_CHOICES)
+    payment_id = models.CharField(max_length=100, blank=True, null=True)
+    razorpay_order_id = models.CharField(max_length=100, blank=True, null=True)
+    item_count = models.PositiveIntegerField(default=0)
+    lead_item_name = models.CharField(max_length=100, blank=True)
+    
+    # Status changes carried over from OrderStatusHistory
+    status_history = models.JSONField(default=list)
+    
+    # Timestamps, copied as they were
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at', 'id'], name='archived_order_history_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Archived order {self.order_id} - {self.user.email}"
+    
+    @property
+    def other_item_count(self):
+        return max(self.item_count - 1, 0)
+
+
+class ArchivedOrderItem(models.Model):
+    """An item of an archived order; keeps its primary key"""
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(ArchivedOrder, on_delete=models.CASCADE, related_name='items')
+    product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True, related_name='+')
+    product_name = models.CharField(max_length=100)
+    product_price = models.DecimalField(max_digits=10, decimal_places=2)
+    quantity = models.PositiveIntegerField(default=1)
+    
+    def __str__(self):
+        return f"{self.product_name} x {self.quantity}"
+    
+    def get_total_price(self):
+        return self.product_price * self.quantity
+
+
+class OrderStatusHistory(models.Model):
+    """Append-only log of every order status change"""
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='status_history')
+    from_status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    to_status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    changed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['order', 'created_at'], name='order_status_history_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.order.order_id}: {self.from_status} -> {self.to_status}"
+    
+    def save(self, *args, **kwargs):
+        if self.pk is not None:
+            raise ValueError('Order status history is append-only')
+        super().save(*args, **kwargs)
+
+
+class DistributorOrder(models.Model):
+    """One row per distributor with lines in an order, written at checkout for the distributor's order list"""
+    distributor = models.ForeignKey(User, on_delete=models.CASCADE, related_name='distributor_orders')
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='distributor_links')
+    item_count = models.PositiveIntegerField(default=0)
+    subtotal = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    created_at = models.DateTimeField()  # Copied from the order so the list never joins it to sort
+    
+    class Meta:
+        unique_together = ['distributor', 'order']
+        indexes = [
+            models.Index(fields=['distributor', '-created_at', 'id'], name='distributor_order_list_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.order.order_id} - {self.distributor.username}"
+
+
+class ArchivedDistributorOrder(models.Model):
+    """A DistributorOrder moved to the archive with its order; keeps its primary key"""
+    id = models.BigIntegerField(primary_key=True)
+    distributor = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_distributor_orders')
+    order = models.ForeignKey(ArchivedOrder, on_delete=models.CASCADE, related_name='distributor_links')
+    item_count = models.PositiveIntegerField(default=0)
+    subtotal = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    created_at = models.DateTimeField()
+    
+    class Meta:
+        unique_together = ['distributor', 'order']
+        indexes = [
+            models.Index(fields=['distributor', '-created_at', 'id'], name='archived_distributor_list_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.order.order_id} - {self.distributor.username}"
+
+
+class SalesRollup(models.Model):
+    """Sales for one day, bucketed by the day the order was placed; kept current by deltas"""
+    date = models.DateField()
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    orders = models.PositiveIntegerField(default=0)
+    cancellations = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        abstract = True
+
+
+class DistributorDailySales(SalesRollup):
+    """A distributor's sales for one day"""
+    distributor = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_sales')
+    
+    class Meta:
+        unique_together = ['distributor', 'date']
+    
+    def __str__(self):
+        return f"{self.distributor.username} {self.date}: {self.units} units, ₹{self.revenue}"
+
+
+class ProductDailySales(SalesRollup):
+    """One product's sales for one day"""
+    distributor = models.ForeignKey(User, on_delete=models.CASCADE, related_name='product_daily_sales')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='daily_sales')
+    
+    class Meta:
+        unique_together = ['product', 'date']
+        indexes = [
+            models.Index(fields=['distributor', 'date'], name='product_sales_distributor_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.product.model_name} {self.date}: {self.units} units, ₹{self.revenue}"
+
+
+class StockReservation(models.Model):
+    """Stock taken off a product for a pending order until it is confirmed, cancelled or expires"""
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='reservations')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reservations')
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['expires_at'], name='reservation_expiry_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.order.order_id} - {self.product.model_name} x {self.quantity}"
+
+
+class IdempotencyKey(models.Model):
+    """A submitted form's outcome, replayed when the same submission arrives again"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idempotency_keys')
+    scope = models.CharField(max_length=50)
+    key = models.CharField(max_length=64)
+    # Empty until the first request finishes
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_location = models.CharField(max_length=500, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+    
+    class Meta:
+        unique_together = ['user', 'scope', 'key']
+        indexes = [
+            models.Index(fields=['expires_at'], name='idempotency_expiry_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.scope} {self.key} ({self.response_status or 'in flight'})"
+
+
+class Notification(models.Model):
+    """Outbox row for an email or SMS, written with the event and delivered by a worker"""
+    CHANNEL_CHOICES = [
+        ('email', 'Email'),
+        ('sms', 'SMS'),
+    ]
+    
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+    
+    channel = models.CharField(max_length=10, choices=CHANNEL_CHOICES)
+    kind = models.CharField(max_length=50)
+    recipient = models.CharField(max_length=254)
+    subject = models.CharField(max_length=200, blank=True)
+    body = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='notification_queue_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.channel} {self.kind} to {self.recipient} ({self.status})"
+
+
 class Review(models.Model):
     """Product review model"""
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reviews')
@@ -185,16 +514,32 @@ class Review(models.Model):
     class Meta:
         unique_together = ['product', 'user']
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['product', '-created_at', 'id'], name='review_product_page_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.email} - {self.product.model_name} - {self.rating} stars"
 
 
-# Utility function to send welcome_email
-def send_welcome_email(user):
-    from django.core.mail import send_mail
-    from django.conf import settings
+class MediaBlob(models.Model):
+    """A stored media file and how many product image fields point at it"""
+    name = models.CharField(max_length=255, unique=True)
+    ref_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['ref_count', 'updated_at'], name='mediablob_gc_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.name} ({self.ref_count} refs)"
+
+
+# Utility function to build the welcome email
+def welcome_email_message(user):
     user_type_text = "Distributor" if user.user_type == 'distributor' else "Customer"
     
     # Get user's name (prefer first_name, fall back to username)
@@ -218,26 +563,11 @@ Happy Shopping!
 Best regards,
 buyX Team
 '''
-    
-    try:
-        send_mail(
-            subject,
-            message,
-            settings.DEFAULT_FROM_EMAIL,
-            [user.email],
-            fail_silently=False,
-        )
-        return True
-    except Exception as e:
-        print(f"Error sending welcome email: {e}")
-        return False
-
-
-# Utility function to send order confirmation email
-def send_order_confirmation_email(order):
-    from django.core.mail import send_mail
-    from django.conf import settings
-    
+    return subject, message
+
+
+# Utility function to build the order confirmation email
+def order_confirmation_email_message(order):
     # Get order items details
     items_list = []
     for item in order.items.all():
@@ -274,42 +604,9 @@ If you have any questions, feel free to reach out to our support team.
 Best regards,
 buyX Team
 '''
-    
-    try:
-        send_mail(
-            subject,
-            message,
-            settings.DEFAULT_FROM_EMAIL,
-            [order.delivery_email],
-            fail_silently=False,
-        )
-        return True
-    except Exception as e:
-        print(f"Error sending order confirmation email: {e}")
-        return False
-
-
-# Utility function to send order SMS
-def send_order_sms(phone, order_id, status):
-    from django.conf import settings
-    
-    # Using Twilio (example implementation)
-    try:
-        import twilio.rest
-        
-        client = twilio.rest.Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
-        
-        message = f"Xavier Mobiles: Your order {order_id} has been {status}. Thank you for shopping with us!"
-        
-        message = client.messages.create(
-            body=message,
-            from_=settings.TWILIO_PHONE_NUMBER,
-            to=f"+91{phone}"
-        )
-        return True
-    except ImportError:
-        print("Twilio not installed. Install with: pip install twilio")
-        return False
-    except Exception as e:
-        print(f"Error sending SMS: {e}")
-        return False
+    return subject, message
+
+
+# Utility function to build the order SMS
+def order_sms_message(order_id, status):
+    return f"Xavier Mobiles: Your order {order_id} has been {status}. Thank you for shopping with us!"
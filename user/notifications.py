@@ -0,0 +1,145 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from .models import (
+    Notification, order_confirmation_email_message, order_sms_message, welcome_email_message
+)
+from .sms import get_sms_backend
+
+
+NOTIFICATION_BATCH_SIZE = 100
+
+# A claimed row is hidden from other workers for this long in case its worker dies mid-send
+CLAIM_LEASE = timedelta(minutes=5)
+
+RETRY_BASE_SECONDS = 30
+RETRY_MAX_SECONDS = 60 * 60
+
+
+def queue_welcome_email(user):
+    """Queue the welcome email; call inside the transaction that creates the user"""
+    subject, body = welcome_email_message(user)
+    Notification.objects.create(channel='email', kind='welcome', recipient=user.email, subject=subject, body=body)
+
+
+def queue_order_confirmation(order):
+    """Queue the confirmation email and SMS for an order in one INSERT"""
+    subject, body = order_confirmation_email_message(order)
+    Notification.objects.bulk_create([
+        Notification(
+            channel='email', kind='order_confirmation', recipient=order.delivery_email, subject=subject, body=body
+        ),
+        Notification(
+            channel='sms', kind='order_confirmation', recipient=order.delivery_phone,
+            body=order_sms_message(order.order_id, 'confirmed')
+        ),
+    ])
+
+
+def retry_delay(attempts):
+    """Exponential backoff: 30s, 1m, 2m, 4m ... capped at an hour"""
+    return timedelta(seconds=min(RETRY_BASE_SECONDS * 2 ** max(attempts - 1, 0), RETRY_MAX_SECONDS))
+
+
+def claim_batch(batch_size=NOTIFICATION_BATCH_SIZE, now=None):
+    """Lease up to batch_size due notifications; concurrent workers skip each other's rows"""
+    now = now or timezone.now()
+    with transaction.atomic():
+        batch = list(
+            Notification.objects.select_for_update(skip_locked=True)
+            .filter(status='pending', next_attempt_at__lte=now)
+            .order_by('next_attempt_at')[:batch_size]
+        )
+        if batch:
+            Notification.objects.filter(id__in=[notification.id for notification in batch]).update(
+                attempts=F('attempts') + 1, next_attempt_at=now + CLAIM_LEASE
+            )
+    for notification in batch:
+        notification.attempts += 1
+    return batch
+
+
+def deliver(batch, email_connection, sms_backend):
+    """Send a claimed batch over one open email connection and one SMS client.
+
+    Returns (sent, failed) where failed holds (notification, error) pairs.
+    """
+    sent, failed = [], []
+    for notification in batch:
+        try:
+            if notification.channel == 'email':
+                # Opened on first use and kept open for the rest of the batch
+                email_connection.open()
+                EmailMessage(
+                    notification.subject, notification.body, settings.DEFAULT_FROM_EMAIL,
+                    [notification.recipient], connection=email_connection
+                ).send()
+            else:
+                sms_backend.open()
+                sms_backend.send(notification.recipient, notification.body)
+            sent.append(notification)
+        except Exception as e:
+            failed.append((notification, str(e) or e.__class__.__name__))
+            if notification.channel == 'email':
+                # Reconnect for the next message rather than reuse a broken session
+                email_connection.close()
+    return sent, failed
+
+
+def record_results(sent, failed, now=None):
+    """Mark sent rows done and reschedule failures with backoff, or give up after the last attempt"""
+    now = now or timezone.now()
+    if sent:
+        Notification.objects.filter(id__in=[notification.id for notification in sent]).update(
+            status='sent', sent_at=now, last_error=''
+        )
+
+    max_attempts = getattr(settings, 'NOTIFICATION_MAX_ATTEMPTS', 5)
+    for notification, error in failed:
+        notification.last_error = error
+        if notification.attempts >= max_attempts:
+            notification.status = 'failed'
+        else:
+            notification.next_attempt_at = now + retry_delay(notification.attempts)
+    Notification.objects.bulk_update(
+        [notification for notification, _ in failed], ['status', 'next_attempt_at', 'last_error']
+    )
+
+
+def drain(batch_size=NOTIFICATION_BATCH_SIZE, max_batches=None):
+    """Deliver due notifications batch by batch until none are left.
+
+    Returns (sent, failed) totals.
+    """
+    total_sent = total_failed = batches = 0
+    email_connection = get_connection()
+    sms_backend = get_sms_backend()
+    try:
+        while max_batches is None or batches < max_batches:
+            batch = claim_batch(batch_size)
+            if not batch:
+                break
+            sent, failed = deliver(batch, email_connection, sms_backend)
+            record_results(sent, failed)
+            total_sent += len(sent)
+            total_failed += len(failed)
+            batches += 1
+    finally:
+        email_connection.close()
+        sms_backend.close()
+    return total_sent, total_failed
+
+
+def queue_depth(now=None):
+    """Counts of due, scheduled (waiting on a retry) and permanently failed notifications"""
+    now = now or timezone.now()
+    return Notification.objects.filter(status__in=['pending', 'failed']).aggregate(
+        due=Count('id', filter=Q(status='pending', next_attempt_at__lte=now)),
+        scheduled=Count('id', filter=Q(status='pending', next_attempt_at__gt=now)),
+        failed=Count('id', filter=Q(status='failed')),
+    )
@@ -0,0 +1,73 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .models import DistributorOrder, Order, OrderStatusHistory
+from .reservations import commit_reservations, release_held_stock, restock_sold_orders
+from .sales import record_status_change
+
+
+# Most orders one bulk transition may move
+BULK_TRANSITION_LIMIT = 500
+
+
+def distributor_movable_orders(distributor, order_ids):
+    """Split a distributor's selected orders into (queryset they may move, order codes they may not).
+
+    A status covers the whole order, so an order holding other distributors' lines
+    is left for them to settle together rather than moved by any one of them.
+    """
+    linked = Order.objects.filter(id__in=order_ids, distributor_links__distributor=distributor)
+    shared = Exists(DistributorOrder.objects.filter(order=OuterRef('pk')).exclude(distributor=distributor))
+    return linked.exclude(shared), list(linked.filter(shared).values_list('order_id', flat=True))
+
+
+def _enter_status(order_ids, source, status):
+    """Stock side effects of orders moving from source to status"""
+    if status == 'confirmed':
+        # Paid for: the held stock is now sold
+        commit_reservations(order_ids)
+    elif status == 'cancelled':
+        if source == 'pending':
+            release_held_stock(order_ids)
+        else:
+            restock_sold_orders(order_ids)
+
+
+def transition_orders(orders, status, changed_by=None):
+    """Move every order in the ``orders`` queryset that may go to ``status``.
+
+    Orders are locked, grouped by their current status and moved with one conditional
+    UPDATE per source status, alongside their stock, sales rollups and history rows.
+    Orders whose status does not allow the move are left alone.
+
+    Returns (moved, skipped): the ids moved and (order_id, status) for each order skipped.
+    """
+    if status not in dict(Order.STATUS_CHOICES):
+        raise ValueError(f'Unknown order status: {status}')
+
+    now = timezone.now()
+    moved, skipped = [], []
+    with transaction.atomic():
+        by_source = defaultdict(list)
+        for order_pk, order_id, source in orders.select_for_update(of=('self',)).values_list(
+            'id', 'order_id', 'status'
+        ):
+            if status in Order.STATUS_TRANSITIONS.get(source, []):
+                by_source[source].append(order_pk)
+            else:
+                skipped.append((order_id, source))
+
+        for source, order_ids in by_source.items():
+            Order.objects.filter(id__in=order_ids, status=source).update(status=status, updated_at=now)
+            _enter_status(order_ids, source, status)
+            record_status_change(order_ids, source, status)
+            OrderStatusHistory.objects.bulk_create([
+                OrderStatusHistory(order_id=order_pk, from_status=source, to_status=status, changed_by=changed_by)
+                for order_pk in order_ids
+            ])
+            moved.extend(order_ids)
+
+    return moved, skipped
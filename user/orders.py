@@ -0,0 +1,194 @@
+from datetime import datetime
+from decimal import Decimal
+from operator import attrgetter
+
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch, Q, prefetch_related_objects
+
+from .catalog import decode_cursor, encode_cursor
+from .geo import geohash, parse_coordinates
+from .models import ArchivedDistributorOrder, ArchivedOrder, ArchivedOrderItem, DistributorOrder, Order, OrderItem
+from .order_ids import draw_new_node, new_order_id
+from .reservations import reserve_stock
+
+
+ORDER_HISTORY_PAGE_SIZE = 10
+
+# Order IDs tried before an order INSERT gives up
+ORDER_ID_ATTEMPTS = 3
+DISTRIBUTOR_ORDER_PAGE_SIZE = 20
+
+# Columns the order history list renders
+ORDER_LIST_FIELDS = ['id', 'order_id', 'status', 'total_amount', 'item_count', 'lead_item_name', 'created_at']
+ORDER_ITEM_LIST_FIELDS = ['id', 'order_id', 'product_name', 'product_price', 'quantity']
+
+
+def delivery_details(data):
+    """Delivery fields for a new order from the checkout form"""
+    delivery_location = None
+    latitude = longitude = None
+    geohash_cell = ''
+    coordinates = parse_coordinates(data.get('latitude'), data.get('longitude'))
+    if coordinates:
+        latitude, longitude = coordinates
+        delivery_location = {
+            'latitude': latitude,
+            'longitude': longitude
+        }
+        geohash_cell = geohash(latitude, longitude)
+    return {
+        'delivery_name': data.get('delivery_name'),
+        'delivery_phone': data.get('delivery_phone'),
+        'delivery_email': data.get('delivery_email'),
+        'delivery_address': data.get('delivery_address'),
+        'delivery_location': delivery_location,
+        'delivery_latitude': latitude,
+        'delivery_longitude': longitude,
+        'delivery_geohash': geohash_cell,
+    }
+
+
+def _create_order(**fields):
+    """INSERT an order, drawing a new node and ID if another process already used this ID"""
+    for attempt in range(ORDER_ID_ATTEMPTS):
+        order_id = new_order_id()
+        try:
+            with transaction.atomic():
+                return Order.objects.create(order_id=order_id, **fields)
+        except IntegrityError:
+            if attempt == ORDER_ID_ATTEMPTS - 1 or not Order.objects.filter(order_id=order_id).exists():
+                raise
+            # Only a process sharing our node can have produced the same ID
+            draw_new_node()
+
+
+def place_order(user, pricing, delivery, cart=None):
+    """Create an order, its items and its stock holds as one unit of work.
+
+    ``pricing`` already carries every line's product and unit price, so the number of
+    queries does not grow with the basket: one order INSERT, one bulk item INSERT, one
+    distributor link INSERT, one stock UPDATE, one reservation INSERT and, when ``cart``
+    is given, one cart DELETE.
+    Raises InsufficientStock, with nothing written, if any line is short.
+    """
+    items = [
+        OrderItem(
+            product=line.product,
+            product_name=f"{line.product.brand} {line.product.model_name}",
+            product_price=line.unit_price,
+            quantity=line.quantity
+        )
+        for line in pricing.lines
+    ]
+
+    with transaction.atomic():
+        order = _create_order(
+            user=user,
+            total_amount=pricing.total,
+            item_count=len(items),
+            lead_item_name=items[0].product_name if items else '',
+            **delivery
+        )
+
+        for item in items:
+            item.order = order
+        OrderItem.objects.bulk_create(items)
+
+        # One link per distributor so their order lists never have to search the items
+        links = {}
+        for line in pricing.lines:
+            link = links.get(line.product.distributor_id)
+            if link is None:
+                link = links[line.product.distributor_id] = DistributorOrder(
+                    distributor_id=line.product.distributor_id, order=order,
+                    subtotal=Decimal('0'), created_at=order.created_at
+                )
+            link.item_count += 1
+            link.subtotal += line.line_total
+        DistributorOrder.objects.bulk_create(links.values())
+
+        # Hold the stock until the order is paid for or the hold expires
+        reserve_stock(order, [(line.product, line.quantity) for line in pricing.lines])
+
+        if cart is not None:
+            cart.clear()
+
+    return order
+
+
+def get_order_history_page(user, cursor=None, page_size=ORDER_HISTORY_PAGE_SIZE):
+    """Return (orders, next_cursor) for one keyset page of a shopper's orders.
+
+    Hot and archived orders share one keyset, so each tier is read with the same
+    cursor and the two are merged. Up to four queries: the orders of each tier and
+    one prefetch of items for each tier on the page.
+    """
+    position = decode_cursor(cursor, datetime.fromisoformat, int) if cursor else None
+
+    page = []
+    for model in (Order, ArchivedOrder):
+        orders = model.objects.filter(user=user).only(*ORDER_LIST_FIELDS).order_by('-created_at', 'id')
+        if position:
+            created_at, order_id = position
+            orders = orders.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, id__gt=order_id)
+            )
+        page.extend(orders[:page_size + 1])
+
+    page.sort(key=attrgetter('id'))
+    page.sort(key=attrgetter('created_at'), reverse=True)
+
+    next_cursor = None
+    if len(page) > page_size:
+        page = page[:page_size]
+        next_cursor = encode_cursor(page[-1].created_at.isoformat(), page[-1].id)
+
+    for model, item_model in ((Order, OrderItem), (ArchivedOrder, ArchivedOrderItem)):
+        prefetch_related_objects(
+            [order for order in page if isinstance(order, model)],
+            Prefetch('items', queryset=item_model.objects.only(*ORDER_ITEM_LIST_FIELDS).order_by('id'))
+        )
+
+    return page, next_cursor
+
+
+def get_distributor_order_page(distributor, cursor=None, page_size=DISTRIBUTOR_ORDER_PAGE_SIZE):
+    """Return (links, next_cursor) for one keyset page of a distributor's orders.
+
+    Each link comes with its order and customer, and ``order.distributor_items`` holds
+    only this distributor's lines. Hot and archived links share one keyset and are
+    merged like the order history: up to four queries, each walking its list index.
+    """
+    position = decode_cursor(cursor, datetime.fromisoformat, int) if cursor else None
+
+    page = []
+    for model in (DistributorOrder, ArchivedDistributorOrder):
+        links = model.objects.filter(distributor=distributor).select_related(
+            'order', 'order__user'
+        ).order_by('-created_at', 'id')
+        if position:
+            created_at, link_id = position
+            links = links.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, id__gt=link_id)
+            )
+        page.extend(links[:page_size + 1])
+
+    page.sort(key=attrgetter('id'))
+    page.sort(key=attrgetter('created_at'), reverse=True)
+
+    next_cursor = None
+    if len(page) > page_size:
+        page = page[:page_size]
+        next_cursor = encode_cursor(page[-1].created_at.isoformat(), page[-1].id)
+
+    for model, item_model in ((DistributorOrder, OrderItem), (ArchivedDistributorOrder, ArchivedOrderItem)):
+        prefetch_related_objects(
+            [link.order for link in page if isinstance(link, model)],
+            Prefetch(
+                'items',
+                queryset=item_model.objects.filter(product__distributor=distributor).order_by('id'),
+                to_attr='distributor_items'
+            )
+        )
+
+    return page, next_cursor
@@ -0,0 +1,101 @@
+import time
+
+from django.core.cache import cache
+from django.middleware.csrf import get_token
+from django.template.loader import render_to_string
+
+from .models import Cart
+
+
+PRODUCT_PAGE_TIMEOUT = 60 * 60
+CART_PRODUCTS_TIMEOUT = 60 * 60
+
+# Markers left in the shared fragment and filled in per request
+CSRF_PLACEHOLDER = '__csrf_token__'
+CART_ACTION_MARKER = '<!-- cart-action -->'
+
+
+def _product_page_key(product_id, version):
+    return f'product-page:{product_id}:{version}'
+
+
+def _product_page_version_key(product_id):
+    return f'product-page-version:{product_id}'
+
+
+def _cart_products_key(user_id):
+    return f'cart-products:{user_id}'
+
+
+def product_page_version(product_id):
+    """Current version of a product's cached page; invalidating the page moves it on"""
+    key = _product_page_version_key(product_id)
+    version = cache.get(key)
+    if version is None:
+        # Start from the clock so a version evicted from the cache is never handed out again
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def get_product_page(product_id):
+    """(cached {'title', 'body'} or None on a miss, version to render a miss under)"""
+    version = product_page_version(product_id)
+    return cache.get(_product_page_key(product_id, version)), version
+
+
+def render_product_page(product, reviews, next_review_cursor, version):
+    """Render the shopper-independent part of a product page and cache it.
+
+    ``version`` must be read before the product and reviews were loaded: if they
+    change in the meantime the page lands under a version nobody reads any more.
+    """
+    page = {
+        'title': f'{product.brand} {product.model_name}',
+        'body': render_to_string('user/_product_detail_body.html', {
+            'product': product,
+            'reviews': reviews,
+            'next_review_cursor': next_review_cursor,
+            'avg_rating': round(product.average_rating, 1),
+            'csrf_placeholder': CSRF_PLACEHOLDER,
+        }),
+    }
+    cache.set(_product_page_key(product.id, version), page, PRODUCT_PAGE_TIMEOUT)
+    return page
+
+
+def invalidate_product_page(product_id):
+    invalidate_product_pages([product_id])
+
+
+def invalidate_product_pages(product_ids):
+    """Retire several cached product pages, e.g. after a queryset update that skipped signals"""
+    for product_id in product_ids:
+        try:
+            cache.incr(_product_page_version_key(product_id))
+        except ValueError:
+            # No version yet, so no page has been cached under one
+            pass
+
+
+def cart_product_ids(user):
+    """Ids of the products in a user's cart, cached until the cart changes"""
+    key = _cart_products_key(user.id)
+    product_ids = cache.get(key)
+    if product_ids is None:
+        product_ids = set(Cart.objects.filter(user=user).values_list('product_id', flat=True))
+        cache.set(key, product_ids, CART_PRODUCTS_TIMEOUT)
+    return product_ids
+
+
+def invalidate_cart_products(user_id):
+    cache.delete(_cart_products_key(user_id))
+
+
+def apply_user_overlay(request, product_id, body, in_cart):
+    """Fill the per-shopper bits (CSRF token, cart button) into a cached page body"""
+    cart_action = render_to_string('user/_cart_action.html', {
+        'product_id': product_id,
+        'in_cart': in_cart,
+    }, request=request)
+    return body.replace(CSRF_PLACEHOLDER, get_token(request)).replace(CART_ACTION_MARKER, cart_action)
@@ -0,0 +1,30 @@
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+# Unfiltered PostgreSQL tables estimated larger than this use the planner's estimate
+APPROXIMATE_COUNT_LIMIT = 10000
+
+
+class ApproximateCountPaginator(Paginator):
+    """Paginator for large tables that skips the COUNT(*) of an unfiltered PostgreSQL list.
+
+    The planner's row estimate for the table stands in for the count once it passes
+    APPROXIMATE_COUNT_LIMIT. Filtered lists, small tables and other databases are
+    counted exactly, so every row stays reachable and the result count is true.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql' and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples::bigint FROM pg_class WHERE relname = %s', [queryset.model._meta.db_table]
+                )
+                row = cursor.fetchone()
+            if row and row[0] > APPROXIMATE_COUNT_LIMIT:
+                return row[0]
+        return queryset.order_by().count()
@@ -0,0 +1,92 @@
+from decimal import Decimal
+
+from django.db.models import DecimalField, ExpressionWrapper, F, Value
+from django.db.models.functions import Round
+
+from .models import Cart, Product
+
+
+MONEY = DecimalField(max_digits=12, decimal_places=2)
+CENT = Decimal('0.01')
+
+
+def unit_price_expression(prefix=''):
+    """Discounted unit price computed by the database, rounded to paise.
+
+    Multiplying by 0.01 rather than dividing by 100 keeps SQLite off integer division
+    when both the price and the discount are whole numbers.
+    """
+    price = F(f'{prefix}price')
+    discount = F(f'{prefix}discount')
+    return Round(
+        ExpressionWrapper(price * (Value(100) - discount) * Value(Decimal('0.01')), output_field=MONEY),
+        2, output_field=MONEY,
+    )
+
+
+def priced_lines(queryset, prefix='product__'):
+    """Annotate unit_price, line_total and list_total on cart-like rows with a quantity"""
+    return queryset.annotate(
+        unit_price=unit_price_expression(prefix),
+        line_total=ExpressionWrapper(F('unit_price') * F('quantity'), output_field=MONEY),
+        list_total=ExpressionWrapper(F(f'{prefix}price') * F('quantity'), output_field=MONEY),
+    )
+
+
+class CartPricing:
+    """Priced lines plus subtotal (list price), discount and total for a basket"""
+
+    def __init__(self, lines):
+        self.lines = list(lines)
+        for line in self.lines:
+            # SQLite hands computed decimals back unquantized
+            line.unit_price = Decimal(line.unit_price).quantize(CENT)
+            line.line_total = Decimal(line.line_total).quantize(CENT)
+            line.list_total = Decimal(line.list_total).quantize(CENT)
+        self.subtotal = sum((line.list_total for line in self.lines), Decimal('0'))
+        self.total = sum((line.line_total for line in self.lines), Decimal('0'))
+        self.discount = self.subtotal - self.total
+
+    def __bool__(self):
+        return bool(self.lines)
+
+    def __len__(self):
+        return len(self.lines)
+
+    @property
+    def item_count(self):
+        return sum(line.quantity for line in self.lines)
+
+
+def price_cart(user):
+    """Price a user's cart with its products in one query; empty lines are never ordered"""
+    return CartPricing(priced_lines(Cart.objects.filter(user=user, quantity__gt=0).select_related('product')))
+
+
+def price_products(quantities):
+    """Price {product_id: quantity} lines (buy-now, anonymous carts) in one product query"""
+    products = Product.objects.filter(id__in=quantities).annotate(unit_price=unit_price_expression())
+    lines = []
+    for product in products:
+        line = Cart(product=product, quantity=quantities[product.id])
+        line.unit_price = product.unit_price
+        line.line_total = product.unit_price * line.quantity
+        line.list_total = product.price * line.quantity
+        lines.append(line)
+    return CartPricing(lines)
+
+
+def price_product(product_id, quantity):
+    """Price a single buy-now line; returns None if the product does not exist"""
+    pricing = price_products({product_id: quantity})
+    return pricing if pricing else None
+
+
+def price_order_items(order):
+    """An order's items with line totals computed in the same query"""
+    items = list(order.items.annotate(
+        line_total=ExpressionWrapper(F('product_price') * F('quantity'), output_field=MONEY),
+    ))
+    for item in items:
+        item.line_total = Decimal(item.line_total).quantize(CENT)
+    return items
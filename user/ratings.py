@@ -0,0 +1,90 @@
+from django.db.models import Count, F, FloatField, Q, Sum
+from django.db.models.functions import Cast
+
+from .models import Product, Review
+
+
+RATING_FIELDS = ['review_count', 'rating_sum', 'average_rating'] + [f'ratings_{stars}' for stars in range(1, 6)]
+
+
+def _average(rating_sum, review_count):
+    """Average as a database expression over the post-update sum and count"""
+    return Cast(rating_sum, FloatField()) / Cast(review_count, FloatField())
+
+
+def record_new_rating(product_id, rating):
+    """Add one rating to a product's aggregates in a single UPDATE"""
+    Product.objects.filter(id=product_id).update(
+        review_count=F('review_count') + 1,
+        rating_sum=F('rating_sum') + rating,
+        average_rating=_average(F('rating_sum') + rating, F('review_count') + 1),
+        **{f'ratings_{rating}': F(f'ratings_{rating}') + 1}
+    )
+
+
+def record_changed_rating(product_id, old_rating, new_rating):
+    """Move one rating between histogram buckets in a single UPDATE"""
+    if old_rating == new_rating:
+        return
+    delta = new_rating - old_rating
+    Product.objects.filter(id=product_id, review_count__gt=0).update(
+        rating_sum=F('rating_sum') + delta,
+        average_rating=_average(F('rating_sum') + delta, F('review_count')),
+        **{
+            f'ratings_{old_rating}': F(f'ratings_{old_rating}') - 1,
+            f'ratings_{new_rating}': F(f'ratings_{new_rating}') + 1,
+        }
+    )
+
+
+def record_removed_rating(product_id, rating):
+    """Take one rating out of a product's aggregates without reading the row"""
+    # Last review gone: reset instead of dividing by zero. This runs first so the
+    # decrement below cannot bring a count of two down to one and have it reset too.
+    reset = Product.objects.filter(id=product_id, review_count=1).update(
+        review_count=0, rating_sum=0, average_rating=0,
+        **{f'ratings_{stars}': 0 for stars in range(1, 6)}
+    )
+    if reset:
+        return
+    Product.objects.filter(id=product_id, review_count__gt=1).update(
+        review_count=F('review_count') - 1,
+        rating_sum=F('rating_sum') - rating,
+        average_rating=_average(F('rating_sum') - rating, F('review_count') - 1),
+        **{f'ratings_{rating}': F(f'ratings_{rating}') - 1}
+    )
+
+
+def reconcile_ratings(batch_size=500):
+    """Recompute every product's rating aggregates from its reviews.
+
+    Returns the number of products whose stored aggregates were wrong.
+    """
+    totals = {
+        row['product']: row for row in Review.objects.order_by().values('product').annotate(
+            count=Count('id'),
+            total=Sum('rating'),
+            **{f'stars_{stars}': Count('id', filter=Q(rating=stars)) for stars in range(1, 6)}
+        )
+    }
+
+    fixed = []
+    for product in Product.objects.only('id', *RATING_FIELDS).iterator(chunk_size=batch_size):
+        row = totals.get(product.id, {})
+        expected = {
+            'review_count': row.get('count', 0),
+            'rating_sum': row.get('total') or 0,
+        }
+        expected['average_rating'] = (
+            expected['rating_sum'] / expected['review_count'] if expected['review_count'] else 0
+        )
+        for stars in range(1, 6):
+            expected[f'ratings_{stars}'] = row.get(f'stars_{stars}', 0)
+
+        if any(getattr(product, field) != value for field, value in expected.items()):
+            for field, value in expected.items():
+                setattr(product, field, value)
+            fixed.append(product)
+
+    Product.objects.bulk_update(fixed, RATING_FIELDS, batch_size=batch_size)
+    return len(fixed)
@@ -0,0 +1,153 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from django.utils import timezone
+
+from .models import Order, OrderItem, Product, StockReservation
+from .page_cache import invalidate_product_pages
+
+
+class InsufficientStock(Exception):
+    """Raised when one or more order lines cannot be reserved; carries a failure per line"""
+
+    def __init__(self, failures):
+        self.failures = failures
+        super().__init__(', '.join(failure['message'] for failure in failures))
+
+
+def reservation_expiry():
+    return timezone.now() + timedelta(minutes=settings.STOCK_RESERVATION_MINUTES)
+
+
+def held_stock(product_ids):
+    """{product_id: units held for unpaid orders}; Product.stock already has these taken off"""
+    return dict(
+        StockReservation.objects.filter(product_id__in=product_ids)
+        .values_list('product_id').annotate(total=Sum('quantity')).order_by()
+    )
+
+
+def stock_from_on_hand(on_hand, held):
+    """The Product.stock to store for a counted on-hand quantity, leaving the held units out"""
+    return max(on_hand - held, 0)
+
+
+def _per_product(quantities):
+    """CASE expression mapping each product id to its quantity"""
+    return Case(
+        *[When(id=product_id, then=Value(quantity)) for product_id, quantity in quantities.items()],
+        output_field=IntegerField(),
+    )
+
+
+def _restock(quantities):
+    """Put {product_id: quantity} back on the shelf in one UPDATE"""
+    if not quantities:
+        return
+    Product.objects.filter(id__in=quantities).update(stock=F('stock') + _per_product(quantities))
+    product_ids = list(quantities)
+    transaction.on_commit(lambda: invalidate_product_pages(product_ids))
+
+
+def reserve_stock(order, lines):
+    """Take stock for an order's (product, quantity) lines with one conditional UPDATE.
+
+    Must run inside the transaction that creates the order. Raises InsufficientStock
+    listing every short line if any line cannot be covered.
+    """
+    quantities = defaultdict(int)
+    products = {}
+    for product, quantity in lines:
+        quantities[product.id] += quantity
+        products[product.id] = product
+
+    try:
+        # One conditional UPDATE for every line; the savepoint undoes it if any line is short
+        with transaction.atomic():
+            wanted = _per_product(quantities)
+            taken = Product.objects.filter(id__in=quantities, stock__gte=wanted).update(stock=F('stock') - wanted)
+            if taken != len(quantities):
+                raise InsufficientStock([])
+    except InsufficientStock:
+        available = dict(Product.objects.filter(id__in=quantities).values_list('id', 'stock'))
+        raise InsufficientStock([
+            {
+                'product_id': product_id,
+                'requested': quantity,
+                'available': available.get(product_id, 0),
+                'message': (
+                    f"{products[product_id].brand} {products[product_id].model_name}: "
+                    f"only {available.get(product_id, 0)} left, {quantity} requested"
+                ),
+            }
+            for product_id, quantity in quantities.items()
+            if available.get(product_id, 0) < quantity
+        ])
+
+    expires_at = reservation_expiry()
+    StockReservation.objects.bulk_create([
+        StockReservation(order=order, product_id=product_id, quantity=quantity, expires_at=expires_at)
+        for product_id, quantity in quantities.items()
+    ])
+    product_ids = list(quantities)
+    transaction.on_commit(lambda: invalidate_product_pages(product_ids))
+
+
+def commit_reservations(order_ids):
+    """The orders went through: their stock stays taken and the holds are dropped"""
+    StockReservation.objects.filter(order_id__in=order_ids).delete()
+
+
+def release_held_stock(order_ids):
+    """Return the stock still held for pending orders and drop the holds"""
+    reservations = StockReservation.objects.select_for_update().filter(order_id__in=order_ids)
+    quantities = dict(reservations.values_list('product_id').annotate(total=Sum('quantity')))
+    if quantities:
+        reservations.delete()
+    _restock(quantities)
+
+
+def restock_sold_orders(order_ids):
+    """Return the stock of confirmed orders, whose holds were committed, from their items"""
+    _restock(dict(
+        OrderItem.objects.filter(order_id__in=order_ids, product__isnull=False)
+        .values_list('product_id').annotate(total=Sum('quantity'))
+    ))
+
+
+def release_expired_reservations(now=None, batch_size=1000):
+    """Give back stock held past its expiry and cancel the unpaid orders it belonged to.
+
+    Returns (reservations released, orders cancelled).
+    """
+    from .order_status import transition_orders
+
+    now = now or timezone.now()
+    released = cancelled = 0
+    while True:
+        with transaction.atomic():
+            expired = list(
+                StockReservation.objects.select_for_update().filter(expires_at__lte=now)
+                .order_by('expires_at').values_list('id', 'order_id')[:batch_size]
+            )
+            if not expired:
+                break
+
+            # Cancelling a pending order releases all of its holds
+            moved, _ = transition_orders(
+                Order.objects.filter(id__in={order_id for _, order_id in expired}, status='pending'), 'cancelled'
+            )
+            cancelled += len(moved)
+
+            # Holds left behind by orders that are no longer pending
+            leftover = StockReservation.objects.filter(id__in=[reservation_id for reservation_id, _ in expired])
+            quantities = dict(leftover.values_list('product_id').annotate(total=Sum('quantity')))
+            if quantities:
+                leftover.delete()
+                _restock(quantities)
+            released += len(expired)
+
+    return released, cancelled
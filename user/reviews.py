@@ -0,0 +1,87 @@
+import time
+from datetime import datetime
+
+from django.core.cache import cache
+from django.db.models import Q
+
+from .catalog import decode_cursor, encode_cursor
+from .models import Review
+
+
+REVIEW_PAGE_SIZE = 10
+REVIEW_CACHE_TIMEOUT = 60 * 15
+
+
+def _first_page_key(product_id, version):
+    return f'product-reviews:{product_id}:{version}'
+
+
+def _first_page_version_key(product_id):
+    return f'product-reviews-version:{product_id}'
+
+
+def first_page_version(product_id):
+    """Current version of a product's cached first review page; invalidating moves it on"""
+    key = _first_page_version_key(product_id)
+    version = cache.get(key)
+    if version is None:
+        # Start from the clock so a version evicted from the cache is never handed out again
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def review_data(review):
+    """Plain-dict review, safe to cache and serialise"""
+    return {
+        'id': review.id,
+        'username': review.user.username,
+        'rating': review.rating,
+        'comment': review.comment,
+        'created_at': review.created_at,
+    }
+
+
+def get_review_page(product_id, cursor=None, page_size=REVIEW_PAGE_SIZE):
+    """Return (reviews, next_cursor) for one keyset page ordered on (-created_at, id)"""
+    reviews = Review.objects.filter(product_id=product_id).select_related('user').only(
+        'id', 'rating', 'comment', 'created_at', 'user__username'
+    ).order_by('-created_at', 'id')
+
+    position = decode_cursor(cursor, datetime.fromisoformat, int) if cursor else None
+    if position:
+        created_at, review_id = position
+        reviews = reviews.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__gt=review_id)
+        )
+
+    page = list(reviews[:page_size + 1])
+    next_cursor = None
+    if len(page) > page_size:
+        page = page[:page_size]
+        next_cursor = encode_cursor(page[-1].created_at.isoformat(), page[-1].id)
+
+    return [review_data(review) for review in page], next_cursor
+
+
+def get_first_review_page(product_id):
+    """First review page for a product, served from cache when warm.
+
+    The version is read before the reviews, so a page loaded while a review is
+    being written lands under a version that invalidation has already retired.
+    """
+    version = first_page_version(product_id)
+    key = _first_page_key(product_id, version)
+    page = cache.get(key)
+    if page is None:
+        page = get_review_page(product_id)
+        cache.set(key, page, REVIEW_CACHE_TIMEOUT)
+    return page
+
+
+def invalidate_reviews(product_id):
+    try:
+        cache.incr(_first_page_version_key(product_id))
+    except ValueError:
+        # No version yet, so no page has been cached under one
+        pass
@@ -0,0 +1,198 @@
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, F, IntegerField, Q, Sum, Value, When
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .models import ArchivedOrderItem, DistributorDailySales, OrderItem, ProductDailySales
+from .pricing import CENT
+
+
+# Orders in these states are sales; pending orders are still unpaid holds
+SOLD_STATUSES = ['confirmed', 'processing', 'shipped', 'delivered']
+
+SALES_TREND_DAYS = 30
+TOP_PRODUCTS = 5
+
+# Rollup rows touched per UPDATE, which keeps its CASE expressions small
+ROLLUP_CHUNK_SIZE = 100
+
+REVENUE = DecimalField(max_digits=12, decimal_places=2)
+
+PRODUCT_KEY = ['distributor_id', 'product_id', 'date']
+DISTRIBUTOR_KEY = ['distributor_id', 'date']
+
+
+def _weights(status):
+    """(sale, cancellation) an order in this status contributes to the rollups"""
+    return int(status in SOLD_STATUSES), int(status == 'cancelled')
+
+
+def _zero():
+    return {'units': 0, 'revenue': Decimal('0'), 'orders': 0, 'cancellations': 0}
+
+
+def _deltas(order_ids, sale, cancellation):
+    """Per-product and per-distributor changes for moving orders by the given weights"""
+    products = defaultdict(_zero)
+    distributors = defaultdict(_zero)
+    seen = set()
+    lines = OrderItem.objects.filter(order_id__in=order_ids, product__isnull=False).values_list(
+        'order_id', 'order__created_at', 'product_id', 'product__distributor_id', 'quantity', 'product_price'
+    )
+    for order_id, created_at, product_id, distributor_id, quantity, price in lines:
+        day = timezone.localdate(created_at)
+        for key, totals in (
+            ((distributor_id, product_id, day), products[(distributor_id, product_id, day)]),
+            ((distributor_id, day), distributors[(distributor_id, day)]),
+        ):
+            totals['units'] += sale * quantity
+            totals['revenue'] += sale * price * quantity
+            # An order counts once per product and once per distributor however many lines it has
+            if (order_id, key) not in seen:
+                seen.add((order_id, key))
+                totals['orders'] += sale
+                totals['cancellations'] += cancellation
+    return products, distributors
+
+
+def _apply(model, key_fields, deltas):
+    """Add {key: totals} into a rollup table, creating missing rows, a chunk at a time"""
+    keys = [key for key, totals in deltas.items() if any(totals.values())]
+    for start in range(0, len(keys), ROLLUP_CHUNK_SIZE):
+        chunk = keys[start:start + ROLLUP_CHUNK_SIZE]
+        model.objects.bulk_create(
+            [model(**dict(zip(key_fields, key))) for key in chunk], ignore_conflicts=True
+        )
+
+        def plus(field, output_field):
+            return F(field) + Case(
+                *[When(**dict(zip(key_fields, key)), then=Value(deltas[key][field])) for key in chunk],
+                default=Value(0),
+                output_field=output_field,
+            )
+
+        model.objects.filter(**{
+            f'{field}__in': {key[position] for key in chunk} for position, field in enumerate(key_fields)
+        }).update(
+            units=plus('units', IntegerField()),
+            revenue=plus('revenue', REVENUE),
+            orders=plus('orders', IntegerField()),
+            cancellations=plus('cancellations', IntegerField()),
+        )
+
+
+def record_status_change(order_ids, old_status, new_status):
+    """Adjust the rollups for orders moving from old_status to new_status.
+
+    Call inside the transaction that changes the status so the two commit together.
+    Changes that neither make nor unmake a sale or a cancellation cost no queries.
+    """
+    old_sale, old_cancellation = _weights(old_status)
+    new_sale, new_cancellation = _weights(new_status)
+    sale, cancellation = new_sale - old_sale, new_cancellation - old_cancellation
+    if not order_ids or not (sale or cancellation):
+        return
+    products, distributors = _deltas(order_ids, sale, cancellation)
+    _apply(ProductDailySales, PRODUCT_KEY, products)
+    _apply(DistributorDailySales, DISTRIBUTOR_KEY, distributors)
+
+
+def _recomputed(keys):
+    """{key: totals} grouped by ``keys``, summed over hot and archived order items"""
+    sold = Q(order__status__in=SOLD_STATUSES)
+    cancelled = Q(order__status='cancelled')
+    totals = {
+        'units': Coalesce(Sum('quantity', filter=sold), 0),
+        'revenue': Coalesce(Sum(F('product_price') * F('quantity'), filter=sold), Value(Decimal('0')), output_field=REVENUE),
+        'orders': Count('order', distinct=True, filter=sold),
+        'cancellations': Count('order', distinct=True, filter=cancelled),
+    }
+
+    merged = defaultdict(_zero)
+    for item_model in (OrderItem, ArchivedOrderItem):
+        lines = item_model.objects.filter(sold | cancelled, product__isnull=False).annotate(
+            date=TruncDate('order__created_at')
+        ).order_by()
+        for row in lines.values(*keys).annotate(**totals).iterator():
+            key = tuple(row.pop(field) for field in keys)
+            for field, value in row.items():
+                merged[key][field] += value
+    return merged
+
+
+def rebuild_sales_rollups(batch_size=1000):
+    """Recompute every rollup from the order items in one transaction.
+
+    Returns (product rows, distributor rows) written.
+    """
+    with transaction.atomic():
+        ProductDailySales.objects.all().delete()
+        DistributorDailySales.objects.all().delete()
+        products = ProductDailySales.objects.bulk_create(
+            (
+                ProductDailySales(date=date, distributor_id=distributor_id, product_id=product_id, **totals)
+                for (date, distributor_id, product_id), totals
+                in _recomputed(['date', 'product__distributor', 'product']).items()
+            ),
+            batch_size=batch_size,
+        )
+        distributors = DistributorDailySales.objects.bulk_create(
+            (
+                DistributorDailySales(date=date, distributor_id=distributor_id, **totals)
+                for (date, distributor_id), totals in _recomputed(['date', 'product__distributor']).items()
+            ),
+            batch_size=batch_size,
+        )
+    return len(products), len(distributors)
+
+
+def sales_summary(distributor, days=SALES_TREND_DAYS):
+    """Dashboard KPIs from the rollups: all-time and recent totals, a daily trend and top products.
+
+    Three indexed reads whatever the order volume.
+    """
+    since = timezone.localdate() - timedelta(days=days - 1)
+    daily = DistributorDailySales.objects.filter(distributor=distributor)
+    kpis = daily.aggregate(
+        total_units=Coalesce(Sum('units'), 0),
+        total_revenue=Coalesce(Sum('revenue'), Value(Decimal('0')), output_field=REVENUE),
+        total_orders=Coalesce(Sum('orders'), 0),
+        total_cancellations=Coalesce(Sum('cancellations'), 0),
+        recent_units=Coalesce(Sum('units', filter=Q(date__gte=since)), 0),
+        recent_revenue=Coalesce(Sum('revenue', filter=Q(date__gte=since)), Value(Decimal('0')), output_field=REVENUE),
+        recent_orders=Coalesce(Sum('orders', filter=Q(date__gte=since)), 0),
+    )
+    # SQLite hands computed decimals back unquantized
+    kpis['total_revenue'] = Decimal(kpis['total_revenue']).quantize(CENT)
+    kpis['recent_revenue'] = Decimal(kpis['recent_revenue']).quantize(CENT)
+
+    by_date = {
+        row['date']: row for row in daily.filter(date__gte=since).values('date', 'units', 'revenue', 'orders')
+    }
+    trend = []
+    for offset in range(days):
+        day = since + timedelta(days=offset)
+        row = by_date.get(day, {'units': 0, 'revenue': Decimal('0'), 'orders': 0})
+        trend.append({
+            'date': day, 'units': row['units'], 'orders': row['orders'],
+            'revenue': Decimal(row['revenue']).quantize(CENT),
+        })
+    peak = max((day['revenue'] for day in trend), default=0) or 1
+    for day in trend:
+        day['height'] = int(day['revenue'] * 100 / peak)
+
+    top_products = list(
+        ProductDailySales.objects.filter(distributor=distributor, date__gte=since)
+        .values('product_id', 'product__brand', 'product__model_name')
+        .annotate(units=Sum('units'), revenue=Sum('revenue'))
+        .filter(units__gt=0)
+        .order_by('-revenue')[:TOP_PRODUCTS]
+    )
+    for product in top_products:
+        product['revenue'] = Decimal(product['revenue']).quantize(CENT)
+
+    return {**kpis, 'trend': trend, 'top_products': top_products}
@@ -0,0 +1,127 @@
+import re
+
+from django.db import connection
+from django.db.models import FloatField, Value
+from django.db.models.expressions import RawSQL
+
+from .indexes import SEARCH_CONFIG, product_search_vector
+from .models import Product
+
+
+SEARCH_TABLE = 'user_product_search'
+
+
+def search_tokens(query):
+    """Split a free-text query into lowercase word tokens"""
+    return re.findall(r'\w+', (query or '').lower())
+
+
+def specifications_text(specifications):
+    """Flatten the specifications JSON into searchable text"""
+    if not isinstance(specifications, dict):
+        return ''
+    return ' '.join(str(value) for value in specifications.values() if value)
+
+
+class SQLiteSearchBackend:
+    """Full-text search over an FTS5 table keyed by product id, ranked with BM25"""
+
+    # BM25 column weights: brand, model_name, features, specifications
+    weights = (5.0, 10.0, 1.0, 2.0)
+
+    def index_product(self, product):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", [product.pk])
+            cursor.execute(
+                f"INSERT INTO {SEARCH_TABLE} (rowid, brand, model_name, features, specifications) "
+                "VALUES (%s, %s, %s, %s, %s)",
+                [product.pk, product.brand, product.model_name, product.features or '',
+                 specifications_text(product.specifications)]
+            )
+
+    def index_products(self, products):
+        """Index freshly bulk-created products in one executemany"""
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {SEARCH_TABLE} (rowid, brand, model_name, features, specifications) "
+                "VALUES (%s, %s, %s, %s, %s)",
+                [[product.pk, product.brand, product.model_name, product.features or '',
+                  specifications_text(product.specifications)] for product in products]
+            )
+
+    def remove_product(self, product_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", [product_id])
+
+    def rebuild(self):
+        """Refill the index from the product table in one statement"""
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+            cursor.execute(
+                f"INSERT INTO {SEARCH_TABLE} (rowid, brand, model_name, features, specifications) "
+                f"SELECT id, brand, model_name, COALESCE(features, ''), "
+                f"COALESCE((SELECT group_concat(value, ' ') FROM json_each({Product._meta.db_table}.specifications)), '') "
+                f"FROM {Product._meta.db_table}"
+            )
+        return Product.objects.count()
+
+    def search(self, queryset, query):
+        """Restrict a product queryset to matches, annotated with search_rank (lower is better)"""
+        tokens = search_tokens(query)
+        if not tokens:
+            return queryset.annotate(search_rank=Value(0.0)).none()
+
+        # Prefix-match every token: "gal s24" -> "gal"* "s24"*
+        match = ' '.join(f'"{token}"*' for token in tokens)
+        product_table = Product._meta.db_table
+        weights = ', '.join(str(weight) for weight in self.weights)
+
+        # One MATCH picks the products; the rank seeks each match by rowid in the same index
+        return queryset.filter(
+            id__in=RawSQL(f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s', [match])
+        ).annotate(search_rank=RawSQL(
+            f'SELECT bm25({SEARCH_TABLE}, {weights}) FROM {SEARCH_TABLE} '
+            f'WHERE {SEARCH_TABLE} MATCH %s AND {SEARCH_TABLE}.rowid = {product_table}.id',
+            [match], output_field=FloatField()
+        ))
+
+
+class PostgresSearchBackend:
+    """Full-text search with a tsvector expression served by product_search_vector_idx"""
+
+    def index_product(self, product):
+        # The GIN index is maintained by Postgres itself
+        pass
+
+    def index_products(self, products):
+        pass
+
+    def remove_product(self, product_id):
+        pass
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute("REINDEX INDEX product_search_vector_idx")
+        return Product.objects.count()
+
+    def search(self, queryset, query):
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+
+        tokens = search_tokens(query)
+        if not tokens:
+            return queryset.annotate(search_rank=Value(0.0)).none()
+
+        search_query = SearchQuery(
+            ' & '.join(f'{token}:*' for token in tokens), search_type='raw', config=SEARCH_CONFIG
+        )
+        vector = product_search_vector()
+        return queryset.annotate(search_document=vector).filter(search_document=search_query).annotate(
+            search_rank=-SearchRank(vector, search_query)
+        )
+
+
+def get_search_backend(vendor=None):
+    """Search backend for the configured database engine"""
+    if (vendor or connection.vendor) == 'postgresql':
+        return PostgresSearchBackend()
+    return SQLiteSearchBackend()
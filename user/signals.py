@@ -0,0 +1,42 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Product, Review, Cart
+from .images import IMAGE_FIELDS, schedule_image_variants
+from .page_cache import invalidate_cart_products, invalidate_product_page
+from .ratings import record_removed_rating
+from .reviews import invalidate_reviews
+from .search import get_search_backend
+from .storage import change_references, track_image_references
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, created, **kwargs):
+    """Keep the full-text index, cached page and image media in sync with saved products"""
+    get_search_backend().index_product(instance)
+    invalidate_product_page(instance.pk)
+    track_image_references(instance, IMAGE_FIELDS, created)
+    schedule_image_variants(instance)
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    """Drop deleted products from the full-text index and page cache, releasing their images"""
+    get_search_backend().remove_product(instance.pk)
+    invalidate_product_page(instance.pk)
+    change_references([name for name in getattr(instance, '_image_names', {}).values() if name], -1)
+
+
+@receiver(post_delete, sender=Review)
+def remove_review_rating(sender, instance, **kwargs):
+    """Take deleted reviews out of the product's rating aggregates"""
+    record_removed_rating(instance.product_id, instance.rating)
+    invalidate_reviews(instance.product_id)
+    invalidate_product_page(instance.product_id)
+
+
+@receiver(post_save, sender=Cart)
+@receiver(post_delete, sender=Cart)
+def cart_changed(sender, instance, **kwargs):
+    """Forget the cached in-cart product ids when a cart line changes"""
+    invalidate_cart_products(instance.user_id)
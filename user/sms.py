@@ -0,0 +1,57 @@
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+# Messages sent through the locmem backend, like django.core.mail.outbox
+outbox = []
+
+
+class BaseSMSBackend:
+    """Sends (phone, body) messages; open() once and reuse the client for a whole batch"""
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def send(self, phone, body):
+        raise NotImplementedError
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class TwilioSMSBackend(BaseSMSBackend):
+    def __init__(self):
+        self.client = None
+
+    def open(self):
+        if self.client is None:
+            import twilio.rest
+
+            self.client = twilio.rest.Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
+
+    def close(self):
+        self.client = None
+
+    def send(self, phone, body):
+        self.client.messages.create(body=body, from_=settings.TWILIO_PHONE_NUMBER, to=f"+91{phone}")
+
+
+class ConsoleSMSBackend(BaseSMSBackend):
+    def send(self, phone, body):
+        print(f"SMS to +91{phone}: {body}")
+
+
+class LocmemSMSBackend(BaseSMSBackend):
+    def send(self, phone, body):
+        outbox.append((phone, body))
+
+
+def get_sms_backend():
+    return import_string(getattr(settings, 'SMS_BACKEND', 'user.sms.TwilioSMSBackend'))()
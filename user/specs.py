@@ -0,0 +1,164 @@
+import re
+from decimal import ROUND_CEILING, Decimal, InvalidOperation
+
+from django.db.models import Count, Q
+
+
+# Keys of the specifications JSON written by the product forms
+SPEC_KEYS = ['display', 'processor', 'ram', 'storage', 'battery', 'camera_rear', 'camera_front', 'os', 'network']
+
+# Typed attribute -> (label, unit, "at least" thresholds offered as filters)
+SPEC_FACETS = {
+    'ram_gb': ('RAM', 'GB', [4, 6, 8, 12, 16]),
+    'storage_gb': ('Storage', 'GB', [64, 128, 256, 512, 1024]),
+    'battery_mah': ('Battery', 'mAh', [4000, 4500, 5000, 6000]),
+    'display_inches': ('Display', 'inch', [Decimal('6.0'), Decimal('6.5'), Decimal('6.7')]),
+}
+
+# Largest minimum each facet accepts, within its column's range; anything above matches nothing anyway
+SPEC_FILTER_MAX = {
+    'ram_gb': Decimal(2147483647),
+    'storage_gb': Decimal(2147483647),
+    'battery_mah': Decimal(2147483647),
+    'display_inches': Decimal('99.99'),
+}
+
+NUMBER_RE = re.compile(r'(\d+(?:\.\d+)?)\s*([a-zA-Z"]*)')
+# A number with a storage unit, so '8GB' in 'LPDDR5 8GB' wins over the 5 in the memory type
+CAPACITY_RE = re.compile(r'(\d+(?:\.\d+)?)\s*([tgm])b\b', re.IGNORECASE)
+# A bare number standing on its own, for values written without a unit
+BARE_NUMBER_RE = re.compile(r'(?<![\w.])(\d+(?:\.\d+)?)(?![\w.])')
+
+
+def _first_number(text):
+    """Return (number, unit) for the first number in a free-text spec value"""
+    match = NUMBER_RE.search(str(text or ''))
+    if not match:
+        return None, ''
+    return Decimal(match.group(1)), match.group(2).lower()
+
+
+def parse_capacity_gb(text):
+    """'8 GB', '12GB LPDDR5', 'LPDDR5 8GB', '1 TB', '8' -> whole gigabytes"""
+    text = str(text or '')
+    match = CAPACITY_RE.search(text)
+    if match:
+        value, unit = Decimal(match.group(1)), match.group(2).lower()
+    else:
+        match = BARE_NUMBER_RE.search(text)
+        if not match:
+            return None
+        value, unit = Decimal(match.group(1)), 'g'
+    if unit == 't':
+        value *= 1024
+    elif unit == 'm':
+        value /= 1024
+    return int(value) or None
+
+
+def parse_battery_mah(text):
+    """'5000 mAh', '4,500mAh' -> milliamp-hours"""
+    value, unit = _first_number(str(text or '').replace(',', ''))
+    if value is None:
+        return None
+    return int(value)
+
+
+def parse_display_inches(text):
+    """'6.5 inch', '6.7"' -> inches, ignoring resolutions and refresh rates"""
+    value, unit = _first_number(text)
+    if value is None or not 1 <= value < 20:
+        return None
+    try:
+        return value.quantize(Decimal('0.01'))
+    except InvalidOperation:
+        return None
+
+
+def parse_spec_attributes(specifications):
+    """Typed numeric attributes from the free-text specifications JSON"""
+    specifications = specifications if isinstance(specifications, dict) else {}
+    return {
+        'ram_gb': parse_capacity_gb(specifications.get('ram')),
+        'storage_gb': parse_capacity_gb(specifications.get('storage')),
+        'battery_mah': parse_battery_mah(specifications.get('battery')),
+        'display_inches': parse_display_inches(specifications.get('display')),
+    }
+
+
+def spec_filters_from_query(params):
+    """Read min_<attribute> query parameters into {attribute: minimum}.
+
+    Unparseable or non-finite values are ignored; the rest are rounded up to the
+    column's precision and kept within its range.
+    """
+    filters = {}
+    for field in SPEC_FACETS:
+        value = params.get(f'min_{field}')
+        if not value:
+            continue
+        try:
+            value = Decimal(value)
+        except InvalidOperation:
+            continue
+        if not value.is_finite():
+            continue
+        value = min(max(value, 0), SPEC_FILTER_MAX[field])
+        if field == 'display_inches':
+            filters[field] = value.quantize(Decimal('0.01'), rounding=ROUND_CEILING)
+        else:
+            filters[field] = int(value.to_integral_value(rounding=ROUND_CEILING))
+    return filters
+
+
+def apply_spec_filters(products, filters):
+    return products.filter(**{f'{field}__gte': value for field, value in filters.items()})
+
+
+def facet_counts(products, brands, selected_brand=None, spec_filters=None):
+    """Per-value counts for the brand and spec facets in a single aggregate query.
+
+    ``products`` must not be filtered on brand or specs yet. Each facet is counted with
+    every other selected filter applied but not its own, so its options show what
+    picking them instead would match.
+    """
+    spec_filters = spec_filters or {}
+    spec_q = {field: Q(**{f'{field}__gte': value}) for field, value in spec_filters.items()}
+
+    def all_specs_except(excluded=None):
+        q = Q()
+        for field, condition in spec_q.items():
+            if field != excluded:
+                q &= condition
+        return q
+
+    aggregates = {
+        f'brand_{value}': Count('id', filter=all_specs_except() & Q(brand=value)) for value, _ in brands
+    }
+    brand_q = Q(brand=selected_brand) if selected_brand else Q()
+    for field, (label, unit, thresholds) in SPEC_FACETS.items():
+        others = brand_q & all_specs_except(field)
+        for index, threshold in enumerate(thresholds):
+            aggregates[f'{field}_{index}'] = Count('id', filter=others & Q(**{f'{field}__gte': threshold}))
+
+    counts = products.order_by().aggregate(**aggregates)
+
+    facets = []
+    for field, (label, unit, thresholds) in SPEC_FACETS.items():
+        facets.append({
+            'field': field,
+            'param': f'min_{field}',
+            'label': label,
+            'options': [
+                {
+                    'value': threshold,
+                    'label': f'{threshold}+ {unit}',
+                    'count': counts[f'{field}_{index}'],
+                    'selected': spec_filters.get(field) == threshold,
+                }
+                for index, threshold in enumerate(thresholds)
+            ],
+        })
+
+    brand_counts = {value: counts[f'brand_{value}'] for value, _ in brands}
+    return brand_counts, facets
@@ -0,0 +1,122 @@
+import hashlib
+import os
+import re
+
+from django.core.files.storage import FileSystemStorage
+from django.db.models import F
+from django.utils import timezone
+
+
+HASHED_NAME_RE = re.compile(r'(^|/)[0-9a-f]{2}/[0-9a-f]{64}(\.[a-z0-9]+|/)')
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """File storage that names uploads by their SHA-256, so identical files are stored once.
+
+    ``products/download.jpg`` is saved as ``products/ab/ab12...ef.jpg``; saving the same
+    bytes again returns the existing name without writing anything.
+    """
+
+    def hashed_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        if hasattr(content, 'seek'):
+            content.seek(0)
+
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        hexdigest = digest.hexdigest()
+        return os.path.join(directory, hexdigest[:2], f'{hexdigest}{extension}')
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            from django.core.files import File
+            content = File(content, name)
+
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length=max_length)
+
+
+def product_media_storage():
+    return ContentAddressedStorage()
+
+
+def is_hashed_name(name):
+    return bool(HASHED_NAME_RE.search(name))
+
+
+def loaded_image_names(product, fields):
+    """Names of the image fields that were actually loaded on this instance"""
+    deferred = product.get_deferred_fields()
+    return {field: getattr(product, field).name or '' for field in fields if field not in deferred}
+
+
+def track_image_references(product, fields, created):
+    """Adjust MediaBlob reference counts for the images a product gained or dropped.
+
+    Existing instances are compared with the names captured when they were loaded;
+    fields that were deferred or never captured are left alone.
+    """
+    previous = {} if created else getattr(product, '_image_names', None)
+    if previous is None:
+        return
+
+    current = loaded_image_names(product, fields)
+    added, removed = [], []
+    for field, new_name in current.items():
+        if not created and field not in previous:
+            continue
+        old_name = previous.get(field, '')
+        if old_name == new_name:
+            continue
+        if new_name:
+            added.append(new_name)
+        if old_name:
+            removed.append(old_name)
+
+    change_references(added, 1)
+    change_references(removed, -1)
+    product._image_names = current
+
+
+def change_references(names, delta):
+    """Add delta to the reference count of each blob name, once per occurrence"""
+    from .models import MediaBlob
+
+    if not names:
+        return
+    MediaBlob.objects.bulk_create([MediaBlob(name=name) for name in set(names)], ignore_conflicts=True)
+    for name in set(names):
+        MediaBlob.objects.filter(name=name).update(
+            ref_count=F('ref_count') + delta * names.count(name), updated_at=timezone.now()
+        )
+
+
+def recount_references(product_model, blob_model, fields):
+    """Reset every blob's reference count from the product image columns.
+
+    Takes the models as arguments so migrations can pass their historical versions.
+    Returns the number of blobs whose count changed.
+    """
+    counts = {}
+    for field in fields:
+        rows = product_model.objects.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True}).values_list(field, flat=True)
+        for name in rows.iterator():
+            counts[name] = counts.get(name, 0) + 1
+
+    blob_model.objects.bulk_create([blob_model(name=name) for name in counts], ignore_conflicts=True, batch_size=500)
+
+    changed = []
+    for blob in blob_model.objects.only('id', 'name', 'ref_count', 'updated_at').iterator():
+        expected = counts.get(blob.name, 0)
+        if blob.ref_count != expected:
+            blob.ref_count = expected
+            blob.updated_at = timezone.now()
+            changed.append(blob)
+    blob_model.objects.bulk_update(changed, ['ref_count', 'updated_at'], batch_size=500)
+    return len(changed)
@@ -1,3 +1,1050 @@
-from django.test import TestCase
+import io
+import math
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import timedelta
+from decimal import ROUND_HALF_UP, Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.core import mail, signing
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, close_old_connections, connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from . import sms
+from .models import (
+    ArchivedDistributorOrder, ArchivedOrder, ArchivedOrderItem, Cart, DistributorDailySales, MediaBlob, Notification, Order,
+    OrderItem, OrderStatusHistory, Product, Review, StockReservation, User,
+)
+from .notifications import drain, queue_order_confirmation
+from . import order_ids
+from .order_ids import ENCODED_LENGTH, ORDER_ID_PREFIX, SEQUENCE_BITS, OrderIdGenerator, new_order_id
+from .order_status import transition_orders
+from .orders import get_distributor_order_page, get_order_history_page, place_order
+from .page_cache import get_product_page, invalidate_product_page, render_product_page
+from .archive import archive_orders, get_any_order
+from .cart import CART_COOKIE, CART_COOKIE_SALT, DatabaseCart
+from .catalog import catalog_queryset, encode_cursor, get_catalog_page
+from .geo import EARTH_RADIUS_KM, geohash, haversine_km, nearest_neighbour_batches, parse_coordinates
+from .images import IMAGE_FIELDS, VARIANT_FORMATS, VARIANT_WIDTHS, image_set, variant_name
+from .paginators import ApproximateCountPaginator
+from .pricing import CENT, price_cart, price_product, price_products
+from .ratings import reconcile_ratings
+from .reviews import REVIEW_PAGE_SIZE, get_first_review_page, get_review_page, invalidate_reviews
+from .search import SQLiteSearchBackend
+from .sales import rebuild_sales_rollups
+from .specs import facet_counts, parse_capacity_gb, spec_filters_from_query
+from .storage import is_hashed_name, product_media_storage, recount_references
+
+
+def _generate_ids(count):
+    return [new_order_id() for _ in range(count)]
+
+
+def _distributor(username='dist', phone='9000000000'):
+    return User.objects.create_user(
+        username=username, email=f'{username}@example.com', phone=phone, password='pw', user_type='distributor'
+    )
+
+
+def _product(distributor, model_name='Galaxy', **fields):
+    defaults = {'brand': 'Samsung', 'price': Decimal('10000'), 'stock': 10, 'image1': '', 'specifications': {}}
+    defaults.update(fields)
+    return Product.objects.create(
+        distributor=distributor, model_name=model_name, slug=model_name.lower().replace(' ', '-'), **defaults
+    )
+
+
+class OrderIdGeneratorTests(SimpleTestCase):
+    def test_format(self):
+        order_id = new_order_id()
+        self.assertTrue(order_id.startswith(ORDER_ID_PREFIX))
+        self.assertEqual(len(order_id), len(ORDER_ID_PREFIX) + ENCODED_LENGTH)
+
+    def test_unique_and_sorted_across_threads(self):
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            batches = list(pool.map(_generate_ids, [5000] * 8))
+
+        every_id = [order_id for batch in batches for order_id in batch]
+        self.assertEqual(len(set(every_id)), len(every_id))
+        for batch in batches:
+            self.assertEqual(batch, sorted(batch))
+
+    @skipUnless('fork' in multiprocessing.get_all_start_methods(), 'needs fork')
+    def test_unique_across_forked_processes(self):
+        with multiprocessing.get_context('fork').Pool(4) as pool:
+            batches = pool.map(_generate_ids, [5000] * 4)
+
+        every_id = [order_id for batch in batches for order_id in batch]
+        self.assertEqual(len(set(every_id)), len(every_id))
+
+    def test_clock_going_backwards(self):
+        generator = OrderIdGenerator()
+        with mock.patch.object(generator, '_now_ms', side_effect=[1000, 1000, 999, 500, 1001]):
+            values = [generator.next_value() for _ in range(5)]
+        self.assertEqual(values, sorted(values))
+        self.assertEqual(len(set(values)), 5)
+
+    def test_sequence_overflow_borrows_next_millisecond(self):
+        generator = OrderIdGenerator()
+        count = (1 << SEQUENCE_BITS) + 10
+        with mock.patch.object(generator, '_now_ms', return_value=1000):
+            values = [generator.next_value() for _ in range(count)]
+        self.assertEqual(len(set(values)), count)
+        self.assertEqual(values, sorted(values))
+
+
+DELIVERY = {
+    'delivery_name': 'Shopper', 'delivery_phone': '9000000000',
+    'delivery_email': 'shopper@example.com', 'delivery_address': 'Address', 'delivery_location': None,
+}
+
+
+class OrderIdCollisionTests(TestCase):
+    """Another process sharing our node would produce IDs we then fail to insert"""
+
+    def setUp(self):
+        self.product = _product(_distributor())
+        self.shopper = User.objects.create_user(username='shopper', email='s@example.com', phone='9111111111', password='pw')
+
+    def test_taken_id_draws_a_new_node_and_retries(self):
+        taken = place_order(self.shopper, price_product(self.product.id, 1), DELIVERY).order_id
+        node = order_ids._generator.node
+        fresh = new_order_id()
+        with mock.patch('user.orders.new_order_id', side_effect=[taken, fresh]):
+            order = place_order(self.shopper, price_product(self.product.id, 1), DELIVERY)
+
+        self.assertEqual(order.order_id, fresh)
+        self.assertNotEqual(order_ids._generator.node, node)
+        self.assertEqual(Order.objects.count(), 2)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 8)
+
+    def test_gives_up_after_repeated_clashes(self):
+        taken = place_order(self.shopper, price_product(self.product.id, 1), DELIVERY).order_id
+        with mock.patch('user.orders.new_order_id', return_value=taken):
+            with self.assertRaises(IntegrityError):
+                place_order(self.shopper, price_product(self.product.id, 1), DELIVERY)
+        self.assertEqual(Order.objects.count(), 1)
+
+
+class ConcurrentCheckoutTests(TransactionTestCase):
+    """Fire many checkouts at once and check none of them collides on order_id"""
+
+    shoppers = 16
+
+    def setUp(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('threads cannot share an in-memory SQLite test database; run with Mobiles.threaded_test_settings')
+        distributor = User.objects.create_user(
+            username='dist', email='dist@example.com', phone='9000000000', password='pw', user_type='distributor'
+        )
+        self.product = Product.objects.create(
+            distributor=distributor, brand='Samsung', model_name='Galaxy', slug='galaxy',
+            image1='', price=Decimal('10000'), stock=self.shoppers, specifications={}
+        )
+        self.users = [
+            User.objects.create_user(
+                username=f'shopper{i}', email=f'shopper{i}@example.com', phone=f'9{i:09d}', password='pw'
+            )
+            for i in range(1, self.shoppers + 1)
+        ]
+        Cart.objects.bulk_create([Cart(user=user, product=self.product, quantity=1) for user in self.users])
+
+    def test_concurrent_checkouts(self):
+        start = threading.Barrier(self.shoppers)
+
+        def checkout(user):
+            try:
+                pricing = price_cart(user)
+                start.wait()
+                return place_order(user, pricing, DELIVERY).order_id
+            finally:
+                close_old_connections()
+
+        with ThreadPoolExecutor(max_workers=self.shoppers) as pool:
+            order_ids = list(pool.map(checkout, self.users))
+
+        self.assertEqual(len(set(order_ids)), self.shoppers)
+        self.assertEqual(Order.objects.count(), self.shoppers)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 0)
+
+
+class SpecFilterTests(TestCase):
+    def setUp(self):
+        distributor = _distributor()
+        _product(distributor, 'Small', specifications={'ram': '4 GB', 'storage': '64 GB'})
+        _product(distributor, 'Mid', specifications={'ram': '8 GB', 'storage': '128 GB'})
+        _product(distributor, 'Big', brand='Apple', specifications={'ram': '12 GB', 'storage': '256 GB'})
+
+    def test_bad_values_are_ignored(self):
+        for value in ['NaN', 'Infinity', '-Infinity', 'sNaN', 'abc']:
+            self.assertEqual(spec_filters_from_query({'min_ram_gb': value}), {})
+            response = self.client.get(reverse('shopping'), {'min_ram_gb': value})
+            self.assertEqual(response.status_code, 200)
+
+    def test_capacities_read_the_number_next_to_the_unit(self):
+        cases = {
+            'LPDDR5 8GB': 8, '12GB LPDDR5X': 12, '1 TB': 1024, '1.5TB': 1536, '128 GB UFS 3.1': 128,
+            '8': 8, 'LPDDR5': None, '512MB': None, '': None, None: None,
+        }
+        for text, expected in cases.items():
+            self.assertEqual(parse_capacity_gb(text), expected, text)
+
+    def test_values_are_coerced_to_the_column(self):
+        filters = spec_filters_from_query({'min_ram_gb': '7.2', 'min_battery_mah': '1e30', 'min_display_inches': '6.123'})
+        self.assertEqual(filters['ram_gb'], 8)
+        self.assertIsInstance(filters['ram_gb'], int)
+        self.assertEqual(filters['battery_mah'], 2147483647)
+        self.assertEqual(filters['display_inches'], Decimal('6.13'))
+        response = self.client.get(reverse('shopping'), {'min_ram_gb': '1e30'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_facets_leave_out_their_own_filter(self):
+        filters = {'ram_gb': 8, 'storage_gb': 256}
+        brand_counts, facets = facet_counts(
+            Product.objects.all(), [('Samsung', 'Samsung'), ('Apple', 'Apple')], spec_filters=filters
+        )
+        options = {facet['field']: {o['value']: o['count'] for o in facet['options']} for facet in facets}
+        # RAM counts ignore the RAM filter but keep storage >= 256
+        self.assertEqual(options['ram_gb'][4], 1)
+        # Storage counts ignore the storage filter but keep RAM >= 8
+        self.assertEqual(options['storage_gb'][64], 2)
+        self.assertEqual(brand_counts, {'Samsung': 0, 'Apple': 1})
+
+
+class BuyNowQuantityTests(TestCase):
+    def test_quantity_below_one_is_refused(self):
+        product = _product(_distributor(), stock=5)
+        shopper = User.objects.create_user(username='shopper', email='s@example.com', phone='9111111111', password='pw')
+        self.client.force_login(shopper)
+        for quantity in ['-3', '0', 'abc']:
+            response = self.client.post(reverse('buy_now', args=[product.id]), {'quantity': quantity})
+            self.assertRedirects(response, reverse('product_detail', args=[product.id]), fetch_redirect_response=False)
+        self.assertNotIn('buy_now_quantity', self.client.session)
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 5)
+
+
+class CartTests(TestCase):
+    def setUp(self):
+        self.product = _product(_distributor(), stock=5)
+        self.shopper = User.objects.create_user(username='shopper', email='s@example.com', phone='9111111111', password='pw')
+        self.cart = DatabaseCart(self.shopper)
+
+    def sell_out(self):
+        Product.objects.filter(id=self.product.id).update(stock=0)
+        self.product.refresh_from_db()
+
+    def test_add_drops_a_line_clamped_to_nothing(self):
+        self.cart.add(self.product, 2)
+        self.sell_out()
+        self.cart.add(self.product, 1)
+        self.assertFalse(Cart.objects.exists())
+
+        self.cart.add(self.product, 1)
+        self.assertFalse(Cart.objects.exists())
+
+    def test_apply_changes_drops_a_line_clamped_to_nothing(self):
+        self.cart.add(self.product, 2)
+        self.sell_out()
+        self.cart.apply_changes({self.product.id: 3})
+        self.assertFalse(Cart.objects.exists())
+        self.assertEqual(price_cart(self.shopper).lines, [])
+
+    def test_add_to_cart_refuses_quantities_below_one(self):
+        self.client.force_login(self.shopper)
+        for quantity in ['-2', '0', 'two']:
+            response = self.client.post(reverse('add_to_cart', args=[self.product.id]), {'quantity': quantity})
+            self.assertEqual(response.status_code, 302)
+        self.assertFalse(Cart.objects.exists())
+
+    def test_batch_update_rejects_malformed_lines(self):
+        self.client.force_login(self.shopper)
+        for body in ['{"lines": 5}', '{"lines": null}', '{"lines": "abc"}', '{"lines": {"1": 2}}', '[1]', 'nope']:
+            response = self.client.post(reverse('update_cart_batch'), body, content_type='application/json')
+            self.assertEqual(response.status_code, 400, body)
+
+        response = self.client.post(reverse('update_cart', args=[self.product.id]), {'quantity': 'x'})
+        self.assertEqual(response.status_code, 400)
+
+
+class ProductPageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_page_rendered_before_an_invalidation_is_never_served(self):
+        product = _product(_distributor(), stock=5)
+        page, version = get_product_page(product.id)
+        self.assertIsNone(page)
+
+        # The stock changes while the page is being rendered from the old row
+        stale = Product.objects.get(id=product.id)
+        Product.objects.filter(id=product.id).update(stock=0)
+        invalidate_product_page(product.id)
+        render_product_page(stale, [], None, version)
+        self.assertIsNone(get_product_page(product.id)[0])
+
+        response = self.client.get(reverse('product_detail', args=[product.id]))
+        self.assertContains(response, 'Out of Stock')
+        self.assertIsNotNone(get_product_page(product.id)[0])
+
+    def test_invalidating_a_page_never_cached(self):
+        invalidate_product_page(12345)
+        self.assertIsNone(get_product_page(12345)[0])
+
+
+class OrderArchiveTests(TestCase):
+    def setUp(self):
+        self.distributor = _distributor()
+        self.other = _distributor('other', '9000000001')
+        self.phone = _product(self.distributor, stock=50)
+        self.case = _product(self.other, 'Case', price=Decimal('500'), stock=50)
+        self.shopper = User.objects.create_user(username='shopper', email='s@example.com', phone='9111111111', password='pw')
+        Cart.objects.create(user=self.shopper, product=self.phone, quantity=2)
+        Cart.objects.create(user=self.shopper, product=self.case, quantity=1)
+        self.order = place_order(self.shopper, price_cart(self.shopper), DELIVERY)
+        for status in ('confirmed', 'processing', 'shipped', 'delivered'):
+            transition_orders(Order.objects.filter(id=self.order.id), status)
+        Order.objects.filter(id=self.order.id).update(updated_at=timezone.now() - timedelta(days=365))
+
+    def rollups(self):
+        return sorted(DistributorDailySales.objects.values_list('distributor_id', 'units', 'revenue', 'orders'))
+
+    def test_round_trip(self):
+        hot_page, _ = get_distributor_order_page(self.distributor)
+        rebuild_sales_rollups()
+        rollups = self.rollups()
+
+        report = archive_orders(days=30)
+        self.assertEqual((report['orders'], report['items']), (1, 2))
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(OrderItem.objects.exists())
+        self.assertFalse(OrderStatusHistory.objects.exists())
+
+        archived = ArchivedOrder.objects.get()
+        self.assertEqual((archived.id, archived.order_id), (self.order.id, self.order.order_id))
+        self.assertEqual([change['to'] for change in archived.status_history], ['confirmed', 'processing', 'shipped', 'delivered'])
+        self.assertEqual(ArchivedOrderItem.objects.count(), 2)
+        self.assertEqual(ArchivedDistributorOrder.objects.count(), 2)
+
+        # The distributor still sees the order, with only their own lines
+        page, next_cursor = get_distributor_order_page(self.distributor)
+        self.assertIsNone(next_cursor)
+        self.assertEqual([link.id for link in page], [link.id for link in hot_page])
+        self.assertEqual([item.product_name for item in page[0].order.distributor_items], ['Samsung Galaxy'])
+        self.assertEqual(page[0].subtotal, hot_page[0].subtotal)
+        self.client.force_login(self.distributor)
+        self.assertContains(self.client.get(reverse('distributor_orders')), self.order.order_id)
+
+        self.assertEqual(get_any_order(self.shopper, self.order.order_id), archived)
+        self.assertEqual(get_order_history_page(self.shopper)[0], [archived])
+
+        rebuild_sales_rollups()
+        self.assertEqual(self.rollups(), rollups)
+
+    def test_dry_run_moves_nothing(self):
+        report = archive_orders(days=30, dry_run=True)
+        self.assertEqual((report['orders'], report['items'], report['batches']), (1, 2, 1))
+        self.assertTrue(Order.objects.exists())
+        self.assertFalse(ArchivedOrder.objects.exists())
+
+
+class KeysetCursorTests(TestCase):
+    """Pages chained by cursor visit every row once, across the hot and archived tiers"""
+
+    def setUp(self):
+        self.distributor = _distributor()
+        product = _product(self.distributor, stock=100)
+        self.shopper = User.objects.create_user(username='shopper', email='s@example.com', phone='9111111111', password='pw')
+        same_time = timezone.now() - timedelta(days=400)
+        for index in range(7):
+            order = place_order(self.shopper, price_product(product.id, 1), DELIVERY)
+            # Several orders share a timestamp so the id tie-break is exercised
+            created_at = same_time if index < 4 else same_time + timedelta(minutes=index)
+            Order.objects.filter(id=order.id).update(created_at=created_at)
+            order.distributor_links.update(created_at=created_at)
+        old = Order.objects.order_by('id')[:3]
+        transition_orders(Order.objects.filter(id__in=old), 'cancelled')
+        Order.objects.filter(status='cancelled').update(updated_at=same_time)
+        archive_orders(days=30)
+        self.assertEqual(ArchivedOrder.objects.count(), 3)
+
+    def walk(self, get_page):
+        seen, cursor = [], None
+        while True:
+            page, cursor = get_page(cursor)
+            self.assertLessEqual(len(page), 2)
+            seen.extend(page)
+            if cursor is None:
+                return seen
+
+    def test_order_history(self):
+        seen = self.walk(lambda cursor: get_order_history_page(self.shopper, cursor, page_size=2))
+        self.assertEqual(len({order.order_id for order in seen}), 7)
+        self.assertEqual(seen, sorted(seen, key=lambda order: (-order.created_at.timestamp(), order.id)))
+
+    def test_distributor_orders(self):
+        seen = self.walk(lambda cursor: get_distributor_order_page(self.distributor, cursor, page_size=2))
+        self.assertEqual(len({link.order.order_id for link in seen}), 7)
+
+    def test_tampered_cursor(self):
+        self.client.force_login(self.shopper)
+        self.assertEqual(self.client.get(reverse('orders'), {'cursor': 'garbage'}).status_code, 200)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'the FTS5 backend needs SQLite')
+class SQLiteSearchTests(TestCase):
+    def setUp(self):
+        distributor = _distributor()
+        _product(distributor, 'Galaxy S24 Ultra')
+        _product(distributor, 'iPhone 15', brand='Apple', features='Titanium, galaxy-class camera')
+        _product(distributor, 'Redmi Note', brand='Xiaomi', specifications={'os': 'HyperOS'})
+        for index in range(5):
+            _product(distributor, f'Galaxy A{index}')
+
+    def test_prefix_matches_ranked_by_field_weight(self):
+        results = list(catalog_queryset(search='gal').order_by('search_rank', 'id'))
+        self.assertEqual(len(results), 7)
+        self.assertEqual(results[-1].model_name, 'iPhone 15')
+        self.assertEqual(
+            [product.model_name for product in catalog_queryset(search='hyperos')], ['Redmi Note']
+        )
+        self.assertFalse(catalog_queryset(search='!!').exists())
+
+    def test_relevance_pages_visit_every_match_once(self):
+        seen, cursor = [], None
+        while True:
+            page, cursor = get_catalog_page(catalog_queryset(search='galaxy'), cursor, sort='relevance', page_size=2)
+            seen.extend(product.id for product in page)
+            if cursor is None:
+                break
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertEqual(len(seen), 7)
+
+    def test_search_combines_with_other_filters(self):
+        products = SQLiteSearchBackend().search(Product.objects.filter(brand='Apple'), 'galaxy')
+        self.assertEqual([product.model_name for product in products], ['iPhone 15'])
+
+
+class PostgresSearchIndexTests(SimpleTestCase):
+    def test_index_and_queries_share_one_configured_vector(self):
+        from .indexes import SEARCH_CONFIG
+
+        index = next(index for index in Product._meta.indexes if index.name == 'product_search_vector_idx')
+        vectors = []
+        pending = list(index.expressions)
+        while pending:
+            expression = pending.pop()
+            if type(expression).__name__ == 'SearchVector':
+                vectors.append(expression)
+            else:
+                pending.extend(expression.get_source_expressions())
+        self.assertEqual(len(vectors), 4)
+        for vector in vectors:
+            self.assertEqual(vector.config.config.value, SEARCH_CONFIG)
+
+
+class ApproximateCountPaginatorTests(TestCase):
+    def test_counts_exactly_past_the_estimate_threshold(self):
+        distributor = _distributor()
+        Product.objects.bulk_create([
+            Product(distributor=distributor, brand='Samsung', model_name=f'Galaxy {index}', slug=f'galaxy-{index}',
+                    image1='', price=Decimal('100'), specifications={})
+            for index in range(30)
+        ])
+        with mock.patch('user.paginators.APPROXIMATE_COUNT_LIMIT', 10):
+            paginator = ApproximateCountPaginator(Product.objects.order_by('id'), 10)
+            self.assertEqual(paginator.count, 30)
+            self.assertEqual(len(paginator.page(3).object_list), 10)
+
+    def test_admin_changelist_reaches_the_last_page(self):
+        admin = User.objects.create_superuser(username='admin', email='a@example.com', phone='9222222222', password='pw')
+        distributor = _distributor()
+        Product.objects.bulk_create([
+            Product(distributor=distributor, brand='Samsung', model_name=f'Galaxy {index}', slug=f'galaxy-{index}',
+                    image1='', price=Decimal('100'), specifications={})
+            for index in range(30)
+        ])
+        self.client.force_login(admin)
+        with mock.patch('user.paginators.APPROXIMATE_COUNT_LIMIT', 10), mock.patch('user.admin.ProductAdmin.list_per_page', 10):
+            response = self.client.get(reverse('admin:user_product_changelist'), {'p': 3})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['cl'].result_count, 30)
+
+
+@override_settings(SMS_BACKEND='user.sms.LocmemSMSBackend')
+class NotificationOutboxTests(TestCase):
+    """The outbox is the only way email and SMS leave the app"""
+
+    def setUp(self):
+        sms.outbox.clear()
+
+    def test_order_confirmation_is_delivered_once(self):
+        product = _product(_distributor())
+        shopper = User.objects.create_user(username='shopper', email='s@example.com', phone='9111111111', password='pw')
+        order = place_order(shopper, price_product(product.id, 1), DELIVERY)
+        queue_order_confirmation(order)
+
+        self.assertEqual(drain(), (2, 0))
+        self.assertEqual(drain(), (0, 0))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn(order.order_id, mail.outbox[0].subject)
+        self.assertEqual([phone for phone, body in sms.outbox], [DELIVERY['delivery_phone']])
+        self.assertFalse(Notification.objects.exclude(status='sent').exists())
+
+
+class IdempotentCheckoutTests(TestCase):
+    def setUp(self):
+        self.product = _product(_distributor(), stock=5)
+        self.shopper = User.objects.create_user(username='shopper', email='s@example.com', phone='9111111111', password='pw')
+        Cart.objects.create(user=self.shopper, product=self.product, quantity=2)
+        self.client.force_login(self.shopper)
+
+    def checkout(self, key):
+        return self.client.post(reverse('checkout'), {**DELIVERY, 'delivery_location': '', 'idempotency_key': key})
+
+    def test_resubmission_replays_the_first_redirect(self):
+        first = self.checkout('a' * 32)
+        order = Order.objects.get()
+        self.assertRedirects(first, reverse('payment_options', args=[order.order_id]), fetch_redirect_response=False)
+
+        # The cart is empty now, so only a replay can send the shopper to the same order
+        again = self.checkout('a' * 32)
+        self.assertEqual((again.status_code, again['Location']), (first.status_code, first['Location']))
+        self.assertEqual(Order.objects.count(), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 3)
+
+    def test_new_key_is_a_new_submission(self):
+        self.checkout('a' * 32)
+        response = self.checkout('b' * 32)
+        self.assertRedirects(response, reverse('shopping'), fetch_redirect_response=False)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_oversized_key_is_rejected(self):
+        self.assertEqual(self.checkout('k' * 65).status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+
+class OrderStatusTransitionTests(TestCase):
+    def setUp(self):
+        self.distributor = _distributor()
+        self.product = _product(self.distributor, stock=10)
+        self.shopper = User.objects.create_user(username='shopper', email='s@example.com', phone='9111111111', password='pw')
+
+    def order(self, quantity=2):
+        return place_order(self.shopper, price_product(self.product.id, quantity), DELIVERY)
+
+    def move(self, order, status):
+        return transition_orders(Order.objects.filter(id=order.id), status, changed_by=self.distributor)
+
+    def stock(self):
+        self.product.refresh_from_db()
+        return self.product.stock
+
+    def test_happy_path_is_logged(self):
+        order = self.order()
+        for status in ('confirmed', 'processing', 'shipped', 'delivered'):
+            moved, skipped = self.move(order, status)
+            self.assertEqual((moved, skipped), ([order.id], []))
+        self.assertEqual(
+            list(OrderStatusHistory.objects.order_by('id').values_list('from_status', 'to_status')),
+            [('pending', 'confirmed'), ('confirmed', 'processing'), ('processing', 'shipped'), ('shipped', 'delivered')],
+        )
+        self.assertFalse(StockReservation.objects.exists())
+        self.assertEqual(self.stock(), 8)
+
+    def test_illegal_moves_are_skipped(self):
+        order = self.order()
+        self.assertEqual(self.move(order, 'shipped'), ([], [(order.order_id, 'pending')]))
+        self.move(order, 'cancelled')
+        for status in ('pending', 'confirmed', 'delivered'):
+            self.assertEqual(self.move(order, status), ([], [(order.order_id, 'cancelled')]))
+        with self.assertRaises(ValueError):
+            self.move(order, 'lost')
+        self.assertEqual(OrderStatusHistory.objects.count(), 1)
+
+    def test_cancelling_returns_stock_once(self):
+        pending, confirmed = self.order(2), self.order(3)
+        self.move(confirmed, 'confirmed')
+        self.assertEqual(self.stock(), 5)
+
+        moved, _ = transition_orders(Order.objects.filter(id__in=[pending.id, confirmed.id]), 'cancelled')
+        self.assertEqual(sorted(moved), sorted([pending.id, confirmed.id]))
+        self.assertEqual(self.stock(), 10)
+        self.assertFalse(StockReservation.objects.exists())
+
+        transition_orders(Order.objects.all(), 'cancelled')
+        self.assertEqual(self.stock(), 10)
+
+
+
+class SalesRollupTests(TestCase):
+    def setUp(self):
+        self.distributor = _distributor()
+        self.product = _product(self.distributor, price=Decimal('1000.50'), stock=50)
+        self.shopper = User.objects.create_user(username='shopper', email='s@example.com', phone='9111111111', password='pw')
+
+    def order(self, quantity):
+        return place_order(self.shopper, price_product(self.product.id, quantity), DELIVERY)
+
+    def totals(self):
+        return sorted(DistributorDailySales.objects.values_list('units', 'revenue', 'orders', 'cancellations'))
+
+    def test_deltas_match_a_full_rebuild(self):
+        first, second, third = self.order(1), self.order(2), self.order(3)
+        for order in (first, second, third):
+            transition_orders(Order.objects.filter(id=order.id), 'confirmed')
+        transition_orders(Order.objects.filter(id=second.id), 'cancelled')
+        transition_orders(Order.objects.filter(id=self.order(4).id), 'cancelled')
+
+        incremental = self.totals()
+        self.assertEqual(incremental, [(4, Decimal('4002.00'), 2, 2)])
+        rebuild_sales_rollups()
+        self.assertEqual(self.totals(), incremental)
+
+    def test_dashboard_kpis(self):
+        transition_orders(Order.objects.filter(id=self.order(2).id), 'confirmed')
+        self.order(5)
+        self.client.force_login(self.distributor)
+        response = self.client.get(reverse('distributor_dashboard'))
+        self.assertEqual(response.status_code, 200)
+        summary = response.context['sales']
+        self.assertEqual((summary['total_units'], summary['total_revenue']), (2, Decimal('2001.00')))
+        self.assertEqual(summary['trend'][-1]['units'], 2)
+        self.assertEqual(summary['top_products'][0]['product_id'], self.product.id)
+
+
+class CatalogCursorTests(TestCase):
+    def setUp(self):
+        distributor = _distributor()
+        for index in range(9):
+            _product(distributor, f'Galaxy {index}', average_rating=float(index % 3))
+        # Half the catalog shares one timestamp so the id tie-break decides their order
+        Product.objects.filter(id__in=Product.objects.order_by('id').values('id')[:5]).update(
+            created_at=timezone.now() - timedelta(days=1)
+        )
+
+    def test_every_sort_visits_each_product_once(self):
+        for sort in ('newest', 'rating'):
+            seen, cursor = [], None
+            while True:
+                page, cursor = get_catalog_page(catalog_queryset(), cursor, sort=sort, page_size=2)
+                seen.extend(product.id for product in page)
+                if cursor is None:
+                    break
+            self.assertEqual(sorted(seen), sorted(Product.objects.values_list('id', flat=True)), sort)
+
+    def test_bad_cursors_start_from_the_top(self):
+        first = self.client.get(reverse('shopping_feed')).json()
+        for cursor in ['garbage', encode_cursor('not-a-date', 'x'), encode_cursor('2024-01-01')]:
+            response = self.client.get(reverse('shopping_feed'), {'cursor': cursor})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['products'], first['products'])
+
+
+class RatingAggregateTests(TestCase):
+    def setUp(self):
+        self.product = _product(_distributor())
+        self.shoppers = [
+            User.objects.create_user(username=f's{index}', email=f's{index}@example.com', phone=f'91111111{index:02}', password='pw')
+            for index in range(3)
+        ]
+
+    def review(self, shopper, rating):
+        self.client.force_login(shopper)
+        return self.client.post(reverse('add_review', args=[self.product.id]), {'rating': rating, 'comment': 'ok'})
+
+    def assertRatings(self, count, total, histogram):
+        product = Product.objects.get(id=self.product.id)
+        self.assertEqual((product.review_count, product.rating_sum), (count, total))
+        self.assertAlmostEqual(product.average_rating, total / count if count else 0)
+        self.assertEqual([getattr(product, f'ratings_{stars}') for stars in range(1, 6)], histogram)
+
+    def test_create_edit_and_delete_keep_the_counters(self):
+        self.review(self.shoppers[0], 5)
+        self.review(self.shoppers[1], 2)
+        self.assertRatings(2, 7, [0, 1, 0, 0, 1])
+
+        self.review(self.shoppers[1], 4)
+        self.assertRatings(2, 9, [0, 0, 0, 1, 1])
+
+        Review.objects.get(user=self.shoppers[0]).delete()
+        self.assertRatings(1, 4, [0, 0, 0, 1, 0])
+        Review.objects.get().delete()
+        self.assertRatings(0, 0, [0, 0, 0, 0, 0])
+
+    def test_bad_ratings_are_refused(self):
+        for rating in ['', 'x', '0', '6']:
+            response = self.review(self.shoppers[0], rating)
+            self.assertRedirects(response, reverse('product_detail', args=[self.product.id]), fetch_redirect_response=False)
+        self.assertFalse(Review.objects.exists())
+        self.assertRatings(0, 0, [0, 0, 0, 0, 0])
+
+    def test_reconcile_repairs_drifted_counters(self):
+        self.review(self.shoppers[0], 3)
+        self.review(self.shoppers[1], 5)
+        Product.objects.filter(id=self.product.id).update(review_count=7, rating_sum=1, average_rating=0.1, ratings_3=0)
+
+        self.assertEqual(reconcile_ratings(), 1)
+        self.assertRatings(2, 8, [0, 0, 1, 0, 1])
+        self.assertEqual(reconcile_ratings(), 0)
+
+
+class CookieCartTests(TestCase):
+    def setUp(self):
+        distributor = _distributor()
+        self.galaxy = _product(distributor, stock=5)
+        self.pixel = _product(distributor, 'Pixel', brand='Google', stock=5)
+        self.shopper = User.objects.create_user(username='shopper', email='s@example.com', phone='9111111111', password='pw')
+
+    def add(self, product, quantity):
+        return self.client.post(reverse('add_to_cart', args=[product.id]), {'quantity': quantity})
+
+    def cookie_lines(self):
+        return signing.loads(self.client.cookies[CART_COOKIE].value, salt=CART_COOKIE_SALT)
+
+    def cart_lines(self):
+        return {line.product.id: line.quantity for line in self.client.get(reverse('cart')).context['cart_items']}
+
+    def test_anonymous_adds_live_in_the_cookie(self):
+        self.add(self.galaxy, 2)
+        self.assertEqual(self.cookie_lines(), {str(self.galaxy.id): 2})
+        self.assertEqual(self.cart_lines(), {self.galaxy.id: 2})
+        self.assertFalse(Cart.objects.exists())
+
+    def test_quantities_are_clamped_to_stock(self):
+        self.add(self.galaxy, 3)
+        self.add(self.galaxy, 3)
+        self.assertEqual(self.cart_lines(), {self.galaxy.id: 5})
+
+    def test_tampered_or_unsigned_cookies_are_ignored(self):
+        signed = signing.dumps({self.galaxy.id: 2}, salt=CART_COOKIE_SALT, compress=True)
+        for value in [
+            signed[:-1] + ('A' if signed[-1] != 'A' else 'B'),
+            '{"%d": 2}' % self.galaxy.id,
+            signing.dumps({self.galaxy.id: 2}, salt='another.salt'),
+            'garbage',
+        ]:
+            self.client.cookies[CART_COOKIE] = value
+            self.assertEqual(self.cart_lines(), {}, value)
+
+    def test_login_merges_into_the_database_cart_and_clears_the_cookie(self):
+        Cart.objects.create(user=self.shopper, product=self.galaxy, quantity=2)
+        self.add(self.galaxy, 2)
+        self.add(self.pixel, 4)
+        Product.objects.filter(id=self.pixel.id).update(stock=3)
+
+        response = self.client.post(reverse('login'), {'email_or_phone': 's@example.com', 'password': 'pw'})
+        self.assertRedirects(response, reverse('shopping'), fetch_redirect_response=False)
+        self.assertEqual(response.cookies[CART_COOKIE].value, '')
+        self.assertEqual(
+            dict(Cart.objects.filter(user=self.shopper).values_list('product_id', 'quantity')),
+            {self.galaxy.id: 4, self.pixel.id: 3},
+        )
+
+
+class MediaStorageTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.storage = product_media_storage()
+        self.distributor = _distributor()
+
+    def upload(self, content, name='front.jpg'):
+        return SimpleUploadedFile(name, content, content_type='image/jpeg')
+
+    def refs(self):
+        return dict(MediaBlob.objects.values_list('name', 'ref_count'))
+
+    def test_identical_bytes_are_stored_once(self):
+        first = self.storage.save('products/front.jpg', ContentFile(b'same bytes'))
+        second = self.storage.save('products/back.JPG', ContentFile(b'same bytes'))
+        self.assertEqual(first, second)
+        self.assertTrue(is_hashed_name(first))
+        self.assertEqual(len(self.storage.listdir(os.path.dirname(first))[1]), 1)
+        self.assertNotEqual(self.storage.save('products/side.jpg', ContentFile(b'other bytes')), first)
+
+    def test_reference_counts_follow_product_images(self):
+        galaxy = _product(self.distributor, image1=self.upload(b'shared'))
+        pixel = _product(self.distributor, 'Pixel', image1=self.upload(b'shared', 'pixel.jpg'))
+        shared = galaxy.image1.name
+        self.assertEqual(pixel.image1.name, shared)
+        self.assertEqual(self.refs(), {shared: 2})
+
+        galaxy = Product.objects.get(id=galaxy.id)
+        galaxy.image1 = self.upload(b'new front')
+        galaxy.image2 = self.upload(b'shared')
+        galaxy.save()
+        self.assertEqual(self.refs(), {shared: 2, galaxy.image1.name: 1})
+
+        Product.objects.get(id=pixel.id).delete()
+        galaxy.image2 = None
+        galaxy.save()
+        self.assertEqual(self.refs(), {shared: 0, galaxy.image1.name: 1})
+
+        MediaBlob.objects.update(ref_count=5)
+        self.assertEqual(recount_references(Product, MediaBlob, IMAGE_FIELDS), 2)
+        self.assertEqual(self.refs(), {shared: 0, galaxy.image1.name: 1})
+
+    def test_gc_deletes_only_old_unreferenced_blobs(self):
+        names = {
+            label: self.storage.save(f'products/{label}.jpg', ContentFile(label.encode()))
+            for label in ('kept', 'fresh', 'stale')
+        }
+        MediaBlob.objects.bulk_create([
+            MediaBlob(name=names['kept'], ref_count=1), MediaBlob(name=names['fresh']), MediaBlob(name=names['stale']),
+        ])
+        MediaBlob.objects.exclude(name=names['fresh']).update(updated_at=timezone.now() - timedelta(days=2))
+
+        call_command('collect_media_garbage', '--dry-run', stdout=io.StringIO())
+        self.assertTrue(all(self.storage.exists(name) for name in names.values()))
+
+        call_command('collect_media_garbage', stdout=io.StringIO())
+        self.assertEqual({label for label, name in names.items() if self.storage.exists(name)}, {'kept', 'fresh'})
+        self.assertEqual(set(MediaBlob.objects.values_list('name', flat=True)), {names['kept'], names['fresh']})
+
+
+class GeoTests(SimpleTestCase):
+    def test_geohash_known_vectors(self):
+        self.assertEqual(geohash(57.64911, 10.40744, 11), 'u4pruydqqvj')
+        self.assertEqual(geohash(42.6, -5.6, 5), 'ezs42')
+        self.assertEqual(geohash(-25.382708, -49.265506), '6gkzwgjzn')
+
+    def test_parse_coordinates(self):
+        self.assertEqual(parse_coordinates('12.5', ' -77.25 '), (12.5, -77.25))
+        self.assertEqual(parse_coordinates(-90, 180), (-90.0, 180.0))
+        for latitude, longitude in [(None, '1'), ('', ''), ('x', '1'), ('nan', '1'), ('1', 'inf'), ('90.1', '0'), ('0', '-180.1')]:
+            self.assertIsNone(parse_coordinates(latitude, longitude), (latitude, longitude))
+
+    def test_haversine(self):
+        self.assertAlmostEqual(haversine_km((48.8566, 2.3522), (51.5074, -0.1278)), 343.56, places=1)
+        self.assertAlmostEqual(haversine_km((0, 0), (0, 180)), math.pi * EARTH_RADIUS_KM)
+        self.assertEqual(haversine_km((12.9, 77.6), (12.9, 77.6)), 0)
+
+    def test_nearest_neighbour_batches(self):
+        stops = [(0, 0.004), (0, 0.001), (0, 0.003), (0, 0.000), (0, 0.002)]
+        self.assertEqual(
+            nearest_neighbour_batches(stops, 2, origin=(0, 0.01)),
+            [[(0, 0.004), (0, 0.003)], [(0, 0.002), (0, 0.001)], [(0, 0.000)]],
+        )
+        batches = nearest_neighbour_batches(stops, 3)
+        self.assertEqual([len(batch) for batch in batches], [3, 2])
+        self.assertEqual(batches[0][0], stops[0])
+        self.assertEqual(nearest_neighbour_batches([], 3), [])
+
+
+class InlineExecutor:
+    """Runs submitted jobs immediately, so variant rendering can be checked without a process pool"""
+
+    def submit(self, fn, *args):
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+
+class ImageVariantTests(TestCase):
+    def setUp(self):
+        # The done callback normally runs on a pool thread with its own connection
+        connection_patch = mock.patch('user.images.close_old_connections')
+        connection_patch.start()
+        self.addCleanup(connection_patch.stop)
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def upload(self, size):
+        buffer = io.BytesIO()
+        Image.new('RGB', size, (200, 30, 30)).save(buffer, 'JPEG')
+        return SimpleUploadedFile('front.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+    def test_variants_are_rendered_and_recorded(self):
+        with mock.patch('user.images.get_executor', return_value=InlineExecutor()), \
+                self.captureOnCommitCallbacks(execute=True):
+            product = _product(_distributor(), image1=self.upload((800, 400)))
+
+        product.refresh_from_db()
+        name = product.image1.name
+        self.assertEqual(product.image_variants, {'image1': name})
+        for variant, width in {'thumb': 160, 'card': 400, 'zoom': 800}.items():
+            for fmt in VARIANT_FORMATS:
+                with Image.open(default_storage.path(variant_name(name, variant, fmt))) as image:
+                    self.assertEqual(image.size, (width, width // 2), (variant, fmt))
+
+        images = image_set(product, 'image1')
+        self.assertEqual(images['src'], default_storage.url(variant_name(name, 'card', 'jpg')))
+        self.assertEqual(images['srcset'], ', '.join(
+            f"{default_storage.url(variant_name(name, variant, 'jpg'))} {width}w" for variant, width in VARIANT_WIDTHS.items()
+        ))
+        self.assertIn(' 1200w', images['webp_srcset'])
+
+    def test_images_without_variants_use_the_original(self):
+        with mock.patch('user.images.get_executor'):
+            product = _product(_distributor(), image1=self.upload((80, 40)))
+        self.assertEqual(image_set(product, 'image1')['srcset'], '')
+        self.assertEqual(image_set(product, 'image1')['src'], product.image1.url)
+
+    def test_failed_renders_are_logged(self):
+        with mock.patch('user.images.get_executor', return_value=InlineExecutor()), \
+                mock.patch('user.images.render_variants', side_effect=OSError('disk full')), \
+                self.assertLogs('user.images', 'ERROR') as logs, self.captureOnCommitCallbacks(execute=True):
+            product = _product(_distributor(), image1=self.upload((80, 40)))
+
+        self.assertIn(f'product {product.id}', logs.output[0])
+        self.assertIn('disk full', logs.output[0])
+        product.refresh_from_db()
+        self.assertEqual(product.image_variants, {})
+
+
+class OrderListQueryCountTests(TestCase):
+    """Order lists cost the same number of queries however many orders there are"""
+
+    def setUp(self):
+        self.distributor = _distributor()
+        self.products = [_product(self.distributor, stock=1000), _product(self.distributor, 'Pixel', stock=1000)]
+        self.shopper = User.objects.create_user(username='shopper', email='s@example.com', phone='9111111111', password='pw')
+
+    def place(self, count):
+        for _ in range(count):
+            Cart.objects.bulk_create([Cart(user=self.shopper, product=product, quantity=1) for product in self.products])
+            place_order(self.shopper, price_cart(self.shopper), DELIVERY, cart=DatabaseCart(self.shopper))
+
+    def assertPageQueries(self, user, url, queries):
+        self.client.force_login(user)
+        # Session, user, each tier's keyset query and the item prefetch
+        with self.assertNumQueries(queries):
+            self.assertEqual(self.client.get(reverse(url)).status_code, 200)
+
+    def test_one_order(self):
+        self.place(1)
+        self.assertPageQueries(self.shopper, 'orders', 5)
+        self.assertPageQueries(self.distributor, 'distributor_orders', 5)
+
+    def test_many_orders(self):
+        self.place(30)
+        self.assertPageQueries(self.shopper, 'orders', 5)
+        self.assertPageQueries(self.distributor, 'distributor_orders', 5)
+
+    def test_many_orders_across_both_tiers(self):
+        self.place(30)
+        transition_orders(Order.objects.all(), 'cancelled')
+        Order.objects.update(updated_at=timezone.now() - timedelta(days=400))
+        archive_orders(days=30)
+        self.place(3)
+        # The archived tier on the page adds its own item prefetch
+        self.assertPageQueries(self.shopper, 'orders', 6)
+        self.assertPageQueries(self.distributor, 'distributor_orders', 6)
+
+
+class ReviewPageTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = _product(_distributor())
+        self.shoppers = [
+            User.objects.create_user(username=f'r{index}', email=f'r{index}@example.com', phone=f'92222222{index:02}', password=None)
+            for index in range(13)
+        ]
+        same_time = timezone.now() - timedelta(days=1)
+        for index, shopper in enumerate(self.shoppers[:12]):
+            review = Review.objects.create(product=self.product, user=shopper, rating=4, comment=f'review {index}')
+            # A run of equal timestamps exercises the id tie-break
+            Review.objects.filter(id=review.id).update(created_at=same_time if index < 6 else same_time + timedelta(minutes=index))
+
+    def test_pages_visit_every_review_once_newest_first(self):
+        seen, cursor = [], None
+        while True:
+            reviews, cursor = get_review_page(self.product.id, cursor, page_size=5)
+            self.assertLessEqual(len(reviews), 5)
+            seen.extend(reviews)
+            if cursor is None:
+                break
+        self.assertEqual(len({review['id'] for review in seen}), 12)
+        self.assertEqual(seen, sorted(seen, key=lambda review: (-review['created_at'].timestamp(), review['id'])))
+
+        response = self.client.get(reverse('product_reviews', args=[self.product.id]), {'cursor': 'garbage'})
+        self.assertEqual(len(response.json()['reviews']), REVIEW_PAGE_SIZE)
+
+    def test_new_review_shows_on_the_first_page_right_away(self):
+        self.assertEqual(len(get_first_review_page(self.product.id)[0]), REVIEW_PAGE_SIZE)
+
+        self.client.force_login(self.shoppers[12])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('add_review', args=[self.product.id]), {'rating': 5, 'comment': 'brand new'})
+        self.assertEqual(get_first_review_page(self.product.id)[0][0]['comment'], 'brand new')
+        self.assertContains(self.client.get(reverse('product_detail', args=[self.product.id])), 'brand new')
+
+    def test_page_read_before_an_invalidation_is_never_served(self):
+        stale = get_review_page(self.product.id)
+
+        def review_lands_mid_read(product_id):
+            Review.objects.create(product=self.product, user=self.shoppers[12], rating=5, comment='brand new')
+            invalidate_reviews(product_id)
+            return stale
+
+        with mock.patch('user.reviews.get_review_page', side_effect=review_lands_mid_read):
+            self.assertEqual(get_first_review_page(self.product.id), stale)
+        self.assertEqual(get_first_review_page(self.product.id)[0][0]['comment'], 'brand new')
+
+
+class DiscountPricingTests(TestCase):
+    CASES = [
+        # (price, discount, expected unit price)
+        ('999.99', 0, '999.99'),
+        ('999.99', 100, '0.00'),
+        ('999.99', 15, '849.99'),
+        ('0.10', 15, '0.09'),
+        ('12345678.99', 33, '8271604.92'),
+        ('19999', 7, '18599.07'),
+    ]
+
+    def setUp(self):
+        self.shopper = User.objects.create_user(username='shopper', email='s@example.com', phone='9111111111', password=None)
+        distributor = _distributor()
+        self.products = [
+            _product(distributor, f'Galaxy {index}', price=Decimal(price), discount=discount, stock=10)
+            for index, (price, discount, _) in enumerate(self.CASES)
+        ]
+
+    @staticmethod
+    def expected_unit_price(product):
+        return (product.price * (100 - product.discount) / 100).quantize(CENT, ROUND_HALF_UP)
+
+    def test_unit_prices(self):
+        for product, (price, discount, expected) in zip(self.products, self.CASES):
+            pricing = price_product(product.id, 1)
+            self.assertEqual(pricing.lines[0].unit_price, Decimal(expected), (price, discount))
+            self.assertEqual(self.expected_unit_price(product), Decimal(expected), (price, discount))
+
+    def test_cart_totals_match_decimal_arithmetic(self):
+        quantities = {product.id: index + 1 for index, product in enumerate(self.products)}
+        Cart.objects.bulk_create([Cart(user=self.shopper, product_id=product_id, quantity=quantity) for product_id, quantity in quantities.items()])
+
+        total = sum(self.expected_unit_price(product) * quantities[product.id] for product in self.products)
+        subtotal = sum(product.price * quantities[product.id] for product in self.products)
+        for pricing in (price_cart(self.shopper), price_products(quantities)):
+            self.assertEqual(pricing.total, total)
+            self.assertEqual(pricing.subtotal, subtotal)
+            self.assertEqual(pricing.discount, subtotal - total)
+            self.assertEqual(pricing.item_count, sum(quantities.values()))
+            for line in pricing.lines:
+                self.assertEqual(line.line_total, self.expected_unit_price(line.product) * line.quantity)
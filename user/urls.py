@@ -9,11 +9,14 @@ urlpatterns = [
     path('accounts/login/', views.user_login, name='account_login'),
     path('logout/', views.logout_view, name='logout'),
     path('shopping/', views.shopping, name='shopping'),
+    path('shopping/feed/', views.shopping_feed, name='shopping_feed'),
     path('product/<int:product_id>/', views.product_detail, name='product_detail'),
+    path('product/<int:product_id>/reviews/', views.product_reviews, name='product_reviews'),
     path('add-to-cart/<int:product_id>/', views.add_to_cart, name='add_to_cart'),
     path('cart/', views.cart_view, name='cart'),
-    path('remove-from-cart/<int:cart_id>/', views.remove_from_cart, name='remove_from_cart'),
-    path('update-cart/<int:cart_id>/', views.update_cart, name='update_cart'),
+    path('remove-from-cart/<int:product_id>/', views.remove_from_cart, name='remove_from_cart'),
+    path('update-cart/<int:product_id>/', views.update_cart, name='update_cart'),
+    path('update-cart/', views.update_cart_batch, name='update_cart_batch'),
     path('checkout/', views.checkout, name='checkout'),
     path('checkout-buy-now/', views.checkout_buy_now, name='checkout_buy_now'),
     path('payment-options/<str:order_id>/', views.payment_options, name='payment_options'),
@@ -2,11 +2,28 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from django.conf import settings
-from .models import User, Product, Cart, Order, OrderItem, Review, send_welcome_email, send_order_sms, send_order_confirmation_email
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.views.static import serve
+from .models import User, Product, Cart, Order, OrderItem, Review
+from .catalog import catalog_queryset, get_catalog_page, product_card_data, resolve_sort
+from .specs import spec_filters_from_query, facet_counts
+from .ratings import record_new_rating, record_changed_rating
+from .reviews import get_first_review_page, get_review_page, invalidate_reviews
+from .storage import is_hashed_name
+from .page_cache import get_product_page, render_product_page, apply_user_overlay, invalidate_product_page
+from .pricing import price_product, price_order_items
+from .cart import get_cart, merge_cookie_cart, clean_changes
+from .reservations import InsufficientStock
+from .order_status import transition_orders
+from .archive import get_any_order
+from .orders import delivery_details, place_order, get_order_history_page
+from .idempotency import idempotent, new_idempotency_key
+from .notifications import queue_welcome_email, queue_order_confirmation
 import json
 from django.utils import timezone
 
@@ -43,17 +60,18 @@ def signup(request):
             messages.error(request, 'Phone number already registered!')
             return render(request, 'user/signup.html')
         
-        # Create user
-        user = User.objects.create_user(
-            username=username,
-            email=email,
-            phone=phone,
-            password=password,
-            user_type=user_type
-        )
-        
-        # Send welcome email
-        send_welcome_email(user)
+        with transaction.atomic():
+            # Create user
+            user = User.objects.create_user(
+                username=username,
+                email=email,
+                phone=phone,
+                password=password,
+                user_type=user_type
+            )
+            
+            # Queue welcome email for the notification worker
+            queue_welcome_email(user)
         
         messages.success(request, 'Account created successfully! Please login.')
         return redirect('login')
@@ -86,6 +104,7 @@ def user_login(request):
         
         if user is not None:
             login(request, user)
+            merge_cookie_cart(request, user)
             return redirect('shopping')
         else:
             messages.error(request, 'Invalid password!')
@@ -99,76 +118,96 @@ def logout_view(request):
     return redirect('login')
 
 
-@login_required
 def shopping(request):
-    """Shopping page with all products"""
-    products = Product.objects.filter(is_available=True)
+    """Shopping page with the first page of available products and filter facets"""
     brands = Product.BRAND_CHOICES
-    
-    # Filter by brand
     brand_filter = request.GET.get('brand')
-    if brand_filter:
-        products = products.filter(brand=brand_filter)
-    
-    # Search
     search = request.GET.get('search')
-    if search:
-        products = products.filter(model_name__icontains=search)
+    spec_filters = spec_filters_from_query(request.GET)
+    
+    # Facet counts are taken before the brand and spec filters; each facet applies the others itself
+    unfiltered = catalog_queryset(search=search)
+    brand_counts, facets = facet_counts(unfiltered, brands, brand_filter, spec_filters)
+    
+    sort = resolve_sort(request.GET.get('sort'), search)
+    products = catalog_queryset(brand=brand_filter, search=search, spec_filters=spec_filters)
+    products, next_cursor = get_catalog_page(products, request.GET.get('cursor'), sort)
     
     context = {
         'products': products,
-        'brands': brands,
+        'brands': [(value, name, brand_counts[value]) for value, name in brands],
+        'facets': facets,
         'selected_brand': brand_filter,
-        'search': search
+        'search': search,
+        'sort': sort,
+        'next_cursor': next_cursor
     }
     return render(request, 'user/shopping.html', context)
 
 
-@login_required
+def shopping_feed(request):
+    """Infinite-scroll JSON feed of product cards after a cursor"""
+    search = request.GET.get('search')
+    products = catalog_queryset(
+        brand=request.GET.get('brand'),
+        search=search,
+        spec_filters=spec_filters_from_query(request.GET)
+    )
+    sort = resolve_sort(request.GET.get('sort'), search)
+    products, next_cursor = get_catalog_page(products, request.GET.get('cursor'), sort)
+    
+    return JsonResponse({
+        'products': [product_card_data(product) for product in products],
+        'html': render_to_string('user/_product_cards.html', {'products': products}, request=request),
+        'next_cursor': next_cursor
+    })
+
+
 def product_detail(request, product_id):
     """Product detail page with specifications, features, pictures, reviews"""
-    product = get_object_or_404(Product, id=product_id)
-    reviews = product.reviews.all()
+    page, version = get_product_page(product_id)
     
-    # Calculate average rating
-    avg_rating = 0
-    if reviews.exists():
-        avg_rating = sum([r.rating for r in reviews]) / reviews.count()
-    
-    # Check if product is in cart
-    in_cart = False
-    if request.user.is_authenticated:
-        in_cart = Cart.objects.filter(user=request.user, product=product).exists()
+    if page is None:
+        product = get_object_or_404(Product, id=product_id)
+        reviews, next_review_cursor = get_first_review_page(product.id)
+        page = render_product_page(product, reviews, next_review_cursor, version)
     
     context = {
-        'product': product,
-        'reviews': reviews,
-        'avg_rating': round(avg_rating, 1),
-        'in_cart': in_cart
+        'page': page,
+        'page_body': apply_user_overlay(request, product_id, page['body'], product_id in get_cart(request).product_ids()),
+        'product_id': product_id
     }
     return render(request, 'user/product_detail.html', context)
 
 
-@login_required
+def product_reviews(request, product_id):
+    """JSON page of product reviews after a cursor"""
+    reviews, next_cursor = get_review_page(product_id, request.GET.get('cursor'))
+    
+    return JsonResponse({
+        'reviews': [dict(review, created_at=review['created_at'].isoformat()) for review in reviews],
+        'html': render_to_string('user/_reviews.html', {'reviews': reviews}, request=request),
+        'next_cursor': next_cursor
+    })
+
+
 def add_to_cart(request, product_id):
     """Add product to cart"""
     if request.method == 'POST':
         product = get_object_or_404(Product, id=product_id)
-        quantity = int(request.POST.get('quantity', 1))
+        try:
+            quantity = int(request.POST.get('quantity', 1))
+        except (TypeError, ValueError):
+            quantity = 0
+        if quantity < 1:
+            messages.error(request, 'Please choose a quantity of 1 or more!')
+            return redirect('product_detail', product_id=product_id)
         
         if product.stock < quantity:
             messages.error(request, 'Insufficient stock!')
             return redirect('product_detail', product_id=product_id)
         
-        cart_item, created = Cart.objects.get_or_create(
-            user=request.user,
-            product=product,
-            defaults={'quantity': quantity}
-        )
-        
-        if not created:
-            cart_item.quantity += quantity
-            cart_item.save()
+        get_cart(request).add(product, quantity)
         
         messages.success(request, f'{product.brand} {product.model_name} added to cart!')
         return redirect('cart')
@@ -176,102 +215,95 @@ def add_to_cart(request, product_id):
     return redirect('product_detail', product_id=product_id)
 
 
-@login_required
 def cart_view(request):
     """View cart"""
-    cart_items = Cart.objects.filter(user=request.user)
-    total = sum([item.get_total_price() for item in cart_items])
+    pricing = get_cart(request).price()
     
     context = {
-        'cart_items': cart_items,
-        'total': total
+        'cart_items': pricing.lines,
+        'pricing': pricing,
+        'total': pricing.total
     }
     return render(request, 'user/cart.html', context)
 
 
-@login_required
-def remove_from_cart(request, cart_id):
+def remove_from_cart(request, product_id):
     """Remove item from cart"""
-    cart_item = get_object_or_404(Cart, id=cart_id, user=request.user)
-    cart_item.delete()
+    get_cart(request).remove(product_id)
     messages.success(request, 'Item removed from cart!')
     return redirect('cart')
 
 
-@login_required
-def update_cart(request, cart_id):
+def update_cart(request, product_id):
     """Update cart item quantity"""
     if request.method == 'POST':
-        quantity = int(request.POST.get('quantity', 1))
-        cart_item = get_object_or_404(Cart, id=cart_id, user=request.user)
-        
-        if quantity > 0:
-            cart_item.quantity = quantity
-            cart_item.save()
-        else:
-            cart_item.delete()
+        try:
+            quantity = int(request.POST.get('quantity', 1))
+        except (TypeError, ValueError):
+            return JsonResponse({'success': False, 'error': 'quantity must be a whole number'}, status=400)
+        get_cart(request).set_quantity(product_id, quantity)
         
         return JsonResponse({'success': True})
     
     return redirect('cart')
 
 
+def update_cart_batch(request):
+    """Apply a JSON list of {product_id, quantity} line changes in one request"""
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'POST required'}, status=405)
+    
+    try:
+        changes = clean_changes(json.loads(request.body).get('lines', []))
+    except (ValueError, TypeError, AttributeError):
+        return JsonResponse({'success': False, 'error': 'Invalid cart changes'}, status=400)
+    
+    cart = get_cart(request)
+    cart.apply_changes(changes)
+    pricing = cart.price()
+    
+    return JsonResponse({
+        'success': True,
+        'lines': [
+            {'product_id': item.product_id, 'quantity': item.quantity, 'line_total': str(item.line_total)}
+            for item in pricing.lines
+        ],
+        'item_count': pricing.item_count,
+        'subtotal': str(pricing.subtotal),
+        'discount': str(pricing.discount),
+        'total': str(pricing.total)
+    })
+
+
 @login_required
+@idempotent('checkout')
 def checkout(request):
     """Checkout with delivery details"""
-    cart_items = Cart.objects.filter(user=request.user)
+    cart = get_cart(request)
+    pricing = cart.price()
     
-    if not cart_items.exists():
+    if not pricing:
         messages.error(request, 'Your cart is empty!')
         return redirect('shopping')
     
-    total = sum([item.get_total_price() for item in cart_items])
+    total = pricing.total
     
     if request.method == 'POST':
-        # Get delivery details
-        delivery_name = request.POST.get('delivery_name')
-        delivery_phone = request.POST.get('delivery_phone')
-        delivery_email = request.POST.get('delivery_email')
-        delivery_address = request.POST.get('delivery_address')
-        
-        # Get live location
-        delivery_location = None
-        if request.POST.get('latitude') and request.POST.get('longitude'):
-            delivery_location = {
-                'latitude': request.POST.get('latitude'),
-                'longitude': request.POST.get('longitude')
-            }
-        
-        # Create order
-        order = Order.objects.create(
-            user=request.user,
-            delivery_name=delivery_name,
-            delivery_phone=delivery_phone,
-            delivery_email=delivery_email,
-            delivery_address=delivery_address,
-            delivery_location=delivery_location,
-            total_amount=total
-        )
-        
-        # Create order items
-        for item in cart_items:
-            OrderItem.objects.create(
-                order=order,
-                product=item.product,
-                product_name=f"{item.product.brand} {item.product.model_name}",
-                product_price=item.product.get_discounted_price(),
-                quantity=item.quantity
-            )
-        
-        # Clear cart
-        cart_items.delete()
+        try:
+            order = place_order(request.user, pricing, delivery_details(request.POST), cart=cart)
+        except InsufficientStock as e:
+            for failure in e.failures:
+                messages.error(request, failure['message'])
+            return redirect('cart')
         
         # Redirect to payment options page
         return redirect('payment_options', order_id=order.order_id)
     
     context = {
-        'cart_items': cart_items,
-        'total': total
+        'cart_items': pricing.lines,
+        'pricing': pricing,
+        'total': total,
+        'idempotency_key': new_idempotency_key()
     }
     return render(request, 'user/checkout.html', context)
 
@@ -280,16 +312,18 @@ def checkout(request):
 def payment_options(request, order_id):
     """Display payment options page"""
     order = get_object_or_404(Order, order_id=order_id, user=request.user)
-    order_items = order.items.all()
+    order_items = price_order_items(order)
     
     context = {
         'order': order,
-        'order_items': order_items
+        'order_items': order_items,
+        'idempotency_key': new_idempotency_key()
     }
     return render(request, 'user/payment_options.html', context)
 
 
 @login_required
+@idempotent('process_payment')
 def process_payment(request):
     """Process payment - handles Cash on Delivery"""
     if request.method == 'POST':
@@ -300,16 +334,18 @@ def process_payment(request):
             order = Order.objects.get(order_id=order_id, user=request.user)
             
             if payment_method == 'cod':
-                # Cash on Delivery - confirm order
-                order.payment_status = 'pending'
-                order.status = 'confirmed'
-                order.save()
-                
-                # Send order confirmation SMS
-                send_order_sms(order.delivery_phone, order.order_id, 'confirmed')
-                
-                # Send order confirmation email
-                send_order_confirmation_email(order)
+                with transaction.atomic():
+                    order = Order.objects.select_for_update().get(id=order.id)
+                    if order.status == 'cancelled':
+                        messages.error(request, 'This order has expired or was cancelled. Please place it again.')
+                        return redirect('cart')
+                    
+                    # Cash on Delivery - confirm order; the reserved stock is now sold
+                    if order.status == 'pending':
+                        transition_orders(Order.objects.filter(id=order.id), 'confirmed', changed_by=request.user)
+                        
+                        # Queue order confirmation SMS and email for the notification worker
+                        queue_order_confirmation(order)
                 
                 # Redirect to order confirmation with success message
                 messages.success(request, 'Order placed successfully! You will pay when you receive your order.')
@@ -336,8 +372,8 @@ def payment_callback(request):
 @login_required
 def order_confirmation(request, order_id):
     """Order confirmation page"""
-    order = get_object_or_404(Order, order_id=order_id, user=request.user)
-    order_items = order.items.all()
+    order = get_any_order(request.user, order_id)
+    order_items = price_order_items(order)
     
     context = {
         'order': order,
@@ -348,9 +384,15 @@ def order_confirmation(request, order_id):
 
 @login_required
 def orders(request):
-    """View all orders"""
-    orders = Order.objects.filter(user=request.user).order_by('-created_at')
-    return render(request, 'user/orders.html', {'orders': orders})
+    """View orders, newest first, one page at a time"""
+    orders, next_cursor = get_order_history_page(request.user, request.GET.get('cursor'))
+    
+    context = {
+        'orders': orders,
+        'next_cursor': next_cursor,
+        'is_first_page': not request.GET.get('cursor')
+    }
+    return render(request, 'user/orders.html', context)
 
 
 @login_required
@@ -358,25 +400,39 @@ def add_review(request, product_id):
     """Add review to product"""
     if request.method == 'POST':
         product = get_object_or_404(Product, id=product_id)
-        rating = int(request.POST.get('rating'))
-        comment = request.POST.get('comment')
+        try:
+            rating = int(request.POST.get('rating'))
+        except (TypeError, ValueError):
+            rating = None
+        comment = request.POST.get('comment', '')
         
-        # Check if user already reviewed
-        existing_review = Review.objects.filter(product=product, user=request.user).first()
+        if rating not in range(1, 6):
+            messages.error(request, 'Please choose a rating between 1 and 5!')
+            return redirect('product_detail', product_id=product_id)
         
-        if existing_review:
-            existing_review.rating = rating
-            existing_review.comment = comment
-            existing_review.save()
-            messages.success(request, 'Review updated!')
-        else:
-            Review.objects.create(
-                product=product,
-                user=request.user,
-                rating=rating,
-                comment=comment
-            )
-            messages.success(request, 'Review added!')
+        with transaction.atomic():
+            # Check if user already reviewed
+            existing_review = Review.objects.select_for_update().filter(product=product, user=request.user).first()
+            
+            if existing_review:
+                old_rating = existing_review.rating
+                existing_review.rating = rating
+                existing_review.comment = comment
+                existing_review.save()
+                record_changed_rating(product.id, old_rating, rating)
+                messages.success(request, 'Review updated!')
+            else:
+                Review.objects.create(
+                    product=product,
+                    user=request.user,
+                    rating=rating,
+                    comment=comment
+                )
+                record_new_rating(product.id, rating)
+                messages.success(request, 'Review added!')
+            
+            transaction.on_commit(lambda: invalidate_reviews(product.id))
+            transaction.on_commit(lambda: invalidate_product_page(product.id))
         
         return redirect('product_detail', product_id=product_id)
     
@@ -393,10 +449,13 @@ def buy_now(request, product_id):
         return redirect('product_detail', product_id=product_id)
     
     # Get quantity
-    quantity = int(request.POST.get('quantity', 1))
-    
-    # Calculate total
-    total = product.get_discounted_price() * quantity
+    try:
+        quantity = int(request.POST.get('quantity', 1))
+    except (TypeError, ValueError):
+        quantity = 0
+    if quantity < 1:
+        messages.error(request, 'Please choose a quantity of 1 or more!')
+        return redirect('product_detail', product_id=product_id)
     
     # Store product and quantity in session for checkout
     request.session['buy_now_product_id'] = product.id
@@ -406,50 +465,30 @@ def buy_now(request, product_id):
 
 
 @login_required
+@idempotent('checkout_buy_now')
 def checkout_buy_now(request):
     """Checkout for buy now"""
     product_id = request.session.get('buy_now_product_id')
     quantity = request.session.get('buy_now_quantity', 1)
     
-    if not product_id:
+    if not product_id or not isinstance(quantity, int) or quantity < 1:
         messages.error(request, 'No product selected!')
         return redirect('shopping')
     
-    product = get_object_or_404(Product, id=product_id)
-    total = product.get_discounted_price() * quantity
+    pricing = price_product(product_id, quantity)
+    if pricing is None:
+        raise Http404('Product not found')
+    
+    item = pricing.lines[0]
+    product = item.product
+    total = pricing.total
     
     if request.method == 'POST':
-        delivery_name = request.POST.get('delivery_name')
-        delivery_phone = request.POST.get('delivery_phone')
-        delivery_email = request.POST.get('delivery_email')
-        delivery_address = request.POST.get('delivery_address')
-        
-        delivery_location = None
-        if request.POST.get('latitude') and request.POST.get('longitude'):
-            delivery_location = {
-                'latitude': request.POST.get('latitude'),
-                'longitude': request.POST.get('longitude')
-            }
-        
-        # Create order
-        order = Order.objects.create(
-            user=request.user,
-            delivery_name=delivery_name,
-            delivery_phone=delivery_phone,
-            delivery_email=delivery_email,
-            delivery_address=delivery_address,
-            delivery_location=delivery_location,
-            total_amount=total
-        )
-        
-        # Create order item
-        OrderItem.objects.create(
-            order=order,
-            product=product,
-            product_name=f"{product.brand} {product.model_name}",
-            product_price=product.get_discounted_price(),
-            quantity=quantity
-        )
+        try:
+            order = place_order(request.user, pricing, delivery_details(request.POST))
+        except InsufficientStock as e:
+            messages.error(request, e.failures[0]['message'])
+            return redirect('product_detail', product_id=product.id)
         
         # Clear session
         del request.session['buy_now_product_id']
@@ -461,6 +500,17 @@ def checkout_buy_now(request):
     context = {
         'product': product,
         'quantity': quantity,
-        'total': total
+        'pricing': pricing,
+        'total': total,
+        'idempotency_key': new_idempotency_key()
     }
     return render(request, 'user/checkout_buy_now.html', context)
+
+
+def serve_media(request, path):
+    """Development media server; content-addressed files get long-lived immutable caching"""
+    response = serve(request, path, document_root=settings.MEDIA_ROOT)
+    if is_hashed_name(path):
+        response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+